@@ -0,0 +1,70 @@
+"""
+Measure AccessService.check_access cost and memory with many users
+
+Usage:
+    python -m benchmarks.bench_access_check [--users 1000000] [--checks 200000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+# Settings require these values; the benchmark never talks to Telegram or Mistral
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("ADMIN_ID", "0")
+os.environ.setdefault("MISTRAL_API_KEY", "benchmark")
+
+from src.services.access_service import AccessService
+from src.storage.db import Database
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1_000_000, help="registered users (half approved)")
+    parser.add_argument("--checks", type=int, default=200_000, help="in-memory checks to time")
+    parser.add_argument("--db-checks", type=int, default=5_000, help="database checks to time for comparison")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(db_path=Path(tmp) / "bench.db")
+        await db.init_db()
+        
+        # Sparse Telegram-like IDs, every other user approved
+        rng = random.Random(42)
+        user_ids = rng.sample(range(10_000, 8_000_000_000), args.users)
+        await db.conn.executemany(
+            "INSERT INTO users (user_id, has_access, created_ts) VALUES (?, ?, 0)",
+            ((user_id, i % 2) for i, user_id in enumerate(user_ids))
+        )
+        await db.conn.commit()
+        
+        access_service = AccessService(db)
+        start = time.perf_counter()
+        await access_service.load()
+        load_time = time.perf_counter() - start
+        
+        probes = [rng.choice(user_ids) for _ in range(args.checks)]
+        start = time.perf_counter()
+        for user_id in probes:
+            await access_service.check_access(user_id)
+        memory_check = (time.perf_counter() - start) / args.checks
+        
+        start = time.perf_counter()
+        for user_id in probes[:args.db_checks]:
+            await db.has_access(user_id)
+        db_check = (time.perf_counter() - start) / args.db_checks
+        
+        await db.close()
+    
+    print(f"users={args.users}")
+    print(f"load:            {load_time:8.2f} s")
+    print(f"memory:          {access_service.memory_usage() / 1024 / 1024:8.1f} MiB")
+    print(f"in-memory check: {memory_check * 1e6:8.2f} us")
+    print(f"database check:  {db_check * 1e6:8.2f} us")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+"""
+Compare time-to-first-visible-token for blocking and streamed AI answers
+against a local stand-in server that emits one word every --token-delay
+
+Usage:
+    python -m benchmarks.bench_ai_streaming [--words 150] [--token-delay 0.02]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+# Settings require these values; the benchmark never talks to Telegram or Mistral
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("ADMIN_ID", "0")
+os.environ.setdefault("MISTRAL_API_KEY", "benchmark")
+
+from benchmarks.fake_mistral import FakeMistralServer
+from src.handlers.diet_ai_handler import stream_to_message
+from src.services.mistral_service import MistralService, create_http_client
+
+
+class FakeMessage:
+    """Records when the user would first see answer text"""
+    
+    def __init__(self):
+        self.first_edit = None
+    
+    async def edit_text(self, text: str, **kwargs):
+        if self.first_edit is None:
+            self.first_edit = time.perf_counter()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, default=150, help="words in the answer")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="seconds between streamed words")
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds before the first word")
+    args = parser.parse_args()
+    
+    answer = " ".join(f"совет{i}" for i in range(args.words))
+    server = FakeMistralServer(latency=args.latency, answer=answer, token_delay=args.token_delay)
+    client = create_http_client()
+    service = MistralService(client)
+    service.api_url = await server.start()
+    
+    # Blocking: the stand-in only answers once the whole text is "generated"
+    server.latency = args.latency + args.words * args.token_delay
+    start = time.perf_counter()
+    await service.get_diet_advice("Сколько калорий мне нужно в день?")
+    blocking = time.perf_counter() - start
+    
+    # Streaming: text is shown as soon as the first word arrives
+    server.latency = args.latency
+    message = FakeMessage()
+    start = time.perf_counter()
+    await stream_to_message(message, service.stream_diet_advice("Сколько калорий мне нужно в день?"))
+    total = time.perf_counter() - start
+    first = message.first_edit - start
+    
+    await client.aclose()
+    await server.stop()
+    
+    print(f"blocking:  first visible text after {blocking * 1000:7.0f} ms")
+    print(f"streaming: first visible text after {first * 1000:7.0f} ms (complete after {total * 1000:.0f} ms)")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
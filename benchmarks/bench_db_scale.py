@@ -0,0 +1,413 @@
+"""
+Time every public Database method on a large synthetic dataset
+
+The dataset mimics production: sparse Telegram-like user IDs, most users
+approved, a skewed number of AI requests and workouts per user spread
+over a year. --scale 1 builds 1M users, 20M ai_requests, 10M
+workout_records and 5M weight measurements (tens of GB and a long fill);
+the default is 1%.
+A dataset kept with --db is reused by later runs, so runs before and after
+a change see the same data.
+
+Each method is timed
+  cold:       first call on a freshly opened Database (empty SQLite cache),
+  warm:       p50/p95 of repeated calls with random arguments,
+  concurrent: throughput and p95 with many coroutines calling at once,
+and the Python allocation peak of one call and the process peak RSS are
+recorded. Methods doing full scans are called a few times only.
+
+Results are written as JSON with sorted keys, one value per line, so two
+result files can be compared with diff.
+
+Usage:
+    python -m benchmarks.bench_db_scale [--scale 0.01] [--db data/bench_scale.db] [--output bench_db_scale.json]
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import random
+import resource
+import statistics
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# Settings require these values; the benchmark never talks to Telegram or Mistral
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("ADMIN_ID", "0")
+os.environ.setdefault("MISTRAL_API_KEY", "benchmark")
+
+from src.services.workout_parser import parse_workout
+from src.storage.db import Database
+
+# Dataset size at --scale 1
+FULL_USERS = 1_000_000
+FULL_AI_REQUESTS = 20_000_000
+FULL_WORKOUTS = 10_000_000
+FULL_WEIGHTS = 5_000_000
+CACHE_ENTRIES = 10_000
+FSM_RECORDS = 10_000
+
+# Rows inserted per transaction while filling
+FILL_CHUNK = 100_000
+YEAR = 365 * 86400
+
+QUESTIONS = [
+    "Что съесть на ужин, чтобы не набрать вес?",
+    "Сколько белка нужно в день при наборе массы?",
+    "Можно ли есть фрукты вечером?",
+    "Какой перекус подойдет перед тренировкой?",
+]
+ANSWER = "Рекомендую сбалансированный рацион: белок, овощи и сложные углеводы. " * 6
+WORKOUTS = [
+    "Жим лежа - 80 кг - 3x10",
+    "Приседания - 100 кг - 5x5",
+    "Бег - 5 км - 28 минут",
+    "Подтягивания - 4x12",
+]
+GOALS = ["Похудеть", "Набрать массу", "Поддерживать форму"]
+
+# Methods that only set up or tear down the database
+LIFECYCLE_METHODS = {"init_db", "close", "flush"}
+# Methods scanning whole tables: called a few times, not concurrently
+HEAVY_CALLS = 3
+
+
+class Dataset:
+    """IDs present in the benchmark database and random argument helpers"""
+    
+    def __init__(self, user_ids: list, rng: random.Random):
+        self.user_ids = user_ids
+        self.rng = rng
+        self._new_user_id = max(user_ids) + 1
+    
+    def user(self) -> int:
+        """Random existing user, skewed towards active ones"""
+        return self.user_ids[int(len(self.user_ids) * self.rng.random() ** 2)]
+    
+    def new_user(self) -> int:
+        """User ID not registered yet"""
+        self._new_user_id += 1
+        return self._new_user_id
+    
+    def cache_key(self) -> str:
+        return f"key-{self.rng.randrange(CACHE_ENTRIES)}"
+    
+    def fsm_key(self) -> str:
+        return f"fsm:{self.rng.randrange(FSM_RECORDS)}"
+    
+    def broadcast(self) -> int:
+        """Broadcast created by the create_broadcast run (methods run in name order)"""
+        return 1
+
+
+async def grant_and_restore_pending(db: Database, d: Dataset):
+    """Approve all pending users and make them pending again, so the dataset stays the same"""
+    user_ids = await db.grant_access_to_pending()
+    await db.set_access_many(user_ids, False)
+
+
+# Method name -> (call with random arguments, scans whole tables)
+CALLS = {
+    "has_access": (lambda db, d: db.has_access(d.user()), False),
+    "register_user": (lambda db, d: db.register_user(d.new_user()), False),
+    "get_user_ids": (lambda db, d: db.get_user_ids(has_access=True), True),
+    "grant_access": (lambda db, d: db.grant_access(d.user()), False),
+    "revoke_access": (lambda db, d: db.revoke_access(d.user()), False),
+    "set_access_many": (lambda db, d: db.set_access_many([d.user() for _ in range(100)], True), False),
+    "grant_access_to_pending": (grant_and_restore_pending, True),
+    "get_pending_users": (lambda db, d: db.get_pending_users(after=d.user()), False),
+    "get_all_users": (lambda db, d: db.get_all_users(after=d.user()), False),
+    "get_user_info": (lambda db, d: db.get_user_info(d.user()), False),
+    "get_total_users": (lambda db, d: db.get_total_users(), True),
+    "get_approved_users_count": (lambda db, d: db.get_approved_users_count(), True),
+    "get_pending_users_count": (lambda db, d: db.get_pending_users_count(), True),
+    "get_counters": (lambda db, d: db.get_counters(), False),
+    "check_counters": (lambda db, d: db.check_counters(), True),
+    "rebuild_counters": (lambda db, d: db.rebuild_counters(), True),
+    "get_user_data": (lambda db, d: db.get_user_data(d.user()), False),
+    "update_user_data": (lambda db, d: db.update_user_data(d.user(), weight=d.rng.uniform(50, 120)), False),
+    "add_workout_record": (lambda db, d: db.add_workout_record(d.user(), d.rng.choice(WORKOUTS)), False),
+    "get_workout_records": (lambda db, d: db.get_workout_records(d.user()), False),
+    "get_exercise_progress": (lambda db, d: db.get_exercise_progress(d.user()), False),
+    "get_weight_trend": (lambda db, d: db.get_weight_trend(d.user(), d.rng.choice(("day", "week", "month"))), False),
+    "get_weekly_volume": (lambda db, d: db.get_weekly_volume(d.user(), 12), False),
+    "get_chart_file": (lambda db, d: db.get_chart_file(d.user()), False),
+    "set_chart_file": (lambda db, d: db.set_chart_file(d.user(), "version", "file-id"), False),
+    "delete_chart_file": (lambda db, d: db.delete_chart_file(d.user()), False),
+    "get_ai_request_count": (lambda db, d: db.get_ai_request_count(d.user()), False),
+    "increment_ai_request_count": (lambda db, d: db.increment_ai_request_count(d.user()), False),
+    "add_ai_request": (lambda db, d: db.add_ai_request(d.user(), d.rng.choice(QUESTIONS), ANSWER), False),
+    "reserve_ai_quota": (lambda db, d: db.reserve_ai_quota(d.user(), 10 ** 9, 0, 0, 0.0), False),
+    "refund_ai_quota": (lambda db, d: db.refund_ai_quota(d.user(), 0), False),
+    "get_ai_quota": (lambda db, d: db.get_ai_quota(d.user()), False),
+    "get_ai_history": (lambda db, d: db.get_ai_history(d.user()), False),
+    "get_ai_history_with_quota": (lambda db, d: db.get_ai_history_with_quota(d.user()), False),
+    "get_ai_turns": (lambda db, d: db.get_ai_turns(d.user()), False),
+    "get_ai_conversation": (lambda db, d: db.get_ai_conversation(d.user()), False),
+    "set_ai_conversation": (lambda db, d: db.set_ai_conversation(d.user(), ANSWER, 0, 0), False),
+    "get_cached_response": (lambda db, d: db.get_cached_response(d.cache_key(), 0), False),
+    "touch_cached_response": (lambda db, d: db.touch_cached_response(d.cache_key()), False),
+    "put_cached_response": (lambda db, d: db.put_cached_response(d.cache_key(), ANSWER), False),
+    "evict_cached_responses": (lambda db, d: db.evict_cached_responses(CACHE_ENTRIES, 0), True),
+    "get_fsm_record": (lambda db, d: db.get_fsm_record(d.fsm_key(), 0), False),
+    "save_fsm_records": (
+        lambda db, d: db.save_fsm_records([(d.fsm_key(), "DietAIStates:waiting_for_question", "{}", int(time.time()))], []),
+        False
+    ),
+    "delete_expired_fsm_records": (lambda db, d: db.delete_expired_fsm_records(0), True),
+    "get_total_ai_requests": (lambda db, d: db.get_total_ai_requests(), True),
+    "count_broadcast_recipients": (lambda db, d: db.count_broadcast_recipients("ai_active"), True),
+    "create_broadcast": (lambda db, d: db.create_broadcast(ANSWER, "with_profile"), True),
+    "set_broadcast_report_message": (lambda db, d: db.set_broadcast_report_message(d.broadcast(), 1, 1), False),
+    "get_broadcast": (lambda db, d: db.get_broadcast(d.broadcast()), False),
+    "get_broadcasts": (lambda db, d: db.get_broadcasts(), False),
+    "get_running_broadcast_ids": (lambda db, d: db.get_running_broadcast_ids(), False),
+    "get_pending_deliveries": (lambda db, d: db.get_pending_deliveries(d.broadcast(), d.user(), 1000), False),
+    "set_delivery_status": (lambda db, d: db.set_delivery_status(d.broadcast(), d.user(), 1), False),
+    "get_delivery_counts": (lambda db, d: db.get_delivery_counts(d.broadcast()), True),
+    "finish_broadcast": (lambda db, d: db.finish_broadcast(d.broadcast(), "done"), False),
+}
+
+
+def public_methods() -> list:
+    """Names of public coroutine methods of Database"""
+    return sorted(
+        name for name, member in vars(Database).items()
+        if not name.startswith("_") and inspect.iscoroutinefunction(member)
+    )
+
+
+def peak_rss_mib() -> float:
+    """Peak resident memory of this process in MiB (ru_maxrss is KiB on Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def fill(db: Database, users: int, ai_requests: int, workouts: int, weights: int, rng: random.Random):
+    """Insert synthetic users, profiles, history, quota, cache and FSM rows"""
+    now = int(time.time())
+    user_ids = sorted(rng.sample(range(10_000, 8_000_000_000), users))
+    
+    async def insert(sql: str, rows, total: int, name: str):
+        rows = iter(rows)
+        done = 0
+        while done < total:
+            chunk = [next(rows) for _ in range(min(FILL_CHUNK, total - done))]
+            await db.conn.executemany(sql, chunk)
+            await db.conn.commit()
+            done += len(chunk)
+            print(f"\r  {name}: {done}/{total}", end="", flush=True)
+        print()
+    
+    def skewed_user() -> int:
+        return user_ids[int(users * rng.random() ** 2)]
+    
+    await insert(
+        "INSERT INTO users (user_id, has_access, created_ts) VALUES (?, ?, ?)",
+        ((user_id, int(rng.random() < 0.7), now - rng.randrange(YEAR)) for user_id in user_ids),
+        users, "users"
+    )
+    await insert(
+        "INSERT INTO user_data (user_id, weight, height, age, goal, updated_ts) VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            (user_id, round(rng.uniform(50, 120), 1), rng.randint(150, 200), rng.randint(16, 70),
+             rng.choice(GOALS), now - rng.randrange(YEAR))
+            for user_id in user_ids[::2]
+        ),
+        len(user_ids[::2]), "user_data"
+    )
+    await insert(
+        "INSERT INTO ai_requests (user_id, question, response, created_ts) VALUES (?, ?, ?, ?)",
+        (
+            (skewed_user(), rng.choice(QUESTIONS), ANSWER, now - YEAR + i * YEAR // ai_requests)
+            for i in range(ai_requests)
+        ),
+        ai_requests, "ai_requests"
+    )
+    await insert(
+        "INSERT INTO workout_records (user_id, workout_data, created_ts) VALUES (?, ?, ?)",
+        (
+            (skewed_user(), rng.choice(WORKOUTS), now - YEAR + i * YEAR // workouts)
+            for i in range(workouts)
+        ),
+        workouts, "workout_records"
+    )
+    
+    # Parsed sets of each workout template; triggers build the exercise aggregates
+    print("  workout_sets")
+    for template in WORKOUTS:
+        for s in parse_workout(template):
+            await db.conn.execute(
+                "INSERT INTO workout_sets (record_id, user_id, exercise, sets, reps, weight, e1rm, created_ts) "
+                "SELECT id, user_id, ?, ?, ?, ?, ?, created_ts FROM workout_records WHERE workout_data = ?",
+                (s['exercise'], s['sets'], s['reps'], s['weight'], s['e1rm'], template)
+            )
+    await db.conn.commit()
+    # Triggers build the day/week/month rollups
+    await insert(
+        "INSERT INTO weight_measurements (user_id, ts, weight) VALUES (?, ?, ?)",
+        (
+            (skewed_user(), now - YEAR + i * YEAR // weights, round(rng.uniform(50, 120), 1))
+            for i in range(weights)
+        ),
+        weights, "weight_measurements"
+    )
+    await insert(
+        "INSERT INTO ai_response_cache (key, response, created_ts, last_used_ts) VALUES (?, ?, ?, ?)",
+        ((f"key-{i}", ANSWER, now, now - i) for i in range(CACHE_ENTRIES)),
+        CACHE_ENTRIES, "ai_response_cache"
+    )
+    await insert(
+        "INSERT INTO fsm_states (key, state, data, updated_ts) VALUES (?, ?, '{}', ?)",
+        ((f"fsm:{i}", "UserDataStates:waiting_for_weight", now) for i in range(FSM_RECORDS)),
+        FSM_RECORDS, "fsm_states"
+    )
+    
+    # Lifetime quota counters matching the history
+    await db.conn.execute(
+        "INSERT OR REPLACE INTO ai_quota (user_id, window_start, used, prev_used) "
+        "SELECT user_id, 0, COUNT(*), 0 FROM ai_requests GROUP BY user_id"
+    )
+    await db.conn.commit()
+    await db.conn.execute("ANALYZE")
+    await db.conn.commit()
+
+
+async def open_db(path: Path) -> Database:
+    """Open a fresh Database instance"""
+    db = Database(db_path=path)
+    await db.init_db()
+    return db
+
+
+async def measure(path: Path, name: str, dataset: Dataset, calls: int, concurrency: int) -> dict:
+    """Time one method cold, warm and under concurrency"""
+    call, heavy = CALLS[name]
+    result = {}
+    
+    # Cold: new connections, nothing in the SQLite page cache
+    db = await open_db(path)
+    start = time.perf_counter()
+    await call(db, dataset)
+    result["cold_ms"] = (time.perf_counter() - start) * 1000
+    
+    # Warm: sequential calls on the same connections
+    latencies = []
+    for _ in range(HEAVY_CALLS if heavy else calls):
+        start = time.perf_counter()
+        await call(db, dataset)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    result["warm_p50_ms"] = statistics.median(latencies) * 1000
+    result["warm_p95_ms"] = latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000
+    
+    # Python allocations of one call (SQLite's own memory shows in peak RSS)
+    tracemalloc.start()
+    await call(db, dataset)
+    result["python_peak_kib"] = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    
+    if not heavy:
+        latencies = []
+        
+        async def worker(count: int):
+            for _ in range(count):
+                start = time.perf_counter()
+                await call(db, dataset)
+                latencies.append(time.perf_counter() - start)
+        
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            worker(calls // concurrency + (1 if i < calls % concurrency else 0))
+            for i in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        result["concurrent_ops_per_s"] = len(latencies) / elapsed
+        result["concurrent_p95_ms"] = latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000
+    
+    await db.close()
+    result["peak_rss_mib"] = peak_rss_mib()
+    return {key: round(value, 3) for key, value in result.items()}
+
+
+async def run(path: Path, args):
+    rng = random.Random(42)
+    
+    if not path.exists():
+        print(f"Filling {path} (scale {args.scale})")
+        db = await open_db(path)
+        await fill(
+            db,
+            max(1, int(FULL_USERS * args.scale)),
+            max(1, int(FULL_AI_REQUESTS * args.scale)),
+            max(1, int(FULL_WORKOUTS * args.scale)),
+            max(1, int(FULL_WEIGHTS * args.scale)),
+            rng
+        )
+        await db.close()
+    
+    db = await open_db(path)
+    user_ids = list(await db.get_user_ids())
+    counters = await db.get_counters()
+    await db.close()
+    dataset = Dataset(user_ids, rng)
+    
+    methods = [name for name in public_methods() if name not in LIFECYCLE_METHODS]
+    missing = [name for name in methods if name not in CALLS]
+    if missing:
+        print(f"No benchmark call defined for: {', '.join(missing)}")
+    
+    results = {
+        "dataset": {
+            **counters,
+            "db_size_mib": round(path.stat().st_size / 1024 / 1024, 1),
+        },
+        "settings": {"calls": args.calls, "concurrency": args.concurrency},
+        "methods": {},
+    }
+    
+    print(f"\n{'method':28} {'cold ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'ops/s':>9} {'conc p95':>9} {'py KiB':>8}")
+    for name in methods:
+        if name not in CALLS:
+            continue
+        result = await measure(path, name, dataset, args.calls, args.concurrency)
+        results["methods"][name] = result
+        print(
+            f"{name:28} {result['cold_ms']:9.2f} {result['warm_p50_ms']:8.3f} {result['warm_p95_ms']:8.3f} "
+            f"{result.get('concurrent_ops_per_s', 0):9.0f} {result.get('concurrent_p95_ms', 0):9.2f} "
+            f"{result['python_peak_kib']:8.1f}"
+        )
+    
+    results["peak_rss_mib"] = round(peak_rss_mib(), 1)
+    print(f"\npeak RSS: {results['peak_rss_mib']} MiB")
+    
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, sort_keys=True, ensure_ascii=False)
+        f.write("\n")
+    print(f"results written to {args.output}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=0.01, help="share of 1M users / 20M AI requests / 10M workouts")
+    parser.add_argument("--db", type=Path, help="dataset file, filled if missing and kept (default: temporary)")
+    parser.add_argument("--calls", type=int, default=500, help="warm and concurrent calls per method")
+    parser.add_argument("--concurrency", type=int, default=50, help="coroutines calling at once")
+    parser.add_argument("--output", default="bench_db_scale.json", help="JSON results file")
+    args = parser.parse_args()
+    
+    if args.db:
+        args.db.parent.mkdir(parents=True, exist_ok=True)
+        await run(args.db, args)
+        return
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        await run(Path(tmp) / "bench.db", args)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
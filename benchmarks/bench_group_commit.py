@@ -0,0 +1,57 @@
+"""
+Compare database write throughput with and without group commit
+
+Usage:
+    python -m benchmarks.bench_group_commit [--writers 50] [--writes 40]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+
+# Settings require these values; the benchmark never talks to Telegram or Mistral
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("ADMIN_ID", "0")
+os.environ.setdefault("MISTRAL_API_KEY", "benchmark")
+
+from src.storage.db import Database
+
+
+async def run(group_commit: bool, writers: int, writes: int) -> float:
+    """Run concurrent writers and return writes per second"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(db_path=Path(tmp) / "bench.db", group_commit=group_commit)
+        await db.init_db()
+        
+        async def writer(user_id: int):
+            for i in range(writes):
+                await db.add_ai_request(user_id, f"Вопрос {i}", "Ответ")
+        
+        start = time.perf_counter()
+        await asyncio.gather(*(writer(user_id) for user_id in range(writers)))
+        # Count only writes that are actually committed
+        await db.flush()
+        elapsed = time.perf_counter() - start
+        
+        await db.close()
+        return writers * writes / elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=50, help="concurrent writer coroutines")
+    parser.add_argument("--writes", type=int, default=40, help="writes per coroutine")
+    args = parser.parse_args()
+    
+    direct = await run(False, args.writers, args.writes)
+    grouped = await run(True, args.writers, args.writes)
+    
+    print(f"writers={args.writers} writes/writer={args.writes}")
+    print(f"commit per write: {direct:10.0f} writes/s")
+    print(f"group commit:     {grouped:10.0f} writes/s ({grouped / direct:.1f}x)")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
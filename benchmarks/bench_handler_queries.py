@@ -0,0 +1,101 @@
+"""
+Count database queries each handler makes for one update
+
+Synthetic updates are fed through the real dispatcher, middlewares and
+routers; Telegram API calls are answered locally. Access and admin checks
+are served from memory and profile/quota lookups happen at most once per
+update, so only the data a screen actually shows is queried. The query
+budget of each handler is enforced by tests/test_handler_queries.py.
+
+Usage:
+    python -m benchmarks.bench_handler_queries
+"""
+import asyncio
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+# Settings require these values; the benchmark never talks to Telegram or Mistral
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("ADMIN_ID", "1")
+os.environ.setdefault("MISTRAL_API_KEY", "benchmark")
+
+from aiogram import Bot
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from benchmarks.fake_telegram import FakeTelegramSession, callback_update, message_update
+from src.config.settings import settings
+from src.main import create_dispatcher
+from src.services.access_service import AccessService
+from src.services.mistral_scheduler import MistralScheduler
+from src.services.mistral_service import MistralService
+from src.services.response_cache import ResponseCache
+from src.services.single_flight import SingleFlight
+from src.storage.db import Database
+
+USER_ID = 1001
+QUERY_PREFIXES = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+async def main():
+    # aiogram logs every handled update at INFO
+    logging.disable(logging.INFO)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(db_path=Path(tmp) / "bench.db")
+        await db.init_db()
+        await db.register_user(USER_ID)
+        await db.grant_access(USER_ID, durable=True)
+        await db.update_user_data(USER_ID, durable=True, weight=80, height=180, age=30, goal="Похудеть")
+        await db.flush()
+        
+        access_service = AccessService(db)
+        await access_service.load()
+        
+        dp = create_dispatcher(
+            MemoryStorage(),
+            db,
+            access_service,
+            SingleFlight(MistralScheduler(MistralService())),
+            ResponseCache(db)
+        )
+        
+        # Count statements on the writer and every reader connection
+        queries = []
+        
+        def trace(sql: str):
+            if sql.lstrip().upper().startswith(QUERY_PREFIXES):
+                queries.append(sql)
+        
+        await db.conn.set_trace_callback(trace)
+        for reader in db._readers:
+            await reader.set_trace_callback(trace)
+        
+        bot = Bot(token=settings.BOT_TOKEN, session=FakeTelegramSession())
+        admin_id = settings.ADMIN_ID
+        scenarios = [
+            ("/start", message_update(1, USER_ID, "/start")),
+            ("main_menu", callback_update(2, USER_ID, "main_menu")),
+            ("my_data", callback_update(3, USER_ID, "my_data")),
+            ("view_workouts", callback_update(4, USER_ID, "view_workouts")),
+            ("diet_ai", callback_update(5, USER_ID, "diet_ai")),
+            ("ask_ai", callback_update(6, USER_ID, "ask_ai")),
+            ("ai_history", callback_update(7, USER_ID, "ai_history")),
+            ("admin_panel", callback_update(8, admin_id, "admin_panel")),
+            ("pending_users", callback_update(9, admin_id, "pending_users")),
+            ("all_users", callback_update(10, admin_id, "all_users")),
+            ("stats", callback_update(11, admin_id, "stats")),
+        ]
+        
+        print(f"{'handler':15} queries")
+        for name, update in scenarios:
+            queries.clear()
+            await dp.feed_update(bot, update)
+            print(f"{name:15} {len(queries):7}")
+        
+        await db.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,197 @@
+"""
+End-to-end load test: virtual users click through the bot concurrently
+
+The real dispatcher with all routers and middlewares handles synthetic
+updates fed with feed_update. Telegram API calls are answered by a fake
+session and AI questions go to a local Mistral stand-in with configurable
+latency. Each virtual user repeats a session of /start, profile and AI
+screens, entering weight and an AI question through FSM states.
+
+Reports throughput, latency percentiles per step, the database statement
+mix and Telegram API calls per update, so runs before and after a change
+can be compared.
+
+Usage:
+    python -m benchmarks.bench_load [--users 100] [--rounds 3] [--mistral-latency 0.2]
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import re
+import statistics
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+# Settings require these values; the benchmark never talks to Telegram or Mistral
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("ADMIN_ID", "1")
+os.environ.setdefault("MISTRAL_API_KEY", "benchmark")
+# Measure the bot, not quota or rate limits
+os.environ.setdefault("MAX_REQUESTS_PER_USER", "1000000")
+os.environ.setdefault("MISTRAL_RATE_LIMIT_RPS", "0")
+os.environ.setdefault("MISTRAL_MAX_CONCURRENCY", "100")
+
+from aiogram import Bot
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from benchmarks.fake_mistral import FakeMistralServer
+from benchmarks.fake_telegram import FakeTelegramSession, callback_update, message_update
+from src.main import create_dispatcher
+from src.services.access_service import AccessService
+from src.services.mistral_scheduler import MistralScheduler
+from src.services.mistral_service import MistralService, create_http_client
+from src.services.response_cache import ResponseCache
+from src.services.single_flight import SingleFlight
+from src.storage.db import Database
+from src.storage.fsm_storage import SQLiteStorage
+
+FIRST_USER_ID = 1000
+# Table a statement works on: the first name after FROM, INTO, UPDATE or JOIN
+TABLE_PATTERN = re.compile(r"\b(?:FROM|INTO|UPDATE|JOIN)\s+(\w+)", re.IGNORECASE)
+
+# One session of a virtual user: (step name, update kind, payload)
+SESSION = [
+    ("/start", "message", "/start"),
+    ("my_data", "callback", "my_data"),
+    ("add_weight", "callback", "add_weight"),
+    ("weight input", "message", "75.5"),
+    ("diet_ai", "callback", "diet_ai"),
+    ("ask_ai", "callback", "ask_ai"),
+    ("question input", "message", None),
+    ("ai_history", "callback", "ai_history"),
+    ("main_menu", "callback", "main_menu"),
+]
+
+
+def percentile(values: list, share: float) -> float:
+    """Get percentile of sorted values"""
+    return values[max(0, int(len(values) * share) - 1)]
+
+
+def statement_kind(sql: str) -> str:
+    """Classify SQL statement as verb and table, e.g. "SELECT users" """
+    verb = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ""
+    match = TABLE_PATTERN.search(sql)
+    return f"{verb} {match.group(1)}" if match else verb
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100, help="concurrent virtual users")
+    parser.add_argument("--rounds", type=int, default=3, help="sessions per user")
+    parser.add_argument("--mistral-latency", type=float, default=0.2, help="fake Mistral latency in seconds")
+    parser.add_argument("--fsm", choices=("sqlite", "memory"), default="sqlite", help="FSM storage")
+    args = parser.parse_args()
+    
+    # aiogram logs every handled update at INFO
+    logging.disable(logging.INFO)
+    
+    server = FakeMistralServer(latency=args.mistral_latency)
+    mistral_url = await server.start()
+    http_client = create_http_client()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(db_path=Path(tmp) / "bench.db")
+        await db.init_db()
+        
+        user_ids = range(FIRST_USER_ID, FIRST_USER_ID + args.users)
+        for user_id in user_ids:
+            await db.register_user(user_id)
+            await db.grant_access(user_id, durable=True)
+        await db.flush()
+        
+        access_service = AccessService(db)
+        await access_service.load()
+        
+        mistral_service = MistralService(http_client)
+        mistral_service.api_url = mistral_url
+        
+        storage = SQLiteStorage(db) if args.fsm == "sqlite" else MemoryStorage()
+        dp = create_dispatcher(
+            storage,
+            db,
+            access_service,
+            SingleFlight(MistralScheduler(mistral_service)),
+            ResponseCache(db)
+        )
+        session = FakeTelegramSession()
+        bot = Bot(token="0:benchmark", session=session)
+        
+        # Count statements on the writer and every reader connection
+        statements = Counter()
+        
+        def trace(sql: str):
+            statements[statement_kind(sql)] += 1
+        
+        await db.conn.set_trace_callback(trace)
+        for reader in db._readers:
+            await reader.set_trace_callback(trace)
+        
+        update_ids = itertools.count(1)
+        latencies = defaultdict(list)
+        
+        async def virtual_user(user_id: int):
+            for round_number in range(args.rounds):
+                for step, kind, payload in SESSION:
+                    if payload is None:
+                        # Unique questions, so the answer cache doesn't hide Mistral
+                        payload = f"Что мне съесть на ужин? Вариант {user_id}-{round_number}"
+                    
+                    if kind == "message":
+                        update = message_update(next(update_ids), user_id, payload)
+                    else:
+                        update = callback_update(next(update_ids), user_id, payload)
+                    
+                    start = time.perf_counter()
+                    await dp.feed_update(bot, update)
+                    latencies[step].append(time.perf_counter() - start)
+        
+        start = time.perf_counter()
+        await asyncio.gather(*(virtual_user(user_id) for user_id in user_ids))
+        elapsed = time.perf_counter() - start
+        
+        await storage.close()
+        await db.flush()
+        await db.close()
+    
+    await http_client.aclose()
+    await server.stop()
+    
+    updates = sum(len(values) for values in latencies.values())
+    print(
+        f"{args.users} users x {args.rounds} sessions, Mistral latency {args.mistral_latency * 1000:.0f} ms, "
+        f"FSM storage {args.fsm}"
+    )
+    print(f"{updates} updates in {elapsed:.2f}s: {updates / elapsed:.0f} updates/s, "
+          f"Mistral requests: {server.requests}\n")
+    
+    print(f"{'step':16} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    everything = []
+    for step, _, _ in SESSION:
+        values = sorted(latencies[step])
+        everything.extend(values)
+        print(
+            f"{step:16} {statistics.median(values) * 1000:8.1f} "
+            f"{percentile(values, 0.95) * 1000:8.1f} {percentile(values, 0.99) * 1000:8.1f}"
+        )
+    everything.sort()
+    print(
+        f"{'all':16} {statistics.median(everything) * 1000:8.1f} "
+        f"{percentile(everything, 0.95) * 1000:8.1f} {percentile(everything, 0.99) * 1000:8.1f}"
+    )
+    
+    print(f"\n{'statement':32} {'total':>8} {'per update':>10}")
+    for kind, count in statements.most_common():
+        print(f"{kind:32} {count:8} {count / updates:10.2f}")
+    
+    print(f"\n{'Telegram method':32} {'total':>8} {'per update':>10}")
+    for method, count in session.calls.most_common():
+        print(f"{method:32} {count:8} {count / updates:10.2f}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+"""
+Compare Mistral call latency with a new client per request (cold) and the
+shared keep-alive client (warm) against a local stand-in server
+
+The stand-in speaks plain HTTP, so cold numbers only include TCP connect;
+against the real API every cold request also pays for DNS and TLS.
+
+Usage:
+    python -m benchmarks.bench_mistral_client [--requests 200] [--concurrency 10]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+# Settings require these values; the benchmark never talks to Telegram or Mistral
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("ADMIN_ID", "0")
+os.environ.setdefault("MISTRAL_API_KEY", "benchmark")
+
+from benchmarks.fake_mistral import FakeMistralServer
+from src.services.mistral_service import MistralService, create_http_client
+
+
+async def run(service: MistralService, requests: int, concurrency: int) -> list:
+    """Send requests and return per-request latencies in seconds"""
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await service.get_diet_advice("Сколько калорий мне нужно в день?")
+            latencies.append(time.perf_counter() - start)
+    
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies
+
+
+def report(name: str, latencies: list, connections: int):
+    """Print latency summary"""
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{name:5} p50={statistics.median(latencies) * 1000:7.2f} ms "
+        f"p95={p95 * 1000:7.2f} ms mean={statistics.mean(latencies) * 1000:7.2f} ms "
+        f"connections={connections}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0, help="server-side latency in seconds")
+    args = parser.parse_args()
+    
+    # Cold: a new client (and connection) for every request
+    server = FakeMistralServer(latency=args.latency)
+    cold_service = MistralService()
+    cold_service.api_url = await server.start()
+    cold = await run(cold_service, args.requests, args.concurrency)
+    report("cold", cold, server.connections)
+    await server.stop()
+    
+    # Warm: one shared client with keep-alive
+    server = FakeMistralServer(latency=args.latency)
+    client = create_http_client()
+    warm_service = MistralService(client)
+    warm_service.api_url = await server.start()
+    warm = await run(warm_service, args.requests, args.concurrency)
+    report("warm", warm, server.connections)
+    await client.aclose()
+    await server.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,80 @@
+"""
+Compare Mistral call tail latency with and without hedged requests against
+a local stand-in server where a share of requests is slow
+
+Usage:
+    python -m benchmarks.bench_mistral_hedging [--requests 500] [--tail-ratio 0.02]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+# Settings require these values; the benchmark never talks to Telegram or Mistral
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("ADMIN_ID", "0")
+os.environ.setdefault("MISTRAL_API_KEY", "benchmark")
+
+from benchmarks.fake_mistral import FakeMistralServer
+from src.services.mistral_service import HEDGE_MIN_SAMPLES, MistralService, create_http_client
+
+
+async def run(service: MistralService, requests: int, concurrency: int) -> list:
+    """Send requests and return per-request latencies in seconds"""
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await service.get_diet_advice("Сколько калорий мне нужно в день?")
+            latencies.append(time.perf_counter() - start)
+    
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies
+
+
+def report(name: str, latencies: list, upstream: int):
+    """Print latency summary"""
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(
+        f"{name:8} p50={statistics.median(latencies) * 1000:7.1f} ms "
+        f"p95={p95 * 1000:7.1f} ms p99={p99 * 1000:7.1f} ms "
+        f"upstream requests={upstream}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05, help="usual latency in seconds")
+    parser.add_argument("--tail-ratio", type=float, default=0.02, help="share of slow requests")
+    parser.add_argument("--tail-latency", type=float, default=1.0, help="latency of slow requests in seconds")
+    args = parser.parse_args()
+    
+    for hedging in (False, True):
+        server = FakeMistralServer(
+            latency=args.latency, tail_ratio=args.tail_ratio, tail_latency=args.tail_latency
+        )
+        client = create_http_client()
+        service = MistralService(client)
+        service.api_url = await server.start()
+        service.hedging = hedging
+        
+        # Collect latency samples so the hedge delay is the measured p95
+        await run(service, HEDGE_MIN_SAMPLES, args.concurrency)
+        warmup = server.requests
+        
+        latencies = await run(service, args.requests, args.concurrency)
+        report("hedged" if hedging else "plain", latencies, server.requests - warmup)
+        
+        await client.aclose()
+        await server.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
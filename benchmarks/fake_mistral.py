@@ -0,0 +1,104 @@
+"""Local stand-in for the Mistral chat completions API used by benchmarks"""
+import asyncio
+import json
+import random
+from typing import Optional, Set
+
+from aiohttp import web
+
+
+class FakeMistralServer:
+    """
+    Minimal HTTP server answering like /v1/chat/completions
+    
+    Args:
+        latency: Seconds to wait before answering each request
+        answer: Completion text returned to every request
+        token_delay: Seconds between streamed tokens ("stream": true requests)
+        tail_ratio: Share of requests that are slow
+        tail_latency: Latency of slow requests in seconds
+    """
+    
+    def __init__(
+        self,
+        latency: float = 0.0,
+        answer: str = "Пейте больше воды и ешьте овощи.",
+        token_delay: float = 0.0,
+        tail_ratio: float = 0.0,
+        tail_latency: float = 0.0
+    ):
+        self.latency = latency
+        self.answer = answer
+        self.token_delay = token_delay
+        self.tail_ratio = tail_ratio
+        self.tail_latency = tail_latency
+        self._random = random.Random(42)
+        self.requests = 0
+        self._transports: Set[int] = set()
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ""
+    
+    @property
+    def connections(self) -> int:
+        """Number of distinct TCP connections seen so far"""
+        return len(self._transports)
+    
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start server and return the chat completions URL"""
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._handle)
+        
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}/v1/chat/completions"
+        return self.url
+    
+    async def stop(self):
+        """Stop server"""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+    
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        """Answer a chat completion request"""
+        self.requests += 1
+        self._transports.add(id(request.transport))
+        try:
+            payload = await request.json()
+        except ConnectionResetError:
+            # Client gave up, e.g. a cancelled hedged request
+            return web.Response(status=499)
+        
+        latency = self.latency
+        if self.tail_ratio and self._random.random() < self.tail_ratio:
+            latency = self.tail_latency
+        if latency:
+            await asyncio.sleep(latency)
+        
+        if payload.get("stream"):
+            return await self._stream(request)
+        
+        return web.json_response({
+            "choices": [{"message": {"role": "assistant", "content": self.answer}}],
+            "usage": {"prompt_tokens": 50, "completion_tokens": 20, "total_tokens": 70}
+        })
+    
+    
+    async def _stream(self, request: web.Request) -> web.StreamResponse:
+        """Answer with server-sent events, one word per event"""
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        
+        for word in self.answer.split(" "):
+            chunk = {"choices": [{"index": 0, "delta": {"content": word + " "}}]}
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+        
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
@@ -0,0 +1,62 @@
+"""Local stand-in for the Telegram Bot API and synthetic updates used by benchmarks"""
+from collections import Counter
+
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Message, Update
+
+
+class FakeTelegramSession(BaseSession):
+    """
+    Bot session answering API calls locally without network access
+    
+    Calls returning True succeed; every other call gets a text message in
+    the chat it was addressed to. Calls are counted per API method.
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self.calls: Counter = Counter()
+    
+    async def make_request(self, bot, method, timeout=None):
+        self.calls[type(method).__name__] += 1
+        if method.__returning__ is bool:
+            return True
+        
+        chat_id = getattr(method, "chat_id", None) or 0
+        return Message.model_validate(
+            {"message_id": 1, "date": 0, "chat": {"id": chat_id, "type": "private"}, "text": ""},
+            context={"bot": bot}
+        )
+    
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+    
+    async def close(self):
+        pass
+
+
+def message_update(update_id: int, user_id: int, text: str) -> Update:
+    """Build a private text message update"""
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0, "text": text,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "user"}
+        }
+    })
+
+
+def callback_update(update_id: int, user_id: int, data: str) -> Update:
+    """Build an inline button press update"""
+    return Update.model_validate({
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id), "chat_instance": "1", "data": data,
+            "from": {"id": user_id, "is_bot": False, "first_name": "user"},
+            "message": {
+                "message_id": 1, "date": 0, "text": "",
+                "chat": {"id": user_id, "type": "private"}
+            }
+        }
+    })
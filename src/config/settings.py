@@ -19,14 +19,123 @@ class Settings(BaseSettings):
     # Database settings
     DB_PATH: Path = Path("data/bot.db")
     
+    # Group commit: queue writes and commit them together every
+    # DB_GROUP_COMMIT_INTERVAL_MS or DB_GROUP_COMMIT_MAX_BATCH statements
+    DB_GROUP_COMMIT: bool = False
+    DB_GROUP_COMMIT_INTERVAL_MS: int = 10
+    DB_GROUP_COMMIT_MAX_BATCH: int = 100
+    
+    # SQLite tuning: the database runs in WAL mode with one writer
+    # connection and DB_READ_POOL_SIZE read-only connections
+    DB_READ_POOL_SIZE: int = 4
+    DB_SYNCHRONOUS: str = "NORMAL"
+    DB_CACHE_SIZE_KB: int = 16384
+    DB_MMAP_SIZE: int = 268435456
+    
     # AI settings
     MAX_REQUESTS_PER_USER: int = 10
+    
+    # AI quota window: "lifetime", "daily" (resets at 00:00 UTC) or
+    # "rolling" (sliding window of AI_QUOTA_WINDOW_SECONDS)
+    AI_QUOTA_MODE: str = "lifetime"
+    AI_QUOTA_WINDOW_SECONDS: int = 86400
     MISTRAL_MODEL: str = "mistral-large-latest"
     MISTRAL_MAX_TOKENS: int = 500
+    MISTRAL_API_URL: str = "https://api.mistral.ai/v1/chat/completions"
+    
+    # Shared Mistral HTTP client pool (HTTP/2 needs the h2 package)
+    MISTRAL_MAX_CONNECTIONS: int = 20
+    MISTRAL_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    MISTRAL_KEEPALIVE_EXPIRY: float = 60.0
+    MISTRAL_HTTP2: bool = False
+    
+    # Mistral request scheduling: concurrency cap, token bucket matched to the
+    # API tier (MISTRAL_RATE_LIMIT_RPS <= 0 disables it) and retries on 429
+    MISTRAL_MAX_CONCURRENCY: int = 4
+    MISTRAL_RATE_LIMIT_RPS: float = 1.0
+    MISTRAL_RATE_LIMIT_BURST: int = 2
+    MISTRAL_RATE_LIMIT_RETRIES: int = 3
+    
+    # Retries of timeouts and 5xx with exponential backoff and jitter,
+    # all attempts together limited to MISTRAL_DEADLINE seconds
+    MISTRAL_RETRY_ATTEMPTS: int = 3
+    MISTRAL_RETRY_BACKOFF: float = 0.5
+    MISTRAL_RETRY_MAX_BACKOFF: float = 8.0
+    MISTRAL_DEADLINE: float = 60.0
+    # Hedged requests: send a second copy once the first is slower than the
+    # recent p95 latency (MISTRAL_HEDGE_DELAY until enough samples are known)
+    MISTRAL_HEDGING: bool = False
+    MISTRAL_HEDGE_DELAY: float = 5.0
+    
+    # Stream AI answers, editing the reply at most every AI_STREAM_EDIT_INTERVAL seconds
+    MISTRAL_STREAMING: bool = True
+    AI_STREAM_EDIT_INTERVAL: float = 1.0
+    
+    # AI answer cache keyed by normalized question and profile bands;
+    # AI_CACHE_HOT_SIZE answers are also kept in memory
+    AI_CACHE_ENABLED: bool = True
+    AI_CACHE_TTL_SECONDS: int = 604800
+    AI_CACHE_MAX_ENTRIES: int = 10000
+    AI_CACHE_HOT_SIZE: int = 500
+    # Don't charge the user's quota for answers served from cache
+    AI_CACHE_FREE_HITS: bool = True
+    
+    # Follow-up questions: questions less than AI_CONVERSATION_TIMEOUT seconds
+    # apart form a conversation, its earlier turns are sent along while the
+    # estimated prompt fits AI_PROMPT_TOKEN_BUDGET tokens. Once turns not
+    # summarized yet exceed AI_HISTORY_TOKENS, older ones are folded into a
+    # rolling summary of at most AI_SUMMARY_MAX_TOKENS
+    AI_CONVERSATION_TIMEOUT: int = 1800
+    AI_PROMPT_TOKEN_BUDGET: int = 3000
+    AI_HISTORY_TOKENS: int = 1500
+    AI_SUMMARY_MAX_TOKENS: int = 300
     
     # Bot settings
     REQUEST_TIMEOUT: int = 30
     
+    # How updates are received: "polling" or "webhook"
+    BOT_MODE: str = "polling"
+    # Webhook server; WEBHOOK_URL is the public base URL registered with Telegram.
+    # WEBHOOK_SECRET is required in webhook mode, updates without it are rejected
+    WEBHOOK_URL: str = ""
+    WEBHOOK_PATH: str = "/webhook"
+    WEBHOOK_SECRET: str = ""
+    WEBHOOK_HOST: str = "0.0.0.0"
+    WEBHOOK_PORT: int = 8080
+    # Updates processed concurrently and queued before requests have to wait
+    WEBHOOK_WORKERS: int = 16
+    WEBHOOK_QUEUE_SIZE: int = 1000
+    
+    # FSM storage: "sqlite" keeps unfinished dialogs across restarts, "memory"
+    # uses aiogram's MemoryStorage. SQLite storage holds FSM_CACHE_SIZE recent
+    # records in memory, writes changes every FSM_FLUSH_INTERVAL seconds and
+    # drops states untouched for FSM_STATE_TTL_SECONDS
+    FSM_STORAGE: str = "sqlite"
+    FSM_CACHE_SIZE: int = 10000
+    FSM_FLUSH_INTERVAL: float = 1.0
+    FSM_STATE_TTL_SECONDS: int = 86400
+    
+    # Prometheus metrics at http://METRICS_HOST:METRICS_PORT/metrics (0 disables)
+    METRICS_PORT: int = 0
+    METRICS_HOST: str = "127.0.0.1"
+    
+    # Users per page in admin lists
+    ADMIN_PAGE_SIZE: int = 10
+    
+    # Admin broadcasts: at most BROADCAST_RATE messages per second sent by
+    # BROADCAST_CONCURRENCY workers, failed sends retried BROADCAST_RETRIES
+    # times, progress message refreshed every BROADCAST_REPORT_INTERVAL seconds
+    BROADCAST_RATE: float = 25.0
+    BROADCAST_CONCURRENCY: int = 5
+    BROADCAST_RETRIES: int = 3
+    BROADCAST_REPORT_INTERVAL: float = 5.0
+    
+    # Progress charts over the last CHART_WEEKS weeks, rendered by
+    # CHART_WORKERS processes; CHART_CACHE_SIZE images are kept in memory
+    CHART_WEEKS: int = 12
+    CHART_WORKERS: int = 1
+    CHART_CACHE_SIZE: int = 100
+    
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -1,27 +1,61 @@
+from typing import List, Optional, Tuple
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-from src.keyboards.inline import get_admin_menu, get_pending_users_keyboard, get_user_action_keyboard
+from src.keyboards.inline import (
+    get_admin_menu, get_pending_users_keyboard, get_all_users_keyboard, get_user_action_keyboard,
+    get_approve_all_keyboard
+)
+from src.middlewares.user_context import UserContext
 from src.services.access_service import AccessService
+from src.services.broadcast_service import BroadcastService
+from src.services.response_cache import ResponseCache
+from src.services.single_flight import SingleFlight
 
 router = Router()
 
+APPROVED_TEXT = (
+    "🎉 Ваша заявка одобрена!\n\n"
+    "Теперь вы можете пользоваться ботом.\n"
+    "Нажмите /start для начала работы."
+)
+REVOKED_TEXT = "🔒 Ваш доступ к боту был отозван администратором."
+
 
 class AdminStates(StatesGroup):
     """Admin FSM states"""
     waiting_for_user_id = State()
 
 
+def parse_page_cursor(data: str) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Get keyset cursor from page callback data like "pending_page:a:123"
+    
+    Returns:
+        (after, before) cursor; both None for the first page
+    """
+    parts = data.split(":")
+    if len(parts) != 3 or not parts[2].isdigit():
+        return None, None
+    
+    cursor = int(parts[2])
+    return (cursor, None) if parts[1] == "a" else (None, cursor)
+
+
+def toggle_selection(selected: List[int], user_id: int) -> List[int]:
+    """Get selection with user ID added or removed"""
+    if user_id in selected:
+        return [selected_id for selected_id in selected if selected_id != user_id]
+    return selected + [user_id]
+
+
 @router.callback_query(F.data == "admin_panel")
-async def show_admin_panel(callback: CallbackQuery, db):
+async def show_admin_panel(callback: CallbackQuery, user_context: UserContext):
     """Show admin panel"""
-    user_id = callback.from_user.id
-    access_service = AccessService(db)
-    
     # Verify admin access
-    if not await access_service.is_admin(user_id):
+    if not user_context.is_admin:
         await callback.answer("❌ Доступ запрещен", show_alert=True)
         return
     
@@ -34,20 +68,37 @@ async def show_admin_panel(callback: CallbackQuery, db):
 
 
 @router.callback_query(F.data == "pending_users")
-async def show_pending_users(callback: CallbackQuery, db):
-    """Show list of users waiting for access"""
-    user_id = callback.from_user.id
-    access_service = AccessService(db)
-    
+@router.callback_query(F.data.startswith("pending_page:"))
+async def show_pending_users(
+    callback: CallbackQuery,
+    access_service: AccessService,
+    user_context: UserContext,
+    state: FSMContext
+):
+    """Show a page of users waiting for access"""
     # Verify admin access
-    if not await access_service.is_admin(user_id):
+    if not user_context.is_admin:
         await callback.answer("❌ Доступ запрещен", show_alert=True)
         return
     
-    # Get pending users
-    pending = await access_service.get_pending_users()
+    # Page buttons carry the cursor; other actions redraw the page shown last
+    data = await state.get_data()
+    if callback.data == "pending_users" or callback.data.startswith("pending_page:"):
+        cursor = callback.data
+    else:
+        cursor = data.get('pending_cursor', "pending_users")
+    
+    # Get pending users page
+    after, before = parse_page_cursor(cursor)
+    page = await access_service.get_pending_users(after, before)
+    
+    # Cursor points past the data (e.g. users were approved); start over
+    if not page['users'] and (after is not None or before is not None):
+        cursor = "pending_users"
+        page = await access_service.get_pending_users()
     
-    if not pending:
+    if not page['users']:
+        await state.update_data(pending_cursor=cursor, pending_page=[], pending_selected=[])
         await callback.message.edit_text(
             "📋 Заявки на доступ\n\n"
             "Нет ожидающих заявок",
@@ -56,24 +107,105 @@ async def show_pending_users(callback: CallbackQuery, db):
         await callback.answer()
         return
     
-    keyboard = get_pending_users_keyboard(pending)
+    # Remember the page, so bulk actions apply to exactly what is shown
+    selected = data.get('pending_selected', [])
+    await state.update_data(pending_cursor=cursor, pending_page=[user['user_id'] for user in page['users']])
+    
+    stats = await access_service.get_stats()
+    keyboard = get_pending_users_keyboard(page, set(selected))
     
     text = "📋 Заявки на доступ\n\n"
-    text += f"Всего заявок: {len(pending)}\n\n"
-    text += "Выберите пользователя для управления:"
+    text += f"Всего заявок: {stats['pending_users']}\n"
+    if selected:
+        text += f"Выбрано: {len(selected)}\n"
+    text += "\nОтметьте заявки для одобрения или выберите пользователя:"
     
     await callback.message.edit_text(text, reply_markup=keyboard)
     await callback.answer()
 
 
+@router.callback_query(F.data.startswith("pending_pick:"))
+async def toggle_pending_user(
+    callback: CallbackQuery,
+    access_service: AccessService,
+    user_context: UserContext,
+    state: FSMContext
+):
+    """Select or deselect a pending user for bulk approval"""
+    # Verify admin access
+    if not user_context.is_admin:
+        await callback.answer("❌ Доступ запрещен", show_alert=True)
+        return
+    
+    target_user_id = int(callback.data.split(":")[1])
+    data = await state.get_data()
+    await state.update_data(pending_selected=toggle_selection(data.get('pending_selected', []), target_user_id))
+    
+    await show_pending_users(callback, access_service, user_context, state)
+
+
+@router.callback_query(F.data.startswith("pending_approve:"))
+async def approve_users(
+    callback: CallbackQuery,
+    access_service: AccessService,
+    user_context: UserContext,
+    state: FSMContext,
+    broadcast_service: BroadcastService
+):
+    """Approve selected users, the page shown or all pending users at once"""
+    # Verify admin access
+    if not user_context.is_admin:
+        await callback.answer("❌ Доступ запрещен", show_alert=True)
+        return
+    
+    action = callback.data.split(":")[1]
+    
+    if action == "all":
+        stats = await access_service.get_stats()
+        await callback.message.edit_text(
+            f"✅ Одобрить все заявки ({stats['pending_users']})?\n\n"
+            f"Каждый пользователь получит уведомление.",
+            reply_markup=get_approve_all_keyboard(stats['pending_users'])
+        )
+        await callback.answer()
+        return
+    
+    data = await state.get_data()
+    selected = data.get('pending_selected', [])
+    
+    # One UPDATE in one transaction instead of one per user
+    try:
+        if action == "all_confirm":
+            granted = await access_service.grant_access_to_pending()
+        elif action == "selected":
+            granted = await access_service.grant_access_many(selected)
+        else:
+            granted = await access_service.grant_access_many(data.get('pending_page', []))
+    except Exception:
+        await callback.answer("❌ Ошибка при выдаче доступа", show_alert=True)
+        return
+    
+    granted_ids = set(granted)
+    await state.update_data(pending_selected=[user_id for user_id in selected if user_id not in granted_ids])
+    
+    # Notifications are sent in the background within Telegram limits
+    broadcast_service.notify(granted, APPROVED_TEXT)
+    
+    await callback.answer(f"✅ Доступ разрешен: {len(granted)}", show_alert=True)
+    
+    # Refresh the list once for the whole batch
+    await show_pending_users(callback, access_service, user_context, state)
+
+
 @router.callback_query(F.data.startswith("user_"))
-async def show_user_actions(callback: CallbackQuery, db):
+async def show_user_actions(
+    callback: CallbackQuery,
+    access_service: AccessService,
+    user_context: UserContext
+):
     """Show actions for specific user"""
-    user_id = callback.from_user.id
-    access_service = AccessService(db)
-    
     # Verify admin access
-    if not await access_service.is_admin(user_id):
+    if not user_context.is_admin:
         await callback.answer("❌ Доступ запрещен", show_alert=True)
         return
     
@@ -106,13 +238,16 @@ async def show_user_actions(callback: CallbackQuery, db):
 
 
 @router.callback_query(F.data.startswith("approve_"))
-async def approve_user(callback: CallbackQuery, db):
+async def approve_user(
+    callback: CallbackQuery,
+    access_service: AccessService,
+    user_context: UserContext,
+    state: FSMContext,
+    broadcast_service: BroadcastService
+):
     """Approve user access"""
-    user_id = callback.from_user.id
-    access_service = AccessService(db)
-    
     # Verify admin access
-    if not await access_service.is_admin(user_id):
+    if not user_context.is_admin:
         await callback.answer("❌ Доступ запрещен", show_alert=True)
         return
     
@@ -125,32 +260,30 @@ async def approve_user(callback: CallbackQuery, db):
     if success:
         await callback.answer("✅ Доступ разрешен", show_alert=True)
         
-        # Try to notify user
-        try:
-            bot = callback.bot
-            await bot.send_message(
-                target_user_id,
-                "🎉 Ваша заявка одобрена!\n\n"
-                "Теперь вы можете пользоваться ботом.\n"
-                "Нажмите /start для начала работы."
-            )
-        except Exception:
-            pass
+        # Notify user in the background
+        broadcast_service.notify([target_user_id], APPROVED_TEXT)
+        
+        data = await state.get_data()
+        await state.update_data(
+            pending_selected=[user_id for user_id in data.get('pending_selected', []) if user_id != target_user_id]
+        )
         
         # Return to pending users list
-        await show_pending_users(callback, db)
+        await show_pending_users(callback, access_service, user_context, state)
     else:
         await callback.answer("❌ Ошибка при выдаче доступа", show_alert=True)
 
 
 @router.callback_query(F.data.startswith("revoke_"))
-async def revoke_user(callback: CallbackQuery, db):
+async def revoke_user(
+    callback: CallbackQuery,
+    access_service: AccessService,
+    user_context: UserContext,
+    broadcast_service: BroadcastService
+):
     """Revoke user access"""
-    user_id = callback.from_user.id
-    access_service = AccessService(db)
-    
     # Verify admin access
-    if not await access_service.is_admin(user_id):
+    if not user_context.is_admin:
         await callback.answer("❌ Доступ запрещен", show_alert=True)
         return
     
@@ -163,37 +296,48 @@ async def revoke_user(callback: CallbackQuery, db):
     if success:
         await callback.answer("🚫 Доступ отозван", show_alert=True)
         
-        # Try to notify user
-        try:
-            bot = callback.bot
-            await bot.send_message(
-                target_user_id,
-                "🔒 Ваш доступ к боту был отозван администратором."
-            )
-        except Exception:
-            pass
+        # Notify user in the background
+        broadcast_service.notify([target_user_id], REVOKED_TEXT)
         
         # Return to admin panel
-        await show_admin_panel(callback, db)
+        await show_admin_panel(callback, user_context)
     else:
         await callback.answer("❌ Ошибка при отзыве доступа", show_alert=True)
 
 
 @router.callback_query(F.data == "all_users")
-async def show_all_users(callback: CallbackQuery, db):
-    """Show all users with access"""
-    user_id = callback.from_user.id
-    access_service = AccessService(db)
-    
+@router.callback_query(F.data.startswith("all_users_page:"))
+async def show_all_users(
+    callback: CallbackQuery,
+    access_service: AccessService,
+    user_context: UserContext,
+    state: FSMContext
+):
+    """Show a page of users with access"""
     # Verify admin access
-    if not await access_service.is_admin(user_id):
+    if not user_context.is_admin:
         await callback.answer("❌ Доступ запрещен", show_alert=True)
         return
     
-    # Get all users with access
-    users = await access_service.get_all_users()
+    # Page buttons carry the cursor; other actions redraw the page shown last
+    data = await state.get_data()
+    if callback.data == "all_users" or callback.data.startswith("all_users_page:"):
+        cursor = callback.data
+    else:
+        cursor = data.get('all_users_cursor', "all_users")
+    
+    # Get users page
+    after, before = parse_page_cursor(cursor)
+    page = await access_service.get_all_users(after, before)
+    
+    # Cursor points past the data (e.g. access was revoked); start over
+    if not page['users'] and (after is not None or before is not None):
+        cursor = "all_users"
+        page = await access_service.get_all_users()
     
-    if not users:
+    await state.update_data(all_users_cursor=cursor)
+    
+    if not page['users']:
         await callback.message.edit_text(
             "👥 Все пользователи\n\n"
             "Нет пользователей с доступом",
@@ -202,28 +346,82 @@ async def show_all_users(callback: CallbackQuery, db):
         await callback.answer()
         return
     
+    selected = data.get('all_users_selected', [])
+    
     text = "👥 Все пользователи с доступом\n\n"
-    text += f"Всего пользователей: {len(users)}\n\n"
+    text += f"Всего пользователей: {access_service.approved_count}\n"
+    if selected:
+        text += f"Выбрано: {len(selected)}\n"
+    text += "\nОтметьте пользователей, чтобы отозвать доступ:"
     
-    for user in users[:10]:  # Show first 10 users
-        username = f"@{user['username']}" if user.get('username') else "Без username"
-        text += f"• ID: {user['user_id']} - {username}\n"
+    await callback.message.edit_text(text, reply_markup=get_all_users_keyboard(page, set(selected)))
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("all_users_pick:"))
+async def toggle_approved_user(
+    callback: CallbackQuery,
+    access_service: AccessService,
+    user_context: UserContext,
+    state: FSMContext
+):
+    """Select or deselect a user for bulk revoke"""
+    # Verify admin access
+    if not user_context.is_admin:
+        await callback.answer("❌ Доступ запрещен", show_alert=True)
+        return
     
-    if len(users) > 10:
-        text += f"\n... и еще {len(users) - 10} пользователей"
+    target_user_id = int(callback.data.split(":")[1])
+    data = await state.get_data()
+    await state.update_data(all_users_selected=toggle_selection(data.get('all_users_selected', []), target_user_id))
     
-    await callback.message.edit_text(text, reply_markup=get_admin_menu())
-    await callback.answer()
+    await show_all_users(callback, access_service, user_context, state)
+
+
+@router.callback_query(F.data == "all_users_revoke")
+async def revoke_users(
+    callback: CallbackQuery,
+    access_service: AccessService,
+    user_context: UserContext,
+    state: FSMContext,
+    broadcast_service: BroadcastService
+):
+    """Revoke access of selected users at once"""
+    # Verify admin access
+    if not user_context.is_admin:
+        await callback.answer("❌ Доступ запрещен", show_alert=True)
+        return
+    
+    data = await state.get_data()
+    
+    try:
+        revoked = await access_service.revoke_access_many(data.get('all_users_selected', []))
+    except Exception:
+        await callback.answer("❌ Ошибка при отзыве доступа", show_alert=True)
+        return
+    
+    await state.update_data(all_users_selected=[])
+    
+    # Notifications are sent in the background within Telegram limits
+    broadcast_service.notify(revoked, REVOKED_TEXT)
+    
+    await callback.answer(f"🚫 Доступ отозван: {len(revoked)}", show_alert=True)
+    
+    # Refresh the list once for the whole batch
+    await show_all_users(callback, access_service, user_context, state)
 
 
 @router.callback_query(F.data == "stats")
-async def show_stats(callback: CallbackQuery, db):
+async def show_stats(
+    callback: CallbackQuery,
+    access_service: AccessService,
+    user_context: UserContext,
+    response_cache: ResponseCache,
+    single_flight: SingleFlight
+):
     """Show bot statistics"""
-    user_id = callback.from_user.id
-    access_service = AccessService(db)
-    
     # Verify admin access
-    if not await access_service.is_admin(user_id):
+    if not user_context.is_admin:
         await callback.answer("❌ Доступ запрещен", show_alert=True)
         return
     
@@ -236,5 +434,14 @@ async def show_stats(callback: CallbackQuery, db):
     text += f"⏳ Ожидают доступа: {stats['pending_users']}\n"
     text += f"🤖 Всего запросов к ИИ: {stats['total_ai_requests']}\n"
     
+    cache_stats = response_cache.stats()
+    text += (
+        f"💾 Кэш ответов: {cache_stats['hot_hits'] + cache_stats['db_hits']} попаданий, "
+        f"{cache_stats['misses']} промахов ({cache_stats['hit_rate']:.0%})\n"
+    )
+    
+    flight_stats = single_flight.stats()
+    text += f"🔗 Объединено одинаковых запросов: {flight_stats['coalesced']}\n"
+    
     await callback.message.edit_text(text, reply_markup=get_admin_menu())
     await callback.answer()
\ No newline at end of file
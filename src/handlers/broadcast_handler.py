@@ -0,0 +1,207 @@
+from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import CallbackQuery, Message
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+
+from src.keyboards.inline import (
+    get_broadcasts_keyboard, get_broadcast_segments_keyboard,
+    get_broadcast_confirm_keyboard, get_broadcast_keyboard
+)
+from src.middlewares.user_context import UserContext
+from src.services.broadcast_service import BroadcastService, SEGMENT_LABELS, STATUS_LABELS
+
+router = Router()
+
+# Telegram message text limit
+MAX_TEXT_LENGTH = 4096
+
+
+class BroadcastStates(StatesGroup):
+    """Broadcast FSM states"""
+    waiting_for_text = State()
+    waiting_for_confirmation = State()
+
+
+@router.callback_query(F.data == "broadcasts")
+async def show_broadcasts(
+    callback: CallbackQuery,
+    state: FSMContext,
+    user_context: UserContext,
+    broadcast_service: BroadcastService
+):
+    """Show recent broadcasts"""
+    # Verify admin access
+    if not user_context.is_admin:
+        await callback.answer("❌ Доступ запрещен", show_alert=True)
+        return
+    
+    await state.clear()
+    broadcasts = await broadcast_service.get_recent()
+    
+    text = "📣 Рассылки\n\n"
+    if broadcasts:
+        text += "Выберите рассылку, чтобы посмотреть ход отправки, или создайте новую:"
+    else:
+        text += "Рассылок пока не было"
+    
+    await callback.message.edit_text(text, reply_markup=get_broadcasts_keyboard(broadcasts, STATUS_LABELS))
+    await callback.answer()
+
+
+@router.callback_query(F.data == "broadcast_new")
+async def new_broadcast(callback: CallbackQuery, user_context: UserContext):
+    """Choose broadcast recipients"""
+    # Verify admin access
+    if not user_context.is_admin:
+        await callback.answer("❌ Доступ запрещен", show_alert=True)
+        return
+    
+    await callback.message.edit_text(
+        "📝 Новая рассылка\n\n"
+        "Кому отправить сообщение?",
+        reply_markup=get_broadcast_segments_keyboard(SEGMENT_LABELS)
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("broadcast_segment:"))
+async def choose_segment(callback: CallbackQuery, state: FSMContext, user_context: UserContext):
+    """Remember recipients and ask for the text"""
+    # Verify admin access
+    if not user_context.is_admin:
+        await callback.answer("❌ Доступ запрещен", show_alert=True)
+        return
+    
+    segment = callback.data.split(":", 1)[1]
+    if segment not in SEGMENT_LABELS:
+        await callback.answer("❌ Неизвестная группа получателей", show_alert=True)
+        return
+    
+    await state.update_data(broadcast_segment=segment)
+    await state.set_state(BroadcastStates.waiting_for_text)
+    
+    await callback.message.edit_text(
+        "📝 Отправьте текст рассылки одним сообщением.\n\n"
+        "Форматирование (жирный, курсив, ссылки) сохранится.",
+        reply_markup=None
+    )
+    await callback.answer()
+
+
+@router.message(BroadcastStates.waiting_for_text)
+async def receive_text(
+    message: Message,
+    state: FSMContext,
+    user_context: UserContext,
+    broadcast_service: BroadcastService
+):
+    """Show broadcast preview with the number of recipients"""
+    if not user_context.is_admin:
+        await state.clear()
+        return
+    
+    if not message.text:
+        await message.answer("❌ Отправьте текстовое сообщение:")
+        return
+    
+    # Sent as HTML, so the limit applies to the text with its markup
+    if len(message.html_text) > MAX_TEXT_LENGTH:
+        await message.answer(
+            f"❌ Текст слишком длинный.\n"
+            f"Сократите его до {MAX_TEXT_LENGTH} символов вместе с форматированием:"
+        )
+        return
+    
+    data = await state.get_data()
+    segment = data['broadcast_segment']
+    recipients = await broadcast_service.count_recipients(segment)
+    
+    await state.update_data(broadcast_text=message.html_text)
+    await state.set_state(BroadcastStates.waiting_for_confirmation)
+    
+    await message.answer(
+        f"📣 Предпросмотр рассылки\n"
+        f"Получатели: {SEGMENT_LABELS[segment]} ({recipients})\n\n"
+        f"{message.html_text}",
+        reply_markup=get_broadcast_confirm_keyboard()
+    )
+
+
+@router.callback_query(F.data == "broadcast_confirm", BroadcastStates.waiting_for_confirmation)
+async def confirm_broadcast(
+    callback: CallbackQuery,
+    state: FSMContext,
+    user_context: UserContext,
+    broadcast_service: BroadcastService
+):
+    """Start sending the broadcast"""
+    # Verify admin access
+    if not user_context.is_admin:
+        await callback.answer("❌ Доступ запрещен", show_alert=True)
+        return
+    
+    data = await state.get_data()
+    await state.clear()
+    
+    # The preview message becomes the live progress report
+    broadcast_id = await broadcast_service.start(
+        data['broadcast_text'],
+        data['broadcast_segment'],
+        callback.message.chat.id,
+        callback.message.message_id
+    )
+    
+    text = await broadcast_service.get_report(broadcast_id)
+    await callback.message.edit_text(text, reply_markup=get_broadcast_keyboard(broadcast_id, True))
+    await callback.answer("✅ Рассылка запущена")
+
+
+@router.callback_query(F.data.startswith("broadcast_view:"))
+async def show_broadcast(
+    callback: CallbackQuery,
+    user_context: UserContext,
+    broadcast_service: BroadcastService
+):
+    """Show broadcast progress"""
+    # Verify admin access
+    if not user_context.is_admin:
+        await callback.answer("❌ Доступ запрещен", show_alert=True)
+        return
+    
+    broadcast_id = int(callback.data.split(":")[1])
+    text = await broadcast_service.get_report(broadcast_id)
+    
+    if text is None:
+        await callback.answer("❌ Рассылка не найдена", show_alert=True)
+        return
+    
+    keyboard = get_broadcast_keyboard(broadcast_id, broadcast_service.is_running(broadcast_id))
+    try:
+        await callback.message.edit_text(text, reply_markup=keyboard)
+    except TelegramBadRequest:
+        # Nothing changed since the last refresh
+        pass
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("broadcast_cancel:"))
+async def cancel_broadcast(
+    callback: CallbackQuery,
+    user_context: UserContext,
+    broadcast_service: BroadcastService
+):
+    """Stop a running broadcast"""
+    # Verify admin access
+    if not user_context.is_admin:
+        await callback.answer("❌ Доступ запрещен", show_alert=True)
+        return
+    
+    broadcast_id = int(callback.data.split(":")[1])
+    
+    if await broadcast_service.cancel(broadcast_id):
+        await callback.answer("⛔ Рассылка остановлена", show_alert=True)
+    else:
+        await callback.answer("Рассылка уже завершена", show_alert=True)
+    
+    await show_broadcast(callback, user_context, broadcast_service)
@@ -1,14 +1,28 @@
+import logging
+import time
+from typing import AsyncIterator
+
 from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
 from src.keyboards.inline import get_user_menu, get_diet_ai_menu
-from src.services.access_service import AccessService
-from src.services.mistral_service import MistralService
+from src.middlewares.user_context import UserContext
+from src.services.conversation_service import ConversationService
+from src.services.mistral_service import MistralEmptyResponseError
+from src.services.single_flight import SingleFlight
+from src.services.response_cache import ResponseCache
 from src.config.settings import settings
 
 router = Router()
+logger = logging.getLogger(__name__)
+
+# Telegram rejects messages longer than this
+MAX_MESSAGE_LENGTH = 4096
+# Weekly weight averages given to the AI
+AI_WEIGHT_TREND_WEEKS = 4
 
 
 class DietAIStates(StatesGroup):
@@ -16,20 +30,63 @@ class DietAIStates(StatesGroup):
     waiting_for_question = State()
 
 
+async def stream_to_message(message: Message, chunks: AsyncIterator[str]) -> str:
+    """
+    Show a streamed AI answer by progressively editing a message
+    
+    The first fragment is shown immediately; later edits are throttled to
+    one per AI_STREAM_EDIT_INTERVAL seconds to stay within Telegram limits.
+    
+    Args:
+        message: Bot message to edit
+        chunks: Text fragments of the answer
+    
+    Returns:
+        Complete answer text
+    
+    Raises:
+        MistralEmptyResponseError: If the stream ended without any text
+    """
+    started = time.monotonic()
+    last_edit = None
+    parts = []
+    
+    async for chunk in chunks:
+        parts.append(chunk)
+        now = time.monotonic()
+        
+        if last_edit is not None and now - last_edit < settings.AI_STREAM_EDIT_INTERVAL:
+            continue
+        
+        if last_edit is None:
+            logger.info(f"First AI token shown after {now - started:.2f}s")
+        last_edit = now
+        
+        preview = f"🤖 Ответ ИИ-диетолога:\n\n{''.join(parts)} ▌"
+        try:
+            # Partial text may cut HTML tags, so previews are sent as plain text
+            await message.edit_text(preview[-MAX_MESSAGE_LENGTH:], parse_mode=None)
+        except TelegramBadRequest:
+            pass
+    
+    response = "".join(parts).strip()
+    if not response:
+        raise MistralEmptyResponseError("Некорректный ответ от API")
+    
+    return response
+
+
 @router.callback_query(F.data == "diet_ai")
-async def show_diet_ai_menu(callback: CallbackQuery, db):
+async def show_diet_ai_menu(callback: CallbackQuery, user_context: UserContext):
     """Show diet AI menu"""
-    user_id = callback.from_user.id
-    access_service = AccessService(db)
-    
     # Verify access
-    if not await access_service.check_access(user_id):
+    if not user_context.has_access:
         await callback.answer("❌ Доступ запрещен", show_alert=True)
         return
     
     # Get user's AI request count
-    request_count = await db.get_ai_request_count(user_id)
-    remaining = settings.MAX_REQUESTS_PER_USER - request_count
+    request_count = await user_context.get_quota_used()
+    remaining = await user_context.get_quota_remaining()
     
     text = "🤖 ИИ-Диетолог\n\n"
     text += "Задайте вопрос нашему ИИ-диетологу на базе Mistral AI.\n\n"
@@ -46,19 +103,15 @@ async def show_diet_ai_menu(callback: CallbackQuery, db):
 
 
 @router.callback_query(F.data == "ask_ai")
-async def ask_ai_start(callback: CallbackQuery, state: FSMContext, db):
+async def ask_ai_start(callback: CallbackQuery, state: FSMContext, user_context: UserContext):
     """Start asking AI"""
-    user_id = callback.from_user.id
-    access_service = AccessService(db)
-    
     # Verify access
-    if not await access_service.check_access(user_id):
+    if not user_context.has_access:
         await callback.answer("❌ Доступ запрещен", show_alert=True)
         return
     
     # Check request limit
-    request_count = await db.get_ai_request_count(user_id)
-    if request_count >= settings.MAX_REQUESTS_PER_USER:
+    if await user_context.get_quota_remaining() <= 0:
         await callback.answer("❌ Вы исчерпали лимит запросов", show_alert=True)
         return
     
@@ -68,6 +121,7 @@ async def ask_ai_start(callback: CallbackQuery, state: FSMContext, db):
         "• Какой рацион мне подходит для набора массы?\n"
         "• Сколько калорий мне нужно потреблять?\n"
         "• Какие продукты лучше есть перед тренировкой?\n\n"
+        "Можно задавать уточняющие вопросы: ИИ помнит недавний разговор.\n\n"
         "Напишите ваш вопрос:",
         reply_markup=None
     )
@@ -76,7 +130,15 @@ async def ask_ai_start(callback: CallbackQuery, state: FSMContext, db):
 
 
 @router.message(DietAIStates.waiting_for_question)
-async def ask_ai_finish(message: Message, state: FSMContext, db):
+async def ask_ai_finish(
+    message: Message,
+    state: FSMContext,
+    db,
+    user_context: UserContext,
+    single_flight: SingleFlight,
+    response_cache: ResponseCache,
+    conversation_service: ConversationService
+):
     """Process AI question"""
     user_id = message.from_user.id
     question = message.text.strip()
@@ -96,9 +158,10 @@ async def ask_ai_finish(message: Message, state: FSMContext, db):
         )
         return
     
-    # Check request limit again
-    request_count = await db.get_ai_request_count(user_id)
-    if request_count >= settings.MAX_REQUESTS_PER_USER:
+    # Reserve a request slot before calling the API
+    quota_service = user_context.quota
+    reservation = await quota_service.reserve(user_id)
+    if not reservation:
         await message.answer(
             "❌ Вы исчерпали лимит запросов",
             reply_markup=get_user_menu()
@@ -106,65 +169,112 @@ async def ask_ai_finish(message: Message, state: FSMContext, db):
         await state.clear()
         return
     
-    # Show processing message
-    processing_msg = await message.answer("⏳ Обрабатываю ваш запрос...")
-    
+    processing_msg = None
     try:
+        # Show processing message; if even this fails, the request is refunded
+        processing_msg = await message.answer("⏳ Обрабатываю ваш запрос...")
+        
         # Get user data for context
-        user_data = await db.get_user_data(user_id)
+        user_data = await user_context.get_profile()
         
-        # Initialize Mistral service
-        mistral_service = MistralService()
+        # Weight trend from the weekly rollups, not the raw measurements
+        weight_trend = await db.get_weight_trend(user_id, 'week', AI_WEIGHT_TREND_WEEKS)
+        if len(weight_trend) > 1:
+            user_data = {**(user_data or {}), 'weight_trend': weight_trend}
         
-        # Get AI response
-        response = await mistral_service.get_diet_advice(question, user_data)
+        # Follow-up questions are sent with the conversation so far
+        conversation = await conversation_service.get_context(user_id)
+        if conversation:
+            user_data = {**(user_data or {}), **conversation}
         
-        # Increment request count
-        await db.increment_ai_request_count(user_id)
+        # Similar question from a similar profile may already be answered,
+        # unless the answer depends on the conversation
+        cache_key = response_cache.make_key(question, user_data)
+        response = None if conversation else await response_cache.get(cache_key)
+        cached = response is not None
         
-        # Get updated count
-        new_count = await db.get_ai_request_count(user_id)
-        remaining = settings.MAX_REQUESTS_PER_USER - new_count
+        async def show_queue_position(position: int):
+            await processing_msg.edit_text(
+                f"⏳ Сейчас много запросов, вы в очереди: {position}\n"
+                "Ответ придёт автоматически."
+            )
         
-        # Delete processing message
-        await processing_msg.delete()
+        # Get AI response
+        if not cached and settings.MISTRAL_STREAMING:
+            response = await stream_to_message(
+                processing_msg,
+                single_flight.stream_diet_advice(
+                    question, user_data, user_id=user_id, on_queued=show_queue_position
+                )
+            )
+        elif not cached:
+            response = await single_flight.get_diet_advice(
+                question, user_data, user_id=user_id, on_queued=show_queue_position
+            )
+    
+    except Exception as e:
+        # Failed requests don't count against the limit
+        await quota_service.refund(reservation)
         
-        # Send response
-        response_text = f"🤖 Ответ ИИ-диетолога:\n\n{response}\n\n"
-        response_text += f"📊 Осталось запросов: {remaining}/{settings.MAX_REQUESTS_PER_USER}"
+        # Delete processing message
+        if processing_msg is not None:
+            await processing_msg.delete()
         
         await message.answer(
+            f"❌ Ошибка при обработке запроса:\n{str(e)}\n\n"
+            "Попробуйте еще раз позже.",
+            reply_markup=get_user_menu()
+        )
+        await state.clear()
+        return
+    
+    used = reservation['used']
+    if cached and settings.AI_CACHE_FREE_HITS:
+        # Cached answers cost nothing, so they don't count against the limit
+        await quota_service.refund(reservation)
+        used -= 1
+    elif not cached and not conversation:
+        await response_cache.put(cache_key, response)
+    
+    # Save request to history; durable, as the summary and the next
+    # follow-up read it back through the reader pool
+    await db.add_ai_request(user_id, question, response, durable=True)
+    conversation_service.after_answer(user_id, conversation, question, response)
+    
+    remaining = quota_service.get_remaining(used)
+    
+    # Send response
+    response_text = f"🤖 Ответ ИИ-диетолога:\n\n{response}\n\n"
+    response_text += f"📊 Осталось запросов: {remaining}/{settings.MAX_REQUESTS_PER_USER}"
+    
+    if settings.MISTRAL_STREAMING:
+        # Replace the streamed preview with the final answer
+        await processing_msg.edit_text(
             response_text,
             reply_markup=get_diet_ai_menu(remaining > 0)
         )
-        
-        await state.clear()
-        
-    except Exception as e:
+    else:
         # Delete processing message
         await processing_msg.delete()
         
         await message.answer(
-            f"❌ Ошибка при обработке запроса:\n{str(e)}\n\n"
-            "Попробуйте еще раз позже.",
-            reply_markup=get_user_menu()
+            response_text,
+            reply_markup=get_diet_ai_menu(remaining > 0)
         )
-        await state.clear()
+    
+    await state.clear()
 
 
 @router.callback_query(F.data == "ai_history")
-async def show_ai_history(callback: CallbackQuery, db):
+async def show_ai_history(callback: CallbackQuery, user_context: UserContext):
     """Show AI request history"""
-    user_id = callback.from_user.id
-    access_service = AccessService(db)
-    
     # Verify access
-    if not await access_service.check_access(user_id):
+    if not user_context.has_access:
         await callback.answer("❌ Доступ запрещен", show_alert=True)
         return
     
-    # Get AI request history
-    history = await db.get_ai_history(user_id, limit=5)
+    # Get AI request history along with the quota shown below it
+    history = await user_context.get_ai_history(5)
     
     if not history:
         text = "📜 История запросов к ИИ\n\n"
@@ -179,8 +289,8 @@ async def show_ai_history(callback: CallbackQuery, db):
             text += f"{i}. {date}\n❓ {question}\n\n"
     
     # Get request count
-    request_count = await db.get_ai_request_count(user_id)
-    remaining = settings.MAX_REQUESTS_PER_USER - request_count
+    request_count = await user_context.get_quota_used()
+    remaining = await user_context.get_quota_remaining()
     
     text += f"\n📊 Всего запросов: {request_count}/{settings.MAX_REQUESTS_PER_USER}\n"
     text += f"✅ Осталось: {remaining}"
@@ -4,19 +4,16 @@ from aiogram.filters import CommandStart
 from aiogram.fsm.context import FSMContext
 
 from src.keyboards.inline import get_main_menu, get_user_menu, get_admin_menu
-from src.services.access_service import AccessService
+from src.middlewares.user_context import UserContext
 
 router = Router()
 
 
 @router.message(CommandStart())
-async def cmd_start(message: Message, db):
+async def cmd_start(message: Message, user_context: UserContext):
     """Handle /start command"""
-    user_id = message.from_user.id
-    access_service = AccessService(db)
-    
     # Check if user has access
-    has_access = await access_service.check_access(user_id)
+    has_access = user_context.has_access
     
     if not has_access:
         await message.answer(
@@ -28,7 +25,7 @@ async def cmd_start(message: Message, db):
         return
     
     # Show appropriate menu based on user role
-    is_admin = await access_service.is_admin(user_id)
+    is_admin = user_context.is_admin
     
     if is_admin:
         await message.answer(
@@ -49,13 +46,11 @@ async def cmd_start(message: Message, db):
 
 
 @router.callback_query(F.data == "main_menu")
-async def show_main_menu(callback: CallbackQuery, db, state: FSMContext):
+async def show_main_menu(callback: CallbackQuery, user_context: UserContext, state: FSMContext):
     """Show main menu"""
     await state.clear()
     
-    user_id = callback.from_user.id
-    access_service = AccessService(db)
-    is_admin = await access_service.is_admin(user_id)
+    is_admin = user_context.is_admin
     
     if is_admin:
         await callback.message.edit_text(
@@ -88,13 +83,11 @@ async def show_user_menu(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data == "cancel")
-async def cancel_action(callback: CallbackQuery, db, state: FSMContext):
+async def cancel_action(callback: CallbackQuery, user_context: UserContext, state: FSMContext):
     """Cancel current action and return to main menu"""
     await state.clear()
     
-    user_id = callback.from_user.id
-    access_service = AccessService(db)
-    is_admin = await access_service.is_admin(user_id)
+    is_admin = user_context.is_admin
     
     if is_admin:
         await callback.message.edit_text(
@@ -1,13 +1,21 @@
+from datetime import datetime, timezone
+from typing import Dict, List
 from aiogram import Router, F
-from aiogram.types import CallbackQuery, Message
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile, CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
 from src.keyboards.inline import get_user_menu, get_user_data_menu
-from src.services.access_service import AccessService
+from src.middlewares.user_context import UserContext
+from src.services.chart_service import ChartService
 
 router = Router()
 
+# Periods shown in the weight history
+WEIGHT_HISTORY_WEEKS = 8
+WEIGHT_HISTORY_MONTHS = 6
+
 
 class UserDataStates(StatesGroup):
     """User data FSM states"""
@@ -19,19 +27,57 @@ class UserDataStates(StatesGroup):
     waiting_for_workout_data = State()
 
 
+def format_workout_set(workout_set: Dict) -> str:
+    """Format parsed exercise, e.g. Жим лежа: 3×10 × 80 кг"""
+    text = f"{workout_set['exercise'].capitalize()}: {workout_set['sets']}×{workout_set['reps']}"
+    if workout_set['weight']:
+        text += f" × {workout_set['weight']:g} кг"
+    return text
+
+
+def format_exercise_progress(progress: Dict) -> str:
+    """Format exercise aggregates for the workout history"""
+    text = f"• {progress['exercise'].capitalize()}"
+    if progress['best_e1rm']:
+        text += f" — 1ПМ ≈ {progress['best_e1rm']:g} кг"
+    else:
+        text += f" — до {progress['max_reps']} повторений"
+    text += "\n"
+    
+    if progress['week_volume'] or progress['prev_week_volume']:
+        text += (
+            f"   объем за неделю: {progress['week_volume']:.0f} кг "
+            f"(прошлая: {progress['prev_week_volume']:.0f} кг)\n"
+        )
+    return text
+
+
+def format_weight_trend(rollups: List[Dict], date_format: str) -> str:
+    """Format weight rollups as lines of period start, average and range"""
+    text = ""
+    for rollup in rollups:
+        start = datetime.fromtimestamp(rollup['period_start'], timezone.utc).strftime(date_format)
+        text += f"• {start} — {rollup['avg_weight']:.1f} кг"
+        if rollup['count'] > 1:
+            text += f" ({rollup['min_weight']:g}–{rollup['max_weight']:g})"
+        text += "\n"
+    
+    if len(rollups) > 1:
+        change = rollups[-1]['avg_weight'] - rollups[0]['avg_weight']
+        text += f"Изменение: {change:+.1f} кг\n"
+    return text
+
+
 @router.callback_query(F.data == "my_data")
-async def show_user_data(callback: CallbackQuery, db):
+async def show_user_data(callback: CallbackQuery, user_context: UserContext):
     """Show user data menu"""
-    user_id = callback.from_user.id
-    access_service = AccessService(db)
-    
     # Verify access
-    if not await access_service.check_access(user_id):
+    if not user_context.has_access:
         await callback.answer("❌ Доступ запрещен", show_alert=True)
         return
     
     # Get user data
-    user_data = await db.get_user_data(user_id)
+    user_data = await user_context.get_profile()
     
     if not user_data:
         text = "📊 Мои данные\n\n"
@@ -49,6 +95,78 @@ async def show_user_data(callback: CallbackQuery, db):
     await callback.answer()
 
 
+@router.callback_query(F.data == "weight_history")
+async def show_weight_history(callback: CallbackQuery, db, user_context: UserContext):
+    """Show weekly and monthly weight averages"""
+    # Verify access
+    if not user_context.has_access:
+        await callback.answer("❌ Доступ запрещен", show_alert=True)
+        return
+    
+    user_id = callback.from_user.id
+    
+    # Precomputed rollups: a few rows however long the history is
+    weeks = await db.get_weight_trend(user_id, 'week', WEIGHT_HISTORY_WEEKS)
+    
+    text = "📉 Динамика веса\n\n"
+    if not weeks:
+        text += "Пока нет измерений. Добавляйте вес регулярно, чтобы видеть динамику."
+    else:
+        months = await db.get_weight_trend(user_id, 'month', WEIGHT_HISTORY_MONTHS)
+        text += "Средний вес по неделям:\n"
+        text += format_weight_trend(weeks, "%d.%m")
+        text += "\nПо месяцам:\n"
+        text += format_weight_trend(months, "%m.%Y")
+    
+    await callback.message.edit_text(text, reply_markup=get_user_data_menu())
+    await callback.answer()
+
+
+@router.callback_query(F.data == "progress_chart")
+async def show_progress_chart(callback: CallbackQuery, user_context: UserContext, chart_service: ChartService):
+    """Send weight and training volume chart"""
+    # Verify access
+    if not user_context.has_access:
+        await callback.answer("❌ Доступ запрещен", show_alert=True)
+        return
+    
+    if not chart_service.available:
+        await callback.answer("📈 Графики сейчас недоступны", show_alert=True)
+        return
+    
+    user_id = callback.from_user.id
+    chart = await chart_service.get_chart(user_id)
+    
+    if chart is None:
+        await callback.answer(
+            "Пока нечего показать: добавьте вес или тренировку с подходами",
+            show_alert=True
+        )
+        return
+    
+    caption = "📈 Вес и объем тренировок по неделям"
+    if chart['file_id']:
+        try:
+            await callback.message.answer_photo(chart['file_id'], caption=caption)
+            await callback.answer()
+            return
+        except TelegramBadRequest:
+            # file_id isn't valid anymore (e.g. another bot token), upload again
+            await chart_service.forget(user_id)
+            chart = await chart_service.get_chart(user_id, force_render=True)
+            if chart is None:
+                await callback.answer("❌ Не удалось отправить график", show_alert=True)
+                return
+    
+    sent = await callback.message.answer_photo(
+        BufferedInputFile(chart['image'], filename="progress.png"),
+        caption=caption
+    )
+    if sent.photo:
+        await chart_service.remember(user_id, chart['version'], sent.photo[-1].file_id)
+    await callback.answer()
+
+
 @router.callback_query(F.data == "add_weight")
 async def add_weight_start(callback: CallbackQuery, state: FSMContext):
     """Start adding weight"""
@@ -75,7 +193,8 @@ async def add_weight_finish(message: Message, state: FSMContext, db):
             return
         
         user_id = message.from_user.id
-        await db.update_user_data(user_id, weight=weight)
+        # Durable, so the profile screen shown next reads the new value
+        await db.update_user_data(user_id, durable=True, weight=weight)
         
         await message.answer(
             f"✅ Вес сохранен: {weight} кг",
@@ -116,7 +235,7 @@ async def add_height_finish(message: Message, state: FSMContext, db):
             return
         
         user_id = message.from_user.id
-        await db.update_user_data(user_id, height=height)
+        await db.update_user_data(user_id, durable=True, height=height)
         
         await message.answer(
             f"✅ Рост сохранен: {height} см",
@@ -157,7 +276,7 @@ async def add_age_finish(message: Message, state: FSMContext, db):
             return
         
         user_id = message.from_user.id
-        await db.update_user_data(user_id, age=age)
+        await db.update_user_data(user_id, durable=True, age=age)
         
         await message.answer(
             f"✅ Возраст сохранен: {age} лет",
@@ -201,7 +320,7 @@ async def add_goal_finish(message: Message, state: FSMContext, db):
         return
     
     user_id = message.from_user.id
-    await db.update_user_data(user_id, goal=goal)
+    await db.update_user_data(user_id, durable=True, goal=goal)
     
     await message.answer(
         f"✅ Цель сохранена: {goal}",
@@ -236,7 +355,7 @@ async def add_target_weight_finish(message: Message, state: FSMContext, db):
             return
         
         user_id = message.from_user.id
-        await db.update_user_data(user_id, target_weight=target_weight)
+        await db.update_user_data(user_id, durable=True, target_weight=target_weight)
         
         await message.answer(
             f"✅ Целевой вес сохранен: {target_weight} кг",
@@ -256,10 +375,12 @@ async def add_workout_start(callback: CallbackQuery, state: FSMContext):
     """Start adding workout data"""
     await callback.message.edit_text(
         "💪 Введите данные о тренировке:\n\n"
-        "Формат: упражнение - вес - повторения\n\n"
+        "Формат: упражнение - вес - подходы x повторения\n"
+        "Каждое упражнение с новой строки.\n\n"
         "Например:\n"
-        "Жим лежа - 80 кг - 8 повторений\n"
-        "Приседания - 100 кг - 10 повторений",
+        "Жим лежа - 80 кг - 3x10\n"
+        "Приседания - 100 кг - 5x5\n"
+        "Подтягивания - 4x12",
         reply_markup=None
     )
     await state.set_state(UserDataStates.waiting_for_workout_data)
@@ -279,23 +400,26 @@ async def add_workout_finish(message: Message, state: FSMContext, db):
         return
     
     user_id = message.from_user.id
-    await db.add_workout_record(user_id, workout_data)
+    workout_sets = await db.add_workout_record(user_id, workout_data)
     
-    await message.answer(
-        "✅ Данные о тренировке сохранены",
-        reply_markup=get_user_data_menu()
-    )
+    text = "✅ Данные о тренировке сохранены"
+    if workout_sets:
+        text += "\n\nРаспознано:\n"
+        text += "\n".join(format_workout_set(workout_set) for workout_set in workout_sets)
+    else:
+        text += "\n\nУпражнения не распознаны, поэтому запись не попадет в статистику прогресса."
+    
+    await message.answer(text, reply_markup=get_user_data_menu())
     await state.clear()
 
 
 @router.callback_query(F.data == "view_workouts")
-async def view_workouts(callback: CallbackQuery, db):
+async def view_workouts(callback: CallbackQuery, db, user_context: UserContext):
     """View workout history"""
     user_id = callback.from_user.id
-    access_service = AccessService(db)
     
     # Verify access
-    if not await access_service.check_access(user_id):
+    if not user_context.has_access:
         await callback.answer("❌ Доступ запрещен", show_alert=True)
         return
     
@@ -307,6 +431,14 @@ async def view_workouts(callback: CallbackQuery, db):
         text += "У вас еще нет записей о тренировках."
     else:
         text = "💪 История тренировок\n\n"
+        
+        # Aggregates are precomputed, so this is one lookup however long the history
+        progress = await db.get_exercise_progress(user_id)
+        if progress:
+            text += "📈 Прогресс:\n"
+            text += "".join(format_exercise_progress(item) for item in progress)
+            text += "\n"
+        
         text += f"Последние {len(workouts)} записей:\n\n"
         
         for i, workout in enumerate(workouts, 1):
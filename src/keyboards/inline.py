@@ -1,3 +1,4 @@
+from typing import Collection, Dict, List
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
@@ -46,6 +47,9 @@ def get_admin_menu() -> InlineKeyboardMarkup:
     builder.row(
         InlineKeyboardButton(text="📊 Статистика", callback_data="stats")
     )
+    builder.row(
+        InlineKeyboardButton(text="📣 Рассылка", callback_data="broadcasts")
+    )
     builder.row(
         InlineKeyboardButton(text="👤 Пользовательское меню", callback_data="user_menu")
     )
@@ -53,19 +57,104 @@ def get_admin_menu() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
-def get_pending_users_keyboard(users: list) -> InlineKeyboardMarkup:
-    """Get keyboard with pending users"""
+def _add_page_row(builder: InlineKeyboardBuilder, prefix: str, page: dict):
+    """Add prev/next buttons carrying keyset cursors"""
+    users = page['users']
+    buttons = []
+    
+    if users and page['has_prev']:
+        buttons.append(
+            InlineKeyboardButton(text="⬅️ Назад", callback_data=f"{prefix}:b:{users[0]['user_id']}")
+        )
+    if users and page['has_next']:
+        buttons.append(
+            InlineKeyboardButton(text="Вперед ➡️", callback_data=f"{prefix}:a:{users[-1]['user_id']}")
+        )
+    
+    if buttons:
+        builder.row(*buttons)
+
+
+def _selection_mark(user_id: int, selected: Collection[int]) -> str:
+    """Checkbox shown next to a user in multi-select lists"""
+    return "☑️" if user_id in selected else "⬜"
+
+
+def get_pending_users_keyboard(page: dict, selected: Collection[int] = ()) -> InlineKeyboardMarkup:
+    """Get keyboard with a page of pending users and bulk approve actions"""
     builder = InlineKeyboardBuilder()
     
-    for user in users:
+    for user in page['users']:
         username = f"@{user['username']}" if user.get('username') else f"ID: {user['user_id']}"
         builder.row(
+            InlineKeyboardButton(
+                text=_selection_mark(user['user_id'], selected),
+                callback_data=f"pending_pick:{user['user_id']}"
+            ),
             InlineKeyboardButton(
                 text=f"👤 {username}",
                 callback_data=f"user_{user['user_id']}"
             )
         )
     
+    _add_page_row(builder, "pending_page", page)
+    
+    if selected:
+        builder.row(
+            InlineKeyboardButton(
+                text=f"✅ Одобрить выбранных ({len(selected)})",
+                callback_data="pending_approve:selected"
+            )
+        )
+    builder.row(
+        InlineKeyboardButton(text="✅ Одобрить страницу", callback_data="pending_approve:page")
+    )
+    builder.row(
+        InlineKeyboardButton(text="✅ Одобрить все заявки", callback_data="pending_approve:all")
+    )
+    builder.row(
+        InlineKeyboardButton(text="🔙 Назад", callback_data="admin_panel")
+    )
+    
+    return builder.as_markup()
+
+
+def get_approve_all_keyboard(pending: int) -> InlineKeyboardMarkup:
+    """Get confirmation keyboard for approving every pending request"""
+    builder = InlineKeyboardBuilder()
+    
+    builder.row(
+        InlineKeyboardButton(text=f"✅ Да, одобрить всех ({pending})", callback_data="pending_approve:all_confirm")
+    )
+    builder.row(
+        InlineKeyboardButton(text="🔙 Назад", callback_data="pending_users")
+    )
+    
+    return builder.as_markup()
+
+
+def get_all_users_keyboard(page: dict, selected: Collection[int] = ()) -> InlineKeyboardMarkup:
+    """Get keyboard for a page of users with access and bulk revoke action"""
+    builder = InlineKeyboardBuilder()
+    
+    for user in page['users']:
+        username = f"@{user['username']}" if user.get('username') else "Без username"
+        builder.row(
+            InlineKeyboardButton(
+                text=f"{_selection_mark(user['user_id'], selected)} {user['user_id']} - {username}",
+                callback_data=f"all_users_pick:{user['user_id']}"
+            )
+        )
+    
+    _add_page_row(builder, "all_users_page", page)
+    
+    if selected:
+        builder.row(
+            InlineKeyboardButton(
+                text=f"🚫 Отозвать доступ у выбранных ({len(selected)})",
+                callback_data="all_users_revoke"
+            )
+        )
     builder.row(
         InlineKeyboardButton(text="🔙 Назад", callback_data="admin_panel")
     )
@@ -93,6 +182,75 @@ def get_user_action_keyboard(user_id: int, has_access: bool) -> InlineKeyboardMa
     return builder.as_markup()
 
 
+def get_broadcasts_keyboard(broadcasts: List[Dict], status_labels: Dict[str, str]) -> InlineKeyboardMarkup:
+    """Get keyboard with recent broadcasts and a button to start a new one"""
+    builder = InlineKeyboardBuilder()
+    
+    for broadcast in broadcasts:
+        status = status_labels.get(broadcast['status'], broadcast['status'])
+        builder.row(
+            InlineKeyboardButton(
+                text=f"📣 #{broadcast['id']} — {status}, получателей: {broadcast['total']}",
+                callback_data=f"broadcast_view:{broadcast['id']}"
+            )
+        )
+    
+    builder.row(
+        InlineKeyboardButton(text="📝 Новая рассылка", callback_data="broadcast_new")
+    )
+    builder.row(
+        InlineKeyboardButton(text="🔙 Назад", callback_data="admin_panel")
+    )
+    
+    return builder.as_markup()
+
+
+def get_broadcast_segments_keyboard(segments: Dict[str, str]) -> InlineKeyboardMarkup:
+    """Get keyboard to choose who receives a broadcast"""
+    builder = InlineKeyboardBuilder()
+    
+    for name, label in segments.items():
+        builder.row(
+            InlineKeyboardButton(text=f"👥 {label.capitalize()}", callback_data=f"broadcast_segment:{name}")
+        )
+    
+    builder.row(
+        InlineKeyboardButton(text="🔙 Назад", callback_data="broadcasts")
+    )
+    
+    return builder.as_markup()
+
+
+def get_broadcast_confirm_keyboard() -> InlineKeyboardMarkup:
+    """Get keyboard confirming a broadcast"""
+    builder = InlineKeyboardBuilder()
+    
+    builder.row(
+        InlineKeyboardButton(text="✅ Отправить", callback_data="broadcast_confirm"),
+        InlineKeyboardButton(text="❌ Отмена", callback_data="cancel")
+    )
+    
+    return builder.as_markup()
+
+
+def get_broadcast_keyboard(broadcast_id: int, running: bool) -> InlineKeyboardMarkup:
+    """Get keyboard under broadcast progress"""
+    builder = InlineKeyboardBuilder()
+    
+    builder.row(
+        InlineKeyboardButton(text="🔄 Обновить", callback_data=f"broadcast_view:{broadcast_id}")
+    )
+    if running:
+        builder.row(
+            InlineKeyboardButton(text="⛔ Остановить", callback_data=f"broadcast_cancel:{broadcast_id}")
+        )
+    builder.row(
+        InlineKeyboardButton(text="🔙 Назад", callback_data="broadcasts")
+    )
+    
+    return builder.as_markup()
+
+
 def get_user_data_menu() -> InlineKeyboardMarkup:
     """Get user data menu keyboard"""
     builder = InlineKeyboardBuilder()
@@ -106,13 +264,15 @@ def get_user_data_menu() -> InlineKeyboardMarkup:
         InlineKeyboardButton(text="🎯 Добавить цель", callback_data="add_goal")
     )
     builder.row(
-        InlineKeyboardButton(text="🎯 Целевой вес", callback_data="add_target_weight")
+        InlineKeyboardButton(text="🎯 Целевой вес", callback_data="add_target_weight"),
+        InlineKeyboardButton(text="📉 Динамика веса", callback_data="weight_history")
     )
     builder.row(
         InlineKeyboardButton(text="💪 Добавить тренировку", callback_data="add_workout")
     )
     builder.row(
-        InlineKeyboardButton(text="📜 История тренировок", callback_data="view_workouts")
+        InlineKeyboardButton(text="📜 История тренировок", callback_data="view_workouts"),
+        InlineKeyboardButton(text="📈 График", callback_data="progress_chart")
     )
     builder.row(
         InlineKeyboardButton(text="🔙 Назад", callback_data="main_menu")
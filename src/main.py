@@ -1,13 +1,29 @@
 import asyncio
 import logging
+from typing import Optional
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.fsm.storage.memory import MemoryStorage
 
 from src.config.settings import settings
-from src.handlers import menu_handler, admin_handler, user_data_handler, diet_ai_handler
+from src.handlers import menu_handler, admin_handler, user_data_handler, diet_ai_handler, broadcast_handler
+from src.middlewares.metrics import MetricsMiddleware
+from src.middlewares.user_context import UserContextMiddleware
+from src.services.access_service import AccessService
+from src.services.broadcast_service import BroadcastService
+from src.services.chart_service import ChartService
+from src.services.conversation_service import ConversationService
+from src.services.metrics import FSM_STATES, QUEUE_DEPTH
+from src.services.mistral_scheduler import MistralScheduler
+from src.services.mistral_service import MistralService, create_http_client
+from src.services.response_cache import ResponseCache
+from src.services.single_flight import SingleFlight
 from src.storage.db import Database
+from src.storage.fsm_storage import SQLiteStorage
+from src.web.metrics import MetricsServer
+from src.web.webhook import WebhookServer
 
 logging.basicConfig(
     level=logging.INFO,
@@ -16,6 +32,68 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def create_dispatcher(
+    storage: BaseStorage,
+    db: Database,
+    access_service: AccessService,
+    single_flight: SingleFlight,
+    response_cache: ResponseCache,
+    broadcast_service: Optional[BroadcastService] = None,
+    chart_service: Optional[ChartService] = None,
+    conversation_service: Optional[ConversationService] = None
+) -> Dispatcher:
+    """
+    Create dispatcher with all routers, middlewares and shared instances
+    
+    Routers are module-level, so this can be called once per process.
+    
+    Args:
+        storage: FSM storage
+        db: Database instance
+        access_service: Loaded access service
+        single_flight: Entry point for AI requests
+        response_cache: Cache of AI answers
+        broadcast_service: Admin broadcasts, needs the bot so optional
+        chart_service: Progress charts; a new one is created if omitted,
+            its rendering processes only start with the first chart
+        conversation_service: Context of follow-up AI questions; a new one
+            using single_flight's scheduler is created if omitted
+    
+    Returns:
+        Dispatcher ready for polling, webhook or feed_update
+    """
+    dp = Dispatcher(storage=storage)
+    
+    # Register handlers
+    dp.include_router(menu_handler.router)
+    dp.include_router(admin_handler.router)
+    dp.include_router(user_data_handler.router)
+    dp.include_router(diet_ai_handler.router)
+    dp.include_router(broadcast_handler.router)
+    
+    # Time handlers, including the user context lookups below
+    metrics_middleware = MetricsMiddleware()
+    dp.message.middleware(metrics_middleware)
+    dp.callback_query.middleware(metrics_middleware)
+    
+    # Resolve access, admin flag, profile and quota once per update
+    user_context_middleware = UserContextMiddleware(access_service, db)
+    dp.message.middleware(user_context_middleware)
+    dp.callback_query.middleware(user_context_middleware)
+    
+    # Store shared instances for handlers
+    dp['db'] = db
+    dp['access_service'] = access_service
+    dp['single_flight'] = single_flight
+    dp['response_cache'] = response_cache
+    if broadcast_service:
+        dp['broadcast_service'] = broadcast_service
+    dp['chart_service'] = chart_service or ChartService(db)
+    dp['conversation_service'] = conversation_service or ConversationService(db, single_flight.scheduler)
+    
+    return dp
+
+
 async def main():
     """Main bot entry point"""
     
@@ -23,30 +101,88 @@ async def main():
     db = Database()
     await db.init_db()
     
+    # Load approved users into memory
+    access_service = AccessService(db)
+    await access_service.load()
+    
+    # Shared keep-alive HTTP client for Mistral API
+    http_client = create_http_client()
+    mistral_service = MistralService(http_client)
+    
+    # Fair, rate limited queue in front of Mistral API
+    mistral_scheduler = MistralScheduler(mistral_service)
+    
+    # Identical questions asked at the same time share one request
+    single_flight = SingleFlight(mistral_scheduler)
+    
+    # Cache of AI answers to repeated questions
+    response_cache = ResponseCache(db)
+    
+    # Earlier turns and rolling summaries for follow-up questions
+    conversation_service = ConversationService(db, mistral_scheduler)
+    
     # Initialize bot and dispatcher
     bot = Bot(
         token=settings.BOT_TOKEN,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
     
-    storage = MemoryStorage()
-    dp = Dispatcher(storage=storage)
+    # FSM states survive restarts unless FSM_STORAGE=memory
+    if settings.FSM_STORAGE == "memory":
+        storage = MemoryStorage()
+    else:
+        storage = SQLiteStorage(db)
     
-    # Register handlers
-    dp.include_router(menu_handler.router)
-    dp.include_router(admin_handler.router)
-    dp.include_router(user_data_handler.router)
-    dp.include_router(diet_ai_handler.router)
+    # Admin broadcasts, sent in the background
+    broadcast_service = BroadcastService(db, bot)
     
-    # Store database instance for handlers
-    dp['db'] = db
+    # Progress charts, rendered in worker processes
+    chart_service = ChartService(db)
+    
+    dp = create_dispatcher(
+        storage, db, access_service, single_flight, response_cache,
+        broadcast_service, chart_service, conversation_service
+    )
+    
+    webhook_server = WebhookServer(dp, bot) if settings.BOT_MODE == "webhook" else None
+    
+    # Gauges sampled on each metrics scrape
+    QUEUE_DEPTH.set_function(lambda: {
+        'mistral': mistral_scheduler.waiting,
+        'db_writes': db.write_queue_depth,
+        'webhook': webhook_server.queue_depth if webhook_server else 0,
+        'broadcast': broadcast_service.pending
+    })
+    if isinstance(storage, SQLiteStorage):
+        FSM_STATES.set_function(storage.state_counts)
+    
+    metrics_server = None
+    if settings.METRICS_PORT:
+        metrics_server = MetricsServer()
+        await metrics_server.start()
+    
+    # Continue broadcasts interrupted by the last shutdown
+    await broadcast_service.resume()
     
     logger.info("Bot started successfully")
     
     try:
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        if webhook_server:
+            await webhook_server.serve()
+        else:
+            # getUpdates is refused while a webhook is set
+            await bot.delete_webhook()
+            await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     finally:
+        if metrics_server:
+            await metrics_server.stop()
+        await broadcast_service.close()
+        await chart_service.close()
+        await conversation_service.close()
         await bot.session.close()
+        await http_client.aclose()
+        # Writes FSM changes not flushed yet, before the database goes away
+        await storage.close()
         await db.close()
 
 
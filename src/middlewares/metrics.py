@@ -0,0 +1,31 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject
+from src.services.metrics import HANDLER_LATENCY
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Observes handler latency in HANDLER_LATENCY
+    
+    Runs as an inner middleware, so only events that matched a handler are
+    timed. The handler function name is used as the label: it stands for
+    the callback data or FSM state that selected it while keeping the
+    number of series bounded (callback data carries user IDs and cursors).
+    """
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            handler_object = data.get("handler")
+            name = handler_object.callback.__name__ if handler_object else "unknown"
+            kind = "callback_query" if isinstance(event, CallbackQuery) else "message"
+            HANDLER_LATENCY.observe(time.perf_counter() - started, kind, name)
@@ -0,0 +1,74 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from src.services.access_service import AccessService
+from src.services.quota_service import QuotaService
+
+# Marks a lazily loaded value that hasn't been fetched yet
+_NOT_LOADED = object()
+
+
+class UserContext:
+    """
+    Everything handlers need to know about the user behind an update
+    
+    Access and admin flags come from AccessService memory. Profile and
+    quota usage are loaded from the database on first use and then reused
+    for the rest of the update, so each is fetched at most once.
+    """
+    
+    def __init__(self, user_id: int, has_access: bool, is_admin: bool, db):
+        self.user_id = user_id
+        self.has_access = has_access
+        self.is_admin = is_admin
+        self.db = db
+        self.quota = QuotaService(db)
+        self._profile = _NOT_LOADED
+        self._quota_used: Optional[int] = None
+    
+    async def get_profile(self) -> Optional[Dict]:
+        """Get user data (weight, height, age, goal, etc.)"""
+        if self._profile is _NOT_LOADED:
+            self._profile = await self.db.get_user_data(self.user_id)
+        return self._profile
+    
+    async def get_quota_used(self) -> int:
+        """Get number of AI requests counted against the limit"""
+        if self._quota_used is None:
+            self._quota_used = await self.quota.get_used(self.user_id)
+        return self._quota_used
+    
+    async def get_ai_history(self, limit: int) -> List[Dict]:
+        """Get most recent AI requests; quota usage is read in the same query"""
+        result = await self.db.get_ai_history_with_quota(self.user_id, limit)
+        if self._quota_used is None:
+            self._quota_used = self.quota.count_used(result['quota'])
+        return result['history']
+    
+    async def get_quota_remaining(self) -> int:
+        """Get number of AI requests left"""
+        return self.quota.get_remaining(await self.get_quota_used())
+
+
+class UserContextMiddleware(BaseMiddleware):
+    """Resolves UserContext once per update and passes it as user_context"""
+    
+    def __init__(self, access_service: AccessService, db):
+        self.access_service = access_service
+        self.db = db
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is not None:
+            data["user_context"] = UserContext(
+                user.id,
+                has_access=await self.access_service.check_access(user.id),
+                is_admin=await self.access_service.is_admin(user.id),
+                db=self.db
+            )
+        return await handler(event, data)
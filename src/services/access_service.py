@@ -1,13 +1,76 @@
-from typing import Optional, List, Dict
+import asyncio
+import logging
+from array import array
+from bisect import bisect_left, insort
+from heapq import merge
+from typing import Optional, List, Dict, Set, Iterable
 from src.config.settings import settings
 
+logger = logging.getLogger(__name__)
+
+
+def _contains(ids: array, user_id: int) -> bool:
+    """Check if sorted array contains user ID"""
+    index = bisect_left(ids, user_id)
+    return index < len(ids) and ids[index] == user_id
+
+
+def _add(ids: array, user_id: int):
+    """Insert user ID into sorted array if missing"""
+    if not _contains(ids, user_id):
+        insort(ids, user_id)
+
+
+def _remove(ids: array, user_id: int):
+    """Remove user ID from sorted array if present"""
+    index = bisect_left(ids, user_id)
+    if index < len(ids) and ids[index] == user_id:
+        del ids[index]
+
+
+def _add_many(ids: array, user_ids: Iterable[int]) -> array:
+    """Get sorted array with user IDs added in one pass instead of an insort each"""
+    new_ids = sorted(user_id for user_id in set(user_ids) if not _contains(ids, user_id))
+    return array(ids.typecode, merge(ids, new_ids))
+
+
+def _remove_many(ids: array, user_ids: Iterable[int]) -> array:
+    """Get sorted array without user IDs"""
+    removed = set(user_ids)
+    return array(ids.typecode, (user_id for user_id in ids if user_id not in removed))
+
 
 class AccessService:
-    """Service for managing user access and permissions"""
+    """
+    Service for managing user access and permissions
+    
+    Approved and registered user IDs are kept in sorted int64 arrays
+    (8 bytes per user), so access checks are a binary search in memory
+    and never touch the database. One instance is created in main() and
+    shared by all handlers.
+    """
     
     def __init__(self, db):
         """Initialize access service with database instance"""
         self.db = db
+        self._approved = array('q')
+        self._known = array('q')
+        self._background: Set[asyncio.Task] = set()
+    
+    async def load(self):
+        """Load approved and registered user IDs from database"""
+        self._approved = await self.db.get_user_ids(has_access=True)
+        self._known = await self.db.get_user_ids()
+        logger.info(f"Loaded {len(self._approved)} approved of {len(self._known)} users")
+    
+    @property
+    def approved_count(self) -> int:
+        """Number of users with access, without a query"""
+        return len(self._approved)
+    
+    def memory_usage(self) -> int:
+        """Get bytes used by the in-memory ID arrays"""
+        return (len(self._approved) + len(self._known)) * self._approved.itemsize
     
     async def is_admin(self, user_id: int) -> bool:
         """Check if user is admin"""
@@ -20,31 +83,90 @@ class AccessService:
             return True
         
         # Check if user has been granted access
-        return await self.db.has_access(user_id)
+        if _contains(self._approved, user_id):
+            return True
+        
+        # Register unknown users in the background
+        if not _contains(self._known, user_id):
+            _add(self._known, user_id)
+            task = asyncio.create_task(self._register(user_id))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+        
+        return False
+    
+    async def _register(self, user_id: int):
+        """Create user record so the request shows up for the admin"""
+        try:
+            await self.db.register_user(user_id)
+        except Exception as e:
+            # Forget the user so the next check retries registration
+            _remove(self._known, user_id)
+            logger.error(f"Failed to register user {user_id}: {e}")
     
     async def grant_access(self, user_id: int) -> bool:
         """Grant access to user"""
         try:
-            await self.db.grant_access(user_id)
-            return True
+            await self.db.grant_access(user_id, durable=True)
         except Exception:
             return False
+        
+        _add(self._approved, user_id)
+        _add(self._known, user_id)
+        return True
     
     async def revoke_access(self, user_id: int) -> bool:
         """Revoke user access"""
         try:
-            await self.db.revoke_access(user_id)
-            return True
+            await self.db.revoke_access(user_id, durable=True)
         except Exception:
             return False
+        
+        _remove(self._approved, user_id)
+        return True
+    
+    async def grant_access_many(self, user_ids: List[int]) -> List[int]:
+        """
+        Grant access to several users at once
+        
+        Returns:
+            IDs of users who got access (already approved ones are skipped)
+        """
+        granted = await self.db.set_access_many(user_ids, True)
+        self._approved = _add_many(self._approved, granted)
+        self._known = _add_many(self._known, granted)
+        return granted
+    
+    async def grant_access_to_pending(self) -> List[int]:
+        """
+        Grant access to everyone waiting for it
+        
+        Returns:
+            IDs of users who got access
+        """
+        granted = await self.db.grant_access_to_pending()
+        self._approved = _add_many(self._approved, granted)
+        self._known = _add_many(self._known, granted)
+        return granted
+    
+    async def revoke_access_many(self, user_ids: List[int]) -> List[int]:
+        """
+        Revoke access of several users at once
+        
+        Returns:
+            IDs of users who lost access
+        """
+        revoked = await self.db.set_access_many(user_ids, False)
+        self._approved = _remove_many(self._approved, revoked)
+        return revoked
     
-    async def get_pending_users(self) -> List[Dict]:
-        """Get list of users waiting for access"""
-        return await self.db.get_pending_users()
+    async def get_pending_users(self, after: Optional[int] = None, before: Optional[int] = None) -> Dict:
+        """Get a page of users waiting for access"""
+        return await self.db.get_pending_users(after, before, settings.ADMIN_PAGE_SIZE)
     
-    async def get_all_users(self) -> List[Dict]:
-        """Get all users with access"""
-        return await self.db.get_all_users()
+    async def get_all_users(self, after: Optional[int] = None, before: Optional[int] = None) -> Dict:
+        """Get a page of users with access"""
+        return await self.db.get_all_users(after, before, settings.ADMIN_PAGE_SIZE)
     
     async def get_user_info(self, user_id: int) -> Optional[Dict]:
         """Get user information"""
@@ -52,14 +174,12 @@ class AccessService:
     
     async def get_stats(self) -> Dict:
         """Get bot statistics"""
-        total_users = await self.db.get_total_users()
-        approved_users = await self.db.get_approved_users_count()
-        pending_users = await self.db.get_pending_users_count()
-        total_ai_requests = await self.db.get_total_ai_requests()
+        # All figures come from trigger-maintained counters in one query
+        counters = await self.db.get_counters()
         
         return {
-            'total_users': total_users,
-            'approved_users': approved_users,
-            'pending_users': pending_users,
-            'total_ai_requests': total_ai_requests
+            'total_users': counters.get('total_users', 0),
+            'approved_users': counters.get('approved_users', 0),
+            'pending_users': counters.get('pending_users', 0),
+            'total_ai_requests': counters.get('total_ai_requests', 0)
         }
\ No newline at end of file
@@ -0,0 +1,404 @@
+import asyncio
+import logging
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+)
+from src.config.settings import settings
+from src.keyboards.inline import get_broadcast_keyboard
+from src.storage.db import Database, DELIVERY_FAILED, DELIVERY_SENT
+
+logger = logging.getLogger(__name__)
+
+# Telegram allows about one message per second to the same chat
+CHAT_INTERVAL = 1.0
+# Recipients loaded from the database at a time
+LOAD_CHUNK = 1000
+
+# Segment names shown to the admin
+SEGMENT_LABELS = {
+    'all': "все пользователи с доступом",
+    'with_profile': "заполнившие профиль",
+    'ai_active': "спрашивавшие ИИ за 30 дней",
+}
+
+STATUS_LABELS = {
+    'running': "идёт",
+    'done': "завершена",
+    'cancelled': "остановлена",
+}
+
+
+class _RateLimiter:
+    """
+    Spaces out sends to stay under the global and per-chat limits
+    
+    Every send reserves the next free slot, at most `rate` per second
+    overall and one per CHAT_INTERVAL for the same chat. A flood-wait
+    answer pauses all sends, slots reserved before it are re-reserved.
+    """
+    
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+        # Chat -> time of its last send, oldest first
+        self._chats: "OrderedDict[int, float]" = OrderedDict()
+    
+    async def wait(self, chat_id: int):
+        """Wait until a message may be sent to chat"""
+        while True:
+            now = time.monotonic()
+            self._forget(now)
+            
+            slot = max(now, self._next_slot, self._paused_until, self._chats.get(chat_id, 0.0) + CHAT_INTERVAL)
+            self._next_slot = slot + self.interval
+            paused_until = self._paused_until
+            
+            if slot > now:
+                await asyncio.sleep(slot - now)
+            
+            if self._paused_until == paused_until:
+                self._chats[chat_id] = slot
+                self._chats.move_to_end(chat_id)
+                return
+    
+    def pause(self, delay: float):
+        """Stop all sends for delay seconds"""
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        self._next_slot = max(self._next_slot, self._paused_until)
+    
+    def _forget(self, now: float):
+        """Drop chats whose last send no longer limits the next one"""
+        while self._chats:
+            chat_id, sent = next(iter(self._chats.items()))
+            if sent + CHAT_INTERVAL > now:
+                break
+            del self._chats[chat_id]
+
+
+class _Progress:
+    """Live delivery counters of a running broadcast"""
+    
+    def __init__(self, broadcast: Dict, counts: Dict[int, int]):
+        self.broadcast = broadcast
+        self.total = broadcast['total']
+        self.sent = counts.get(DELIVERY_SENT, 0)
+        self.failed = counts.get(DELIVERY_FAILED, 0)
+        self.errors: Counter = Counter()
+        # Throughput is measured from this (re)start
+        self.started = time.monotonic()
+        self.done_since_start = 0
+    
+    @property
+    def pending(self) -> int:
+        return self.total - self.sent - self.failed
+    
+    @property
+    def rate(self) -> float:
+        """Messages handled per second since start"""
+        elapsed = time.monotonic() - self.started
+        return self.done_since_start / elapsed if elapsed > 0 else 0.0
+
+
+class BroadcastService:
+    """
+    Sends admin announcements and notifications to users
+    
+    Recipients and their delivery status are stored in SQLite, so a
+    broadcast interrupted by a restart continues with the users not
+    reached yet (resume() is called from main()). Sends are spread over
+    BROADCAST_CONCURRENCY workers and limited to BROADCAST_RATE messages
+    per second overall; Telegram's retry_after pauses all sending.
+    Progress is shown in the report message, refreshed every
+    BROADCAST_REPORT_INTERVAL seconds.
+    
+    Short notifications (e.g. access approved) go through notify(): they
+    share the rate limit but are kept in memory only.
+    """
+    
+    def __init__(self, db: Database, bot: Bot):
+        """
+        Initialize broadcast service
+        
+        Args:
+            db: Database instance
+            bot: Bot sending the messages
+        """
+        self.db = db
+        self.bot = bot
+        self.concurrency = settings.BROADCAST_CONCURRENCY
+        self.max_retries = settings.BROADCAST_RETRIES
+        self.report_interval = settings.BROADCAST_REPORT_INTERVAL
+        self._limiter = _RateLimiter(settings.BROADCAST_RATE)
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._progress: Dict[int, _Progress] = {}
+        self._notifications: asyncio.Queue = asyncio.Queue()
+        self._notifiers: List[asyncio.Task] = []
+    
+    @property
+    def pending(self) -> int:
+        """Number of messages still to be sent by running broadcasts and notify()"""
+        broadcasts = sum(progress.pending for progress in self._progress.values())
+        return broadcasts + self._notifications.qsize()
+    
+    def notify(self, user_ids: Iterable[int], text: str):
+        """
+        Queue a message to users and return immediately
+        
+        Args:
+            user_ids: Recipients
+            text: HTML message text
+        """
+        for user_id in user_ids:
+            self._notifications.put_nowait((user_id, text))
+        
+        if not self._notifiers:
+            self._notifiers = [
+                asyncio.create_task(self._notify_worker()) for _ in range(self.concurrency)
+            ]
+    
+    async def count_recipients(self, segment: str) -> int:
+        """Count users a broadcast to segment would reach"""
+        return await self.db.count_broadcast_recipients(segment)
+    
+    async def start(self, text: str, segment: str, report_chat_id: int, report_message_id: int) -> int:
+        """
+        Create a broadcast and start sending it
+        
+        Args:
+            text: HTML message text
+            segment: Key of SEGMENT_LABELS
+            report_chat_id: Chat of the message showing progress
+            report_message_id: Message showing progress
+        
+        Returns:
+            Broadcast ID
+        """
+        broadcast_id = await self.db.create_broadcast(text, segment, report_chat_id)
+        await self.db.set_broadcast_report_message(broadcast_id, report_chat_id, report_message_id)
+        await self._launch(broadcast_id)
+        return broadcast_id
+    
+    async def resume(self):
+        """Continue broadcasts interrupted by a restart"""
+        for broadcast_id in await self.db.get_running_broadcast_ids():
+            logger.info(f"Resuming broadcast {broadcast_id}")
+            await self._launch(broadcast_id)
+    
+    async def cancel(self, broadcast_id: int) -> bool:
+        """Stop a running broadcast; messages already sent stay sent"""
+        task = self._tasks.get(broadcast_id)
+        progress = self._progress.get(broadcast_id)
+        if task is None or task.done() or progress is None:
+            return False
+        # A broadcast that has just finished stays done
+        if progress.broadcast['status'] != 'running':
+            return False
+        
+        progress.broadcast['status'] = 'cancelled'
+        await self.db.finish_broadcast(broadcast_id, 'cancelled')
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return True
+    
+    async def close(self):
+        """Stop sending without finishing broadcasts, so they resume on next start"""
+        if self._notifications.qsize():
+            logger.warning(f"Dropping {self._notifications.qsize()} unsent notifications")
+        
+        tasks = list(self._tasks.values()) + self._notifiers
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._notifiers = []
+    
+    async def get_report(self, broadcast_id: int) -> Optional[str]:
+        """Get progress text of a broadcast, live if it is running"""
+        progress = self._progress.get(broadcast_id)
+        if progress is not None:
+            return self._format(progress)
+        
+        broadcast = await self.db.get_broadcast(broadcast_id)
+        if broadcast is None:
+            return None
+        return self._format(_Progress(broadcast, await self.db.get_delivery_counts(broadcast_id)))
+    
+    def is_running(self, broadcast_id: int) -> bool:
+        """Check if broadcast is being sent by this process"""
+        return broadcast_id in self._tasks
+    
+    async def get_recent(self) -> List[Dict]:
+        """Get most recent broadcasts"""
+        return await self.db.get_broadcasts()
+    
+    async def _launch(self, broadcast_id: int):
+        """Load broadcast state and start its sending task"""
+        broadcast = await self.db.get_broadcast(broadcast_id)
+        progress = _Progress(broadcast, await self.db.get_delivery_counts(broadcast_id))
+        self._progress[broadcast_id] = progress
+        
+        task = asyncio.create_task(self._run(progress))
+        self._tasks[broadcast_id] = task
+        
+        def forget(_):
+            self._tasks.pop(broadcast_id, None)
+            self._progress.pop(broadcast_id, None)
+        
+        task.add_done_callback(forget)
+    
+    async def _run(self, progress: _Progress):
+        """Send a broadcast to all pending recipients"""
+        broadcast_id = progress.broadcast['id']
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        workers = [asyncio.create_task(self._worker(progress, queue)) for _ in range(self.concurrency)]
+        reporter = asyncio.create_task(self._report_loop(progress))
+        
+        try:
+            after = 0
+            while True:
+                user_ids = await self.db.get_pending_deliveries(broadcast_id, after, LOAD_CHUNK)
+                if not user_ids:
+                    break
+                for user_id in user_ids:
+                    await queue.put(user_id)
+                after = user_ids[-1]
+            
+            await queue.join()
+            # Set before the write, so cancel() can't overwrite it meanwhile
+            progress.broadcast['status'] = 'done'
+            await self.db.finish_broadcast(broadcast_id, 'done')
+            logger.info(
+                f"Broadcast {broadcast_id} done: {progress.sent} sent, {progress.failed} failed"
+            )
+            
+        except Exception as e:
+            logger.error(f"Broadcast {broadcast_id} stopped: {e}")
+            
+        finally:
+            reporter.cancel()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(reporter, *workers, return_exceptions=True)
+            await self._report(progress)
+    
+    async def _worker(self, progress: _Progress, queue: asyncio.Queue):
+        """Deliver queued recipients one at a time"""
+        while True:
+            user_id = await queue.get()
+            try:
+                await self._deliver(progress, user_id)
+            except Exception as e:
+                logger.error(f"Failed to record delivery to {user_id}: {e}")
+            finally:
+                queue.task_done()
+    
+    async def _notify_worker(self):
+        """Send queued notifications one at a time"""
+        while True:
+            user_id, text = await self._notifications.get()
+            try:
+                error = await self._send(user_id, text)
+                if error is not None:
+                    logger.info(f"Notification to {user_id} not delivered: {error}")
+            except Exception as e:
+                logger.error(f"Failed to notify {user_id}: {e}")
+            finally:
+                self._notifications.task_done()
+    
+    async def _send(self, user_id: int, text: str) -> Optional[str]:
+        """
+        Send a message within the rate limits, retrying what can be retried
+        
+        Returns:
+            None if delivered, otherwise the reason ("blocked" if the user blocked the bot)
+        """
+        attempt = 0
+        while True:
+            await self._limiter.wait(user_id)
+            try:
+                await self.bot.send_message(user_id, text)
+                return None
+                
+            except TelegramRetryAfter as e:
+                # Flood control applies to the whole bot, not just this chat
+                logger.warning(f"Broadcast flood wait {e.retry_after}s")
+                self._limiter.pause(e.retry_after)
+                
+            except TelegramForbiddenError:
+                return "blocked"
+                
+            except TelegramBadRequest as e:
+                return e.message
+                
+            except Exception as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    return str(e) or type(e).__name__
+                await asyncio.sleep(2 ** attempt)
+    
+    async def _deliver(self, progress: _Progress, user_id: int):
+        """Send the message to one recipient and record the result"""
+        error = await self._send(user_id, progress.broadcast['text'])
+        
+        if error is None:
+            progress.sent += 1
+            await self.db.set_delivery_status(progress.broadcast['id'], user_id, DELIVERY_SENT)
+        else:
+            progress.failed += 1
+            progress.errors[error] += 1
+            await self.db.set_delivery_status(progress.broadcast['id'], user_id, DELIVERY_FAILED, error)
+        progress.done_since_start += 1
+    
+    async def _report_loop(self, progress: _Progress):
+        """Refresh the report message while the broadcast runs"""
+        while True:
+            await asyncio.sleep(self.report_interval)
+            await self._report(progress)
+    
+    async def _report(self, progress: _Progress):
+        """Show current progress in the report message"""
+        broadcast = progress.broadcast
+        if not broadcast.get('report_message_id'):
+            return
+        
+        try:
+            await self.bot.edit_message_text(
+                self._format(progress),
+                chat_id=broadcast['report_chat_id'],
+                message_id=broadcast['report_message_id'],
+                reply_markup=get_broadcast_keyboard(broadcast['id'], broadcast['status'] == 'running')
+            )
+        except TelegramBadRequest:
+            # Unchanged text or the message was deleted
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to update broadcast {broadcast['id']} report: {e}")
+    
+    def _format(self, progress: _Progress) -> str:
+        """Format progress for the admin"""
+        broadcast = progress.broadcast
+        status = STATUS_LABELS.get(broadcast['status'], broadcast['status'])
+        
+        text = f"📣 Рассылка #{broadcast['id']} — {status}\n\n"
+        text += f"Получатели: {SEGMENT_LABELS.get(broadcast['segment'], broadcast['segment'])}\n"
+        text += f"✅ Доставлено: {progress.sent} из {progress.total}\n"
+        text += f"❌ Ошибок: {progress.failed}\n"
+        
+        if progress.errors:
+            blocked = progress.errors.get("blocked", 0)
+            text += f"   заблокировали бота: {blocked}, другие: {progress.failed - blocked}\n"
+        
+        if broadcast['status'] == 'running' and progress.done_since_start:
+            rate = progress.rate
+            text += f"\n⚡ Скорость: {rate:.1f} сообщ./с\n"
+            if rate > 0:
+                text += f"⏳ Осталось: ~{int(progress.pending / rate // 60) + 1} мин\n"
+        
+        return text
@@ -0,0 +1,106 @@
+"""
+Progress chart rendering
+
+Runs in ChartService's worker processes, so it only depends on the data
+passed in. matplotlib is imported lazily with the Agg backend: no display
+and no GPU are needed.
+"""
+import io
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+WIDTH_INCHES = 8
+HEIGHT_INCHES = 6
+DPI = 100
+
+WEIGHT_COLOR = "#2e7d32"
+VOLUME_COLOR = "#1565c0"
+TARGET_COLOR = "#c62828"
+
+WEEK_SECONDS = 604800
+# Shorter history is drawn on this many weeks, so one week isn't a wide bar
+MIN_WEEKS_SHOWN = 4
+
+
+def init_worker():
+    """Import matplotlib once per worker, so the first chart isn't slower"""
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.backends.backend_agg import FigureCanvasAgg  # noqa: F401
+
+
+def _dates(week_starts: List[int]) -> List[datetime]:
+    """Middle of each week, where its point or bar is drawn"""
+    return [datetime.fromtimestamp(ts + WEEK_SECONDS // 2, timezone.utc) for ts in week_starts]
+
+
+def render_progress_chart(
+    weights: List[Tuple[int, float, float, float]],
+    volumes: List[Tuple[int, float]],
+    target_weight: Optional[float] = None
+) -> bytes:
+    """
+    Render weekly weight and training volume as PNG
+    
+    Args:
+        weights: (week start, average, min, max) per week, oldest first
+        volumes: (week start, volume in kg) per week, oldest first
+        target_weight: Target weight line, if set
+    
+    Returns:
+        PNG image
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.dates import MO, DateFormatter, WeekdayLocator
+    from matplotlib.figure import Figure
+    
+    # Figure without pyplot keeps no global state between renders
+    figure = Figure(figsize=(WIDTH_INCHES, HEIGHT_INCHES), dpi=DPI)
+    FigureCanvasAgg(figure)
+    weight_axes, volume_axes = figure.subplots(2, 1, sharex=True, gridspec_kw={'height_ratios': [3, 2]})
+    
+    if weights:
+        dates = _dates([row[0] for row in weights])
+        weight_axes.fill_between(
+            dates, [row[2] for row in weights], [row[3] for row in weights],
+            color=WEIGHT_COLOR, alpha=0.15, linewidth=0
+        )
+        weight_axes.plot(dates, [row[1] for row in weights], color=WEIGHT_COLOR, marker="o", label="Средний вес")
+    else:
+        weight_axes.text(0.5, 0.5, "Нет измерений веса", ha="center", va="center", transform=weight_axes.transAxes)
+    
+    if target_weight:
+        weight_axes.axhline(target_weight, color=TARGET_COLOR, linestyle="--", label="Цель")
+    
+    weight_axes.set_title("Вес по неделям, кг")
+    weight_axes.grid(alpha=0.3)
+    if weights or target_weight:
+        weight_axes.legend(loc="best")
+    
+    if volumes:
+        # Bars one week wide, a little narrower to leave gaps
+        volume_axes.bar(_dates([row[0] for row in volumes]), [row[1] for row in volumes], width=5, color=VOLUME_COLOR)
+    else:
+        volume_axes.text(0.5, 0.5, "Нет распознанных тренировок", ha="center", va="center", transform=volume_axes.transAxes)
+        volume_axes.set_yticks([])
+    
+    week_starts = [row[0] for row in weights] + [row[0] for row in volumes]
+    if week_starts:
+        end = max(week_starts) + WEEK_SECONDS
+        start = min(min(week_starts), end - MIN_WEEKS_SHOWN * WEEK_SECONDS)
+        volume_axes.set_xlim(datetime.fromtimestamp(start, timezone.utc), datetime.fromtimestamp(end, timezone.utc))
+        # Ticks on Mondays, at most about ten of them
+        weeks = (end - start) // WEEK_SECONDS
+        volume_axes.xaxis.set_major_locator(WeekdayLocator(byweekday=MO, interval=max(1, -(-weeks // 10))))
+    
+    volume_axes.set_title("Объем тренировок по неделям, кг")
+    volume_axes.grid(alpha=0.3, axis="y")
+    volume_axes.xaxis.set_major_formatter(DateFormatter("%d.%m"))
+    figure.autofmt_xdate()
+    figure.tight_layout()
+    
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png")
+    return buffer.getvalue()
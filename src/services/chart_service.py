@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+import importlib.util
+import logging
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+
+from src.config.settings import settings
+from src.services.chart_renderer import init_worker, render_progress_chart
+from src.services.metrics import CHART_REQUESTS
+from src.storage.db import Database
+
+logger = logging.getLogger(__name__)
+
+# Bump when the chart layout changes, so uploaded charts are redrawn
+CHART_LAYOUT_VERSION = 1
+
+
+class ChartService:
+    """
+    Progress charts of weekly weight and training volume
+    
+    A chart is identified by a hash of the data it shows, so it is only
+    redrawn after that data changes. Images are rendered by a pool of
+    CHART_WORKERS processes with matplotlib, keeping the event loop free.
+    After the first upload Telegram's file_id is stored in chart_files and
+    sent instead of the image: repeated views need neither rendering nor
+    upload. Rendered images not uploaded yet stay in memory, the last
+    CHART_CACHE_SIZE of them.
+    
+    matplotlib is optional; without it `available` is False.
+    """
+    
+    def __init__(self, db: Database):
+        """
+        Initialize chart service
+        
+        Args:
+            db: Database instance
+        """
+        self.db = db
+        self.weeks = settings.CHART_WEEKS
+        self.workers = settings.CHART_WORKERS
+        self.cache_size = settings.CHART_CACHE_SIZE
+        self.available = importlib.util.find_spec("matplotlib") is not None
+        if not self.available:
+            logger.warning("matplotlib is not installed, progress charts are disabled")
+        
+        # Started on first render
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._images: "OrderedDict[Tuple[int, str], bytes]" = OrderedDict()
+        # Renders in progress, shared by concurrent requests for the same chart
+        self._rendering: Dict[Tuple[int, str], asyncio.Future] = {}
+    
+    async def get_chart(self, user_id: int, force_render: bool = False) -> Optional[Dict]:
+        """
+        Get the user's current progress chart
+        
+        Args:
+            user_id: User ID
+            force_render: Return the image even if it was uploaded before,
+                e.g. when Telegram rejected the stored file_id
+        
+        Returns:
+            Dict with version, file_id (uploaded before) or image (PNG
+            bytes, to be uploaded and passed to remember()); None if the
+            user has neither weight history nor recognized workouts
+        """
+        weights = await self.db.get_weight_trend(user_id, 'week', self.weeks)
+        volumes = await self.db.get_weekly_volume(user_id, self.weeks)
+        if not weights and not volumes:
+            return None
+        
+        user_data = await self.db.get_user_data(user_id)
+        data = (
+            [
+                (row['period_start'], round(row['avg_weight'], 1), row['min_weight'], row['max_weight'])
+                for row in weights
+            ],
+            [(row['week_start'], round(row['volume'])) for row in volumes],
+            user_data.get('target_weight') if user_data else None
+        )
+        version = hashlib.sha1(repr((CHART_LAYOUT_VERSION, data)).encode()).hexdigest()[:16]
+        
+        uploaded = None if force_render else await self.db.get_chart_file(user_id)
+        if uploaded and uploaded['version'] == version:
+            CHART_REQUESTS.inc(1, "file_id")
+            return {'version': version, 'file_id': uploaded['file_id'], 'image': None}
+        
+        image = await self._get_image((user_id, version), data)
+        return {'version': version, 'file_id': None, 'image': image}
+    
+    async def remember(self, user_id: int, version: str, file_id: str):
+        """Store file_id of an uploaded chart, its image isn't needed anymore"""
+        await self.db.set_chart_file(user_id, version, file_id)
+        self._images.pop((user_id, version), None)
+    
+    async def forget(self, user_id: int):
+        """Drop the stored file_id, e.g. when Telegram rejects it"""
+        await self.db.delete_chart_file(user_id)
+    
+    async def close(self):
+        """Stop rendering processes"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+    
+    async def _get_image(self, key: Tuple[int, str], data: tuple) -> bytes:
+        """Get image from memory or render it"""
+        image = self._images.get(key)
+        if image is not None:
+            self._images.move_to_end(key)
+            CHART_REQUESTS.inc(1, "memory")
+            return image
+        
+        future = self._rendering.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._render(key, data))
+            self._rendering[key] = future
+            future.add_done_callback(lambda _: self._rendering.pop(key, None))
+            CHART_REQUESTS.inc(1, "rendered")
+        else:
+            CHART_REQUESTS.inc(1, "memory")
+        
+        # A waiter giving up doesn't cancel the render for the others
+        return await asyncio.shield(future)
+    
+    async def _render(self, key: Tuple[int, str], data: tuple) -> bytes:
+        """Render image in the process pool and keep it in memory"""
+        if self._pool is None:
+            # Forking a process with running threads (aiosqlite) isn't safe
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker
+            )
+        
+        try:
+            image = await asyncio.get_running_loop().run_in_executor(self._pool, render_progress_chart, *data)
+        except BrokenProcessPool:
+            # A worker died; start a new pool next time
+            self._pool = None
+            raise
+        
+        self._images[key] = image
+        while len(self._images) > self.cache_size:
+            self._images.popitem(last=False)
+        return image
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from src.config.settings import settings
+from src.services.mistral_scheduler import MistralScheduler
+from src.services.mistral_service import estimate_tokens
+from src.storage.db import Database
+
+logger = logging.getLogger(__name__)
+
+# Turns not summarized yet loaded at most; more only pile up while summaries fail
+MAX_TURNS = 20
+# Most recent turns left out of the summary, so follow-ups see them verbatim
+KEEP_RECENT_TURNS = 2
+
+
+def _turn_tokens(turn: Dict) -> int:
+    """Estimate tokens of a question and its answer"""
+    return estimate_tokens(turn['question']) + estimate_tokens(turn['response'])
+
+
+class ConversationService:
+    """
+    Context for follow-up questions to the AI
+    
+    Questions asked less than AI_CONVERSATION_TIMEOUT seconds apart form a
+    conversation; its turns are read from ai_requests. Once the turns not
+    summarized yet exceed AI_HISTORY_TOKENS, all but the last
+    KEEP_RECENT_TURNS are folded into a rolling summary stored in
+    ai_conversations, so the prompt stays bounded however long the
+    conversation runs. Summaries are made in the background after the
+    answer is sent, queued by the scheduler like questions, and don't
+    count against the user's quota.
+    """
+    
+    def __init__(self, db: Database, scheduler: MistralScheduler):
+        """
+        Initialize conversation service
+        
+        Args:
+            db: Database instance
+            scheduler: Scheduler making the summary requests
+        """
+        self.db = db
+        self.scheduler = scheduler
+        self.timeout = settings.AI_CONVERSATION_TIMEOUT
+        self.history_tokens = settings.AI_HISTORY_TOKENS
+        # Summaries being made, one per user at a time
+        self._tasks: Dict[int, asyncio.Task] = {}
+    
+    async def get_context(self, user_id: int) -> Optional[Dict]:
+        """
+        Get the ongoing conversation to send along with a question
+        
+        Returns:
+            Dict with summary and history (dicts with question and response,
+            oldest first) to merge into user_data, or None if the question
+            starts a new conversation
+        """
+        summary, turns = await self._load(user_id)
+        if not summary and not turns:
+            return None
+        
+        return {
+            'summary': summary,
+            'history': [{'question': turn['question'], 'response': turn['response']} for turn in turns]
+        }
+    
+    def after_answer(self, user_id: int, context: Optional[Dict], question: str, response: str):
+        """
+        Start summarizing older turns if the conversation outgrew AI_HISTORY_TOKENS
+        
+        Args:
+            user_id: User ID
+            context: What get_context() returned for this question
+            question: Question just answered
+            response: The answer
+        """
+        turns = (context or {}).get('history', []) + [{'question': question, 'response': response}]
+        if len(turns) <= KEEP_RECENT_TURNS or sum(_turn_tokens(turn) for turn in turns) <= self.history_tokens:
+            return
+        if user_id in self._tasks:
+            return
+        
+        task = asyncio.create_task(self._summarize(user_id))
+        self._tasks[user_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(user_id, None))
+    
+    async def close(self):
+        """Stop summaries in progress; the turns are summarized after the next answer"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    
+    async def _load(self, user_id: int) -> Tuple[str, List[Dict]]:
+        """Get summary and turns not summarized yet (oldest first) of the ongoing conversation"""
+        conversation = await self.db.get_ai_conversation(user_id) or {'summary': "", 'until_id': 0, 'until_ts': 0}
+        rows = await self.db.get_ai_turns(user_id, conversation['until_id'], conversation['until_ts'], MAX_TURNS)
+        
+        # A longer pause than the timeout ends the conversation, earlier turns don't count
+        previous_ts = time.time()
+        turns = []
+        for row in rows:
+            if previous_ts - row['created_ts'] > self.timeout:
+                return "", turns[::-1]
+            turns.append(row)
+            previous_ts = row['created_ts']
+        
+        summary = conversation['summary']
+        if previous_ts - conversation['until_ts'] > self.timeout:
+            summary = ""
+        return summary, turns[::-1]
+    
+    async def _summarize(self, user_id: int):
+        """Fold all but the most recent turns into the summary"""
+        try:
+            summary, turns = await self._load(user_id)
+            older = turns[:-KEEP_RECENT_TURNS]
+            if not older:
+                return
+            
+            summary = await self.scheduler.summarize_conversation(summary, older, user_id=user_id)
+            await self.db.set_ai_conversation(user_id, summary, older[-1]['id'], older[-1]['created_ts'])
+        except Exception as e:
+            logger.warning(f"Failed to summarize AI conversation of user {user_id}: {e}")
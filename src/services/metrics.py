@@ -0,0 +1,242 @@
+import functools
+import inspect
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Default histogram buckets in seconds, from fast DB reads to slow AI answers
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Value for a label set, or a callable returning values for all label sets
+GaugeFunction = Callable[[], Dict]
+
+
+def _escape(value: str) -> str:
+    """Escape label value for the Prometheus text format"""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    """Format label set like {name="value",le="0.5"}"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    """Format sample value, keeping integers without a fraction"""
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Named metric with a fixed list of label names"""
+    
+    kind = "untyped"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+    
+    def render(self) -> List[str]:
+        """Get exposition lines including HELP and TYPE"""
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            *self._samples()
+        ]
+    
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set"""
+    
+    kind = "counter"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+    
+    def inc(self, amount: float = 1, *labels: str):
+        """Increase value of the label set by amount"""
+        self._values[labels] = self._values.get(labels, 0) + amount
+    
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in self._values.items()
+        ]
+
+
+class Gauge(_Metric):
+    """
+    Current value per label set
+    
+    Values are either set directly or sampled on each scrape from a
+    function returning {label values: value}.
+    """
+    
+    kind = "gauge"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function: Optional[GaugeFunction] = None
+    
+    def set(self, value: float, *labels: str):
+        """Set value of the label set"""
+        self._values[labels] = value
+    
+    def set_function(self, function: Optional[GaugeFunction]):
+        """Sample values from function on each scrape; keys may be tuples or single strings"""
+        self._function = function
+    
+    def _samples(self) -> List[str]:
+        values = self._values
+        if self._function is not None:
+            values = {
+                key if isinstance(key, tuple) else (key,): value
+                for key, value in self._function().items()
+            }
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in values.items()
+        ]
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values per label set
+    
+    Each observation is one bisect and three increments; bucket counts are
+    made cumulative only when rendered.
+    """
+    
+    kind = "histogram"
+    
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: count of each bucket, then the +Inf bucket, then the sum
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+    
+    def observe(self, value: float, *labels: str):
+        """Record one observation for the label set"""
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+    
+    def _samples(self) -> List[str]:
+        lines = []
+        bounds = self.buckets + (float("inf"),)
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together"""
+    
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+    
+    def register(self, metric: _Metric) -> _Metric:
+        """Add metric to the registry and return it"""
+        self._metrics.append(metric)
+        return metric
+    
+    def render(self) -> str:
+        """Get all metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def timed_methods(histogram: Histogram):
+    """
+    Class decorator observing the duration of every public coroutine method
+    
+    The method name is used as the only label value.
+    """
+    def decorate(cls):
+        for name, method in list(vars(cls).items()):
+            if not name.startswith("_") and inspect.iscoroutinefunction(method):
+                setattr(cls, name, _timed(method, histogram, name))
+        return cls
+    
+    return decorate
+
+
+def _timed(method, histogram: Histogram, label: str):
+    """Wrap coroutine method to observe its duration"""
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started, label)
+    
+    return wrapper
+
+
+# Global registry and the bot's metrics
+REGISTRY = Registry()
+
+HANDLER_LATENCY = REGISTRY.register(Histogram(
+    "dietbot_handler_duration_seconds",
+    "Time spent in update handlers",
+    ("event", "handler")
+))
+DB_QUERY_LATENCY = REGISTRY.register(Histogram(
+    "dietbot_db_query_duration_seconds",
+    "Time spent in Database methods",
+    ("method",)
+))
+MISTRAL_LATENCY = REGISTRY.register(Histogram(
+    "dietbot_mistral_request_duration_seconds",
+    "Mistral API request latency by mode and HTTP status",
+    ("mode", "status")
+))
+MISTRAL_TOKENS = REGISTRY.register(Counter(
+    "dietbot_mistral_tokens_total",
+    "Tokens reported by Mistral API usage",
+    ("type",)
+))
+FSM_STATES = REGISTRY.register(Gauge(
+    "dietbot_fsm_states",
+    "Chats currently in each FSM state",
+    ("state",)
+))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "dietbot_queue_depth",
+    "Items waiting in internal queues",
+    ("queue",)
+))
+CHART_REQUESTS = REGISTRY.register(Counter(
+    "dietbot_chart_requests_total",
+    "Progress charts shown by where the image came from",
+    ("source",)
+))
@@ -0,0 +1,336 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Optional, Dict, Deque, AsyncIterator, Awaitable, Callable, List
+from src.config.settings import settings
+from src.services.mistral_service import MistralService, MistralRateLimitError
+
+logger = logging.getLogger(__name__)
+
+# Called with the caller's queue position when a request has to wait
+QueueCallback = Callable[[int], Awaitable[None]]
+
+
+class MistralScheduler:
+    """
+    Fair scheduler in front of MistralService
+    
+    At most MISTRAL_MAX_CONCURRENCY requests run at once and new ones start
+    no faster than the token bucket allows (MISTRAL_RATE_LIMIT_RPS with
+    bursts of MISTRAL_RATE_LIMIT_BURST). Waiting requests are served one
+    user at a time in round-robin order, so a user with many questions
+    can't starve the others. A 429 answer pauses the bucket for the
+    Retry-After delay and puts the request back at the head of its user's
+    queue instead of failing it.
+    """
+    
+    def __init__(self, service: MistralService):
+        """
+        Initialize scheduler
+        
+        Args:
+            service: Mistral service performing the actual requests
+        """
+        self.service = service
+        service.limiter = self
+        self.max_concurrency = settings.MISTRAL_MAX_CONCURRENCY
+        self.rate = settings.MISTRAL_RATE_LIMIT_RPS
+        self.burst = settings.MISTRAL_RATE_LIMIT_BURST
+        self.max_retries = settings.MISTRAL_RATE_LIMIT_RETRIES
+        
+        # Token bucket
+        self._tokens = float(self.burst)
+        self._refilled = time.monotonic()
+        self._paused_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        
+        # Waiting requests per user and the round-robin order of users
+        self._queues: Dict[int, Deque[asyncio.Future]] = {}
+        self._rotation: Deque[int] = deque()
+        self._active = 0
+        
+        # Metrics
+        self.queued = 0
+        self.rate_limited = 0
+    
+    @property
+    def waiting(self) -> int:
+        """Number of requests waiting for a slot"""
+        return sum(
+            1 for queue in self._queues.values() for future in queue if not future.done()
+        )
+    
+    async def get_diet_advice(
+        self,
+        question: str,
+        user_data: Optional[Dict] = None,
+        user_id: int = 0,
+        on_queued: Optional[QueueCallback] = None
+    ) -> str:
+        """
+        Get diet advice once the scheduler lets the request through
+        
+        Args:
+            question: User's question
+            user_data: Optional user data for context
+            user_id: User the request is made for
+            on_queued: Called with the queue position if the request has to wait
+        
+        Returns:
+            AI response text
+        """
+        return await self._run(user_id, on_queued, lambda: self.service.get_diet_advice(question, user_data))
+    
+    async def summarize_conversation(self, summary: str, turns: List[Dict], user_id: int = 0) -> str:
+        """
+        Fold conversation turns into a rolling summary, queued like a question
+        
+        Args:
+            summary: Summary of the turns before, empty if none
+            turns: Dicts with question and response, oldest first
+            user_id: User the conversation belongs to
+        
+        Returns:
+            New summary of the whole conversation
+        """
+        return await self._run(user_id, None, lambda: self.service.summarize_conversation(summary, turns))
+    
+    async def stream_diet_advice(
+        self,
+        question: str,
+        user_data: Optional[Dict] = None,
+        user_id: int = 0,
+        on_queued: Optional[QueueCallback] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream diet advice once the scheduler lets the request through
+        
+        The slot is held until the stream is exhausted or closed.
+        
+        Args:
+            question: User's question
+            user_data: Optional user data for context
+            user_id: User the request is made for
+            on_queued: Called with the queue position if the request has to wait
+        
+        Yields:
+            Text fragments of the AI response in order
+        """
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(user_id, on_queued, retry=attempt > 0)
+            started = False
+            try:
+                chunks = self.service.stream_diet_advice(question, user_data)
+                try:
+                    async for chunk in chunks:
+                        started = True
+                        yield chunk
+                finally:
+                    await chunks.aclose()
+                return
+            except MistralRateLimitError as e:
+                # Text already shown to the user can't be taken back
+                if started or attempt == self.max_retries:
+                    raise
+                self._pause(e.retry_after)
+            finally:
+                self._release()
+    
+    def position(self, user_id: int, future: asyncio.Future) -> int:
+        """
+        Get 1-based position of a waiting request in round-robin order
+        
+        Args:
+            user_id: User the request belongs to
+            future: Waiter of the request
+        
+        Returns:
+            Position, or 0 if the request is not waiting
+        """
+        queue = self._queues.get(user_id)
+        if not queue or future not in queue:
+            return 0
+        
+        # Requests of this user ahead of ours; each takes one full round
+        rounds = [waiter for waiter in queue if not waiter.done()].index(future)
+        position = rounds + 1
+        
+        before = True
+        for other in self._rotation:
+            if other == user_id:
+                before = False
+                continue
+            pending = sum(1 for waiter in self._queues[other] if not waiter.done())
+            position += min(pending, rounds + 1 if before else rounds)
+        
+        return position
+    
+    def try_acquire(self) -> bool:
+        """
+        Take a slot and a token only if both are free and nobody is waiting
+        
+        Used for hedge requests, which are pointless after a wait. The slot
+        is freed with release().
+        """
+        if self._active >= self.max_concurrency or self._next_user() is not None:
+            return False
+        if self._take_token() > 0:
+            return False
+        
+        self._active += 1
+        return True
+    
+    def release(self):
+        """Free a slot taken with try_acquire()"""
+        self._release()
+    
+    async def _run(
+        self,
+        user_id: int,
+        on_queued: Optional[QueueCallback],
+        request: Callable[[], Awaitable[str]]
+    ) -> str:
+        """Make a request in a slot, requeueing it after a 429 answer"""
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(user_id, on_queued, retry=attempt > 0)
+            try:
+                return await request()
+            except MistralRateLimitError as e:
+                if attempt == self.max_retries:
+                    raise
+                self._pause(e.retry_after)
+            finally:
+                self._release()
+    
+    async def _acquire(self, user_id: int, on_queued: Optional[QueueCallback], retry: bool = False):
+        """Wait until the request may start"""
+        future = asyncio.get_running_loop().create_future()
+        
+        queue = self._queues.get(user_id)
+        if queue is None:
+            queue = self._queues[user_id] = deque()
+            # A rate limited request is the next one to go
+            if retry:
+                self._rotation.appendleft(user_id)
+            else:
+                self._rotation.append(user_id)
+        
+        # A rate limited request keeps its place ahead of the user's newer ones
+        if retry:
+            queue.appendleft(future)
+        else:
+            queue.append(future)
+        
+        self._dispatch()
+        
+        try:
+            if not future.done():
+                self.queued += 1
+                if on_queued:
+                    try:
+                        await on_queued(self.position(user_id, future))
+                    except Exception as e:
+                        logger.warning(f"Failed to report queue position: {e}")
+            
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was granted just before cancellation
+                self._release()
+            else:
+                future.cancel()
+            raise
+    
+    def _release(self):
+        """Free a concurrency slot and start the next waiting request"""
+        self._active -= 1
+        self._dispatch()
+    
+    def _pause(self, retry_after: Optional[float]):
+        """Stop starting requests after a 429 answer"""
+        self.rate_limited += 1
+        delay = retry_after if retry_after is not None else self._default_delay()
+        
+        logger.warning(f"Mistral API rate limit hit, pausing for {delay:.1f}s")
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        
+        # Resume with a single request, then refill at the normal rate
+        self._tokens = min(1.0, float(self.burst))
+        self._refilled = self._paused_until
+    
+    def _default_delay(self) -> float:
+        """Pause used when 429 comes without Retry-After"""
+        return 1.0 / self.rate if self.rate > 0 else 1.0
+    
+    def _dispatch(self):
+        """Start waiting requests while slots and tokens are available"""
+        while self._active < self.max_concurrency:
+            user_id = self._next_user()
+            if user_id is None:
+                return
+            
+            wait = self._take_token()
+            if wait > 0:
+                self._wake_after(wait)
+                return
+            
+            queue = self._queues[user_id]
+            future = queue.popleft()
+            self._rotation.popleft()
+            if queue:
+                self._rotation.append(user_id)
+            else:
+                del self._queues[user_id]
+            
+            self._active += 1
+            future.set_result(None)
+    
+    def _next_user(self) -> Optional[int]:
+        """Get the user whose turn it is, dropping cancelled waiters"""
+        while self._rotation:
+            user_id = self._rotation[0]
+            queue = self._queues[user_id]
+            while queue and queue[0].done():
+                queue.popleft()
+            
+            if queue:
+                return user_id
+            
+            self._rotation.popleft()
+            del self._queues[user_id]
+        
+        return None
+    
+    def _take_token(self) -> float:
+        """
+        Take a token from the bucket
+        
+        Returns:
+            0 if a token was taken, otherwise seconds until one is available
+        """
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        
+        if self.rate <= 0:
+            return 0.0
+        
+        self._tokens = min(float(self.burst), self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+        
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+    
+    def _wake_after(self, delay: float):
+        """Schedule dispatch once a token becomes available"""
+        if self._timer is not None:
+            return
+        
+        def wake():
+            self._timer = None
+            self._dispatch()
+        
+        self._timer = asyncio.get_running_loop().call_later(delay, wake)
@@ -1,17 +1,160 @@
+import asyncio
+import json
+import logging
+import random
+import time
 import httpx
-from typing import Optional, Dict
+from collections import deque
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional, Dict, Deque, AsyncIterator, List
 from src.config.settings import settings
+from src.services.metrics import MISTRAL_LATENCY, MISTRAL_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# Latencies of this many recent requests are used for the hedging p95
+HEDGE_LATENCY_WINDOW = 200
+# Until this many are known, MISTRAL_HEDGE_DELAY is used instead
+HEDGE_MIN_SAMPLES = 20
+
+# Characters per token for estimating prompt size; Cyrillic text takes more
+# tokens than English, both are rounded towards overestimating
+ASCII_CHARS_PER_TOKEN = 4
+OTHER_CHARS_PER_TOKEN = 2
+# Role and separators added by the API to every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SYSTEM_PROMPT = (
+    "Ты профессиональный диетолог и специалист по питанию. "
+    "Твоя задача - давать краткие, точные и полезные рекомендации по питанию и диете. "
+    "Отвечай на русском языке. Будь конкретным и практичным. "
+    "Учитывай данные пользователя при формировании рекомендаций."
+)
+SUMMARY_PROMPT = (
+    "Ты ведешь краткий конспект консультации диетолога. "
+    "Объедини предыдущий конспект и новые реплики в один конспект: сохрани факты "
+    "о пользователе, его вопросы и данные ему рекомендации, опусти повторы. "
+    "Пиши на русском языке, без вступлений."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate number of tokens in text without the model's tokenizer
+    
+    Errs on the high side, so prompts built with it stay under the budget.
+    """
+    ascii_chars = sum(1 for char in text if char.isascii())
+    other_chars = len(text) - ascii_chars
+    return -(-ascii_chars // ASCII_CHARS_PER_TOKEN) - (-other_chars // OTHER_CHARS_PER_TOKEN)
+
+
+class MistralError(Exception):
+    """Mistral API request failed; the message is shown to the user"""
+
+
+class MistralRetryableError(MistralError):
+    """Transient failure that may succeed on another attempt"""
+
+
+class MistralTimeoutError(MistralRetryableError):
+    """Mistral API didn't answer in time"""
+
+
+class MistralServerError(MistralRetryableError):
+    """Mistral API answered 5xx or the connection failed"""
+
+
+class MistralEmptyResponseError(MistralError):
+    """Mistral API answered without any text"""
+
+
+class MistralAuthError(MistralError):
+    """Mistral API rejected the API key"""
+
+
+class MistralRateLimitError(MistralError):
+    """
+    Mistral API answered 429 Too Many Requests
+    
+    Not retried by MistralService itself: MistralScheduler waits for
+    Retry-After and requeues the request.
+    
+    Args:
+        message: User-facing error text
+        retry_after: Seconds to wait from the Retry-After header, if present
+    """
+    
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Create the long-lived HTTP client for Mistral API calls
+    
+    Connections are kept alive and reused, so only the first request
+    pays for DNS, TCP and TLS setup. The caller owns the client and must
+    close it with aclose() on shutdown.
+    """
+    http2 = settings.MISTRAL_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("MISTRAL_HTTP2 is enabled but h2 is not installed, falling back to HTTP/1.1")
+            http2 = False
+    
+    return httpx.AsyncClient(
+        timeout=settings.REQUEST_TIMEOUT,
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.MISTRAL_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.MISTRAL_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.MISTRAL_KEEPALIVE_EXPIRY
+        )
+    )
 
 
 class MistralService:
     """Service for interacting with Mistral AI API"""
     
-    def __init__(self):
-        """Initialize Mistral service"""
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
+        """
+        Initialize Mistral service
+        
+        Args:
+            client: Shared HTTP client; a new client per request is used if omitted
+        """
         self.api_key = settings.MISTRAL_API_KEY
         self.model = settings.MISTRAL_MODEL
         self.max_tokens = settings.MISTRAL_MAX_TOKENS
-        self.api_url = "https://api.mistral.ai/v1/chat/completions"
+        self.prompt_budget = settings.AI_PROMPT_TOKEN_BUDGET
+        self.summary_max_tokens = settings.AI_SUMMARY_MAX_TOKENS
+        self.api_url = settings.MISTRAL_API_URL
+        self.client = client
+        
+        # Retry policy
+        # At least one attempt, otherwise requests would return without an answer
+        self.max_attempts = max(1, settings.MISTRAL_RETRY_ATTEMPTS)
+        self.backoff = settings.MISTRAL_RETRY_BACKOFF
+        self.max_backoff = settings.MISTRAL_RETRY_MAX_BACKOFF
+        self.deadline = settings.MISTRAL_DEADLINE
+        
+        # Hedging: a second request is sent once the first is slower than p95
+        self.hedging = settings.MISTRAL_HEDGING
+        self._latencies: Deque[float] = deque(maxlen=HEDGE_LATENCY_WINDOW)
+        # Set by MistralScheduler, so hedge requests count against its limits
+        self.limiter = None
+        
+        # Metrics
+        self.retries = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.hedges_skipped = 0
     
     async def get_diet_advice(self, question: str, user_data: Optional[Dict] = None) -> str:
         """
@@ -24,66 +167,348 @@ class MistralService:
         Returns:
             AI response text
         """
+        return await self._request(self._build_payload(question, user_data))
+    
+    async def summarize_conversation(self, summary: str, turns: List[Dict]) -> str:
+        """
+        Fold conversation turns into a rolling summary
+        
+        Args:
+            summary: Summary of the turns before, empty if none
+            turns: Dicts with question and response, oldest first
+        
+        Returns:
+            New summary of the whole conversation
+        """
+        parts = []
+        if summary:
+            parts.append(f"Предыдущий конспект:\n{summary}")
+        parts.append("Новые реплики:\n" + "\n".join(
+            f"Пользователь: {turn['question']}\nДиетолог: {turn['response']}" for turn in turns
+        ))
+        
+        return await self._request({
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": "\n\n".join(parts)}
+            ],
+            "max_tokens": self.summary_max_tokens,
+            "temperature": 0.3
+        })
+    
+    async def _request(self, payload: Dict) -> str:
+        """Send a chat completion request with retries and hedging"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        
+        for attempt in range(self.max_attempts):
+            try:
+                request = self._hedged(payload) if self.hedging else self._complete(payload)
+                return await asyncio.wait_for(request, max(0.0, deadline - loop.time()))
+                
+            except asyncio.TimeoutError:
+                raise MistralTimeoutError("Превышено время ожидания ответа от сервера")
+                
+            except MistralRetryableError as e:
+                await self._before_retry(e, attempt, deadline)
+    
+    async def stream_diet_advice(self, question: str, user_data: Optional[Dict] = None) -> AsyncIterator[str]:
+        """
+        Stream diet advice from Mistral AI as it is generated
+        
+        Args:
+            question: User's question
+            user_data: Optional user data for context (weight, height, age, goal, etc.)
+        
+        Yields:
+            Text fragments of the AI response in order
+        """
+        payload = self._build_payload(question, user_data)
+        payload["stream"] = True
+        deadline = asyncio.get_running_loop().time() + self.deadline
+        
+        for attempt in range(self.max_attempts):
+            started = False
+            try:
+                chunks = self._stream(payload)
+                try:
+                    async for chunk in chunks:
+                        started = True
+                        yield chunk
+                finally:
+                    await chunks.aclose()
+                return
+                
+            except MistralRetryableError as e:
+                # Text already shown to the user can't be taken back
+                if started:
+                    raise
+                await self._before_retry(e, attempt, deadline)
+    
+    async def _before_retry(self, error: MistralRetryableError, attempt: int, deadline: float):
+        """
+        Sleep before the next attempt or re-raise if retries are exhausted
+        
+        Uses exponential backoff with full jitter and never sleeps past the
+        overall deadline.
+        """
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        
+        if attempt + 1 >= self.max_attempts or asyncio.get_running_loop().time() + delay >= deadline:
+            raise error
+        
+        self.retries += 1
+        logger.warning(f"Mistral request failed ({error}), retrying in {delay:.2f}s")
+        await asyncio.sleep(delay)
+    
+    async def _complete(self, payload: Dict) -> str:
+        """Send one chat completion request and return the answer text"""
+        started = time.monotonic()
+        status = "error"
+        try:
+            response = await self._post(payload)
+            status = str(response.status_code)
+            
+            response.raise_for_status()
+            
+            # Parse response
+            data = response.json()
+            
+            answer = ""
+            if "choices" in data and len(data["choices"]) > 0:
+                answer = (data["choices"][0]["message"]["content"] or "").strip()
+            if not answer:
+                raise MistralEmptyResponseError("Некорректный ответ от API")
+            
+            self._count_tokens(data.get("usage"))
+            
+        except Exception as e:
+            error = self._api_error(e)
+            self._observe("complete", started, status, error)
+            raise error
+        
+        self._latencies.append(self._observe("complete", started, status))
+        return answer
+    
+    async def _hedged(self, payload: Dict) -> str:
+        """
+        Send a request and, if it is slower than usual, a second identical one
+        
+        Whichever answers first wins and the other is cancelled. Behind a
+        scheduler the second request needs a free slot and rate limit token
+        right away; without them it isn't sent.
+        """
+        first = asyncio.create_task(self._complete(payload))
+        pending = {first}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self._hedge_delay())
+            if not done and self.limiter is not None and not self.limiter.try_acquire():
+                self.hedges_skipped += 1
+            elif not done:
+                self.hedged += 1
+                hedge = asyncio.create_task(self._complete(payload))
+                if self.limiter is not None:
+                    hedge.add_done_callback(lambda _: self.limiter.release())
+                pending.add(hedge)
+            
+            error = None
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = error or task.exception()
+                
+                if not pending:
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    def _hedge_delay(self) -> float:
+        """Get p95 latency of recent requests, or the configured default"""
+        if len(self._latencies) < HEDGE_MIN_SAMPLES:
+            return settings.MISTRAL_HEDGE_DELAY
+        
+        latencies = sorted(self._latencies)
+        return latencies[int(len(latencies) * 0.95) - 1]
+    
+    async def _stream(self, payload: Dict) -> AsyncIterator[str]:
+        """Send one streaming chat completion request and yield text fragments"""
+        started = time.monotonic()
+        status = "error"
+        try:
+            async with AsyncExitStack() as stack:
+                client = self.client
+                if client is None:
+                    client = await stack.enter_async_context(
+                        httpx.AsyncClient(timeout=settings.REQUEST_TIMEOUT)
+                    )
+                
+                response = await stack.enter_async_context(
+                    client.stream("POST", self.api_url, json=payload, headers=self._headers())
+                )
+                status = str(response.status_code)
+                
+                if response.is_error:
+                    await response.aread()
+                response.raise_for_status()
+                
+                # Server-sent events: "data: {json}" lines ending with "data: [DONE]"
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    
+                    event = json.loads(data)
+                    # Usage arrives with the last chunk
+                    self._count_tokens(event.get("usage"))
+                    
+                    choices = event.get("choices") or []
+                    if choices:
+                        content = choices[0].get("delta", {}).get("content")
+                        if content:
+                            yield content
+        
+        except Exception as e:
+            error = self._api_error(e)
+            self._observe("stream", started, status, error)
+            raise error
+        
+        self._observe("stream", started, status)
+    
+    def _observe(
+        self,
+        mode: str,
+        started: float,
+        status: str,
+        error: Optional[MistralError] = None
+    ) -> float:
+        """Record request latency and outcome in metrics and return the latency"""
+        if isinstance(error, MistralTimeoutError):
+            status = "timeout"
+        latency = time.monotonic() - started
+        MISTRAL_LATENCY.observe(latency, mode, status)
+        return latency
+    
+    def _count_tokens(self, usage: Optional[Dict]):
+        """Add token counts from an API usage object to metrics"""
+        if not usage:
+            return
+        MISTRAL_TOKENS.inc(usage.get("prompt_tokens") or 0, "prompt")
+        MISTRAL_TOKENS.inc(usage.get("completion_tokens") or 0, "completion")
+    
+    def _build_payload(self, question: str, user_data: Optional[Dict]) -> Dict:
+        """
+        Build chat completion request payload
+        
+        Earlier turns of the conversation (user_data['history'], oldest
+        first) are added newest first while the estimated prompt stays
+        within AI_PROMPT_TOKEN_BUDGET; the summary of older turns
+        (user_data['summary']) goes to the system prompt.
+        """
+        user_data = user_data or {}
+        
         # Build context from user data
         context = self._build_context(user_data)
         
         # Build system prompt
-        system_prompt = (
-            "Ты профессиональный диетолог и специалист по питанию. "
-            "Твоя задача - давать краткие, точные и полезные рекомендации по питанию и диете. "
-            "Отвечай на русском языке. Будь конкретным и практичным. "
-            "Учитывай данные пользователя при формировании рекомендаций."
-        )
+        system_prompt = SYSTEM_PROMPT
+        if user_data.get('summary'):
+            system_prompt += f"\n\nКраткое содержание предыдущей беседы:\n{user_data['summary']}"
         
         # Build user message
         user_message = question
         if context:
             user_message = f"{context}\n\nВопрос: {question}"
         
-        # Prepare request payload
-        payload = {
+        budget = (
+            self.prompt_budget
+            - estimate_tokens(system_prompt) - estimate_tokens(user_message) - 2 * MESSAGE_OVERHEAD_TOKENS
+        )
+        turns = []
+        for turn in reversed(user_data.get('history') or []):
+            tokens = estimate_tokens(turn['question']) + estimate_tokens(turn['response']) + 2 * MESSAGE_OVERHEAD_TOKENS
+            if tokens > budget:
+                break
+            budget -= tokens
+            turns[:0] = [
+                {"role": "user", "content": turn['question']},
+                {"role": "assistant", "content": turn['response']}
+            ]
+        
+        return {
             "model": self.model,
             "messages": [
                 {"role": "system", "content": system_prompt},
+                *turns,
                 {"role": "user", "content": user_message}
             ],
             "max_tokens": self.max_tokens,
             "temperature": 0.7
         }
-        
-        # Make API request
-        try:
-            async with httpx.AsyncClient(timeout=settings.REQUEST_TIMEOUT) as client:
-                response = await client.post(
-                    self.api_url,
-                    json=payload,
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    }
+    
+    def _api_error(self, e: Exception) -> MistralError:
+        """Convert a request failure into a typed user-facing error"""
+        if isinstance(e, MistralError):
+            return e
+        if isinstance(e, httpx.TimeoutException):
+            return MistralTimeoutError("Превышено время ожидания ответа от сервера")
+        if isinstance(e, httpx.HTTPStatusError):
+            status = e.response.status_code
+            if status == 401:
+                return MistralAuthError("Ошибка авторизации API")
+            elif status == 429:
+                return MistralRateLimitError(
+                    "Превышен лимит запросов к API",
+                    retry_after=self._retry_after(e.response)
                 )
-                
-                response.raise_for_status()
-                
-                # Parse response
-                data = response.json()
-                
-                if "choices" in data and len(data["choices"]) > 0:
-                    return data["choices"][0]["message"]["content"].strip()
-                else:
-                    raise Exception("Некорректный ответ от API")
-        
-        except httpx.TimeoutException:
-            raise Exception("Превышено время ожидания ответа от сервера")
-        except httpx.HTTPStatusError as e:
-            if e.response.status_code == 401:
-                raise Exception("Ошибка авторизации API")
-            elif e.response.status_code == 429:
-                raise Exception("Превышен лимит запросов к API")
+            elif status >= 500:
+                return MistralServerError(f"Ошибка API: {status}")
             else:
-                raise Exception(f"Ошибка API: {e.response.status_code}")
-        except Exception as e:
-            raise Exception(f"Ошибка при обращении к ИИ: {str(e)}")
+                return MistralError(f"Ошибка API: {status}")
+        if isinstance(e, httpx.TransportError):
+            return MistralServerError(f"Ошибка при обращении к ИИ: {str(e)}")
+        return MistralError(f"Ошибка при обращении к ИИ: {str(e)}")
+    
+    def _retry_after(self, response: httpx.Response) -> Optional[float]:
+        """Get delay in seconds from Retry-After header (seconds or HTTP date)"""
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        
+        try:
+            date = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+    
+    def _headers(self) -> Dict:
+        """Get API request headers"""
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+    
+    async def _post(self, payload: Dict) -> httpx.Response:
+        """Send chat completion request, reusing the shared client if available"""
+        if self.client is not None:
+            return await self.client.post(self.api_url, json=payload, headers=self._headers())
+        
+        async with httpx.AsyncClient(timeout=settings.REQUEST_TIMEOUT) as client:
+            return await client.post(self.api_url, json=payload, headers=self._headers())
     
     def _build_context(self, user_data: Optional[Dict]) -> str:
         """
@@ -115,6 +540,11 @@ class MistralService:
         if user_data.get('target_weight'):
             context_parts.append(f"Целевой вес: {user_data['target_weight']} кг")
         
+        # Weekly rollups, oldest first
+        if user_data.get('weight_trend'):
+            averages = " → ".join(f"{week['avg_weight']:.1f}" for week in user_data['weight_trend'])
+            context_parts.append(f"Средний вес по неделям: {averages} кг")
+        
         if context_parts:
             return "Данные пользователя:\n" + "\n".join(context_parts)
         
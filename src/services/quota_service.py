@@ -0,0 +1,98 @@
+import time
+from typing import Optional, Dict, Tuple
+from src.config.settings import settings
+
+
+class QuotaService:
+    """Service for AI request quota accounting"""
+    
+    def __init__(self, db):
+        """Initialize quota service with database instance"""
+        self.db = db
+        self.limit = settings.MAX_REQUESTS_PER_USER
+        self.mode = settings.AI_QUOTA_MODE
+        self.window_seconds = settings.AI_QUOTA_WINDOW_SECONDS
+        
+        if self.mode not in ("lifetime", "daily", "rolling"):
+            raise ValueError(f"Unknown AI_QUOTA_MODE: {self.mode}")
+    
+    def _window(self, now: float) -> Tuple[int, int, float]:
+        """
+        Get current window parameters
+        
+        Returns:
+            Window start, window length and share of the previous window
+            still counted against the limit
+        """
+        if self.mode == "lifetime":
+            return 0, 0, 0.0
+        
+        window_seconds = 86400 if self.mode == "daily" else self.window_seconds
+        window_start = int(now) - int(now) % window_seconds
+        
+        if self.mode == "daily":
+            return window_start, window_seconds, 0.0
+        
+        # Rolling: approximate a sliding window by weighting the previous
+        # fixed window by how much of it still overlaps the sliding one
+        elapsed = now - window_start
+        return window_start, window_seconds, 1 - elapsed / window_seconds
+    
+    def _estimate(self, row: Optional[Dict], now: float) -> int:
+        """Get number of requests counted against the limit"""
+        if not row:
+            return 0
+        
+        window_start, window_seconds, prev_weight = self._window(now)
+        
+        if row['window_start'] == window_start:
+            used, prev_used = row['used'], row['prev_used']
+        elif row['window_start'] == window_start - window_seconds:
+            used, prev_used = 0, row['used']
+        else:
+            used, prev_used = 0, 0
+        
+        # Rounding down matches the limit check done by the reservation
+        return used + int(prev_weight * prev_used)
+    
+    async def reserve(self, user_id: int) -> Optional[Dict]:
+        """
+        Reserve one AI request for user
+        
+        Returns:
+            Reservation to pass to refund() if the request fails, or None
+            if the user has reached the limit
+        """
+        if self.limit <= 0:
+            return None
+        
+        now = time.time()
+        window_start, window_seconds, prev_weight = self._window(now)
+        row = await self.db.reserve_ai_quota(
+            user_id, self.limit, window_start, window_seconds, prev_weight
+        )
+        
+        if not row:
+            return None
+        
+        return {
+            'user_id': user_id,
+            'window_start': row['window_start'],
+            'used': self._estimate(row, now)
+        }
+    
+    async def refund(self, reservation: Dict):
+        """Return a reserved request after a failed AI call"""
+        await self.db.refund_ai_quota(reservation['user_id'], reservation['window_start'])
+    
+    async def get_used(self, user_id: int) -> int:
+        """Get number of requests user has used in the current window"""
+        return self.count_used(await self.db.get_ai_quota(user_id))
+    
+    def count_used(self, row: Optional[Dict]) -> int:
+        """Get number of requests used in the current window from a quota row read elsewhere"""
+        return self._estimate(row, time.time())
+    
+    def get_remaining(self, used: int) -> int:
+        """Get number of requests left for a used count"""
+        return max(self.limit - used, 0)
@@ -0,0 +1,154 @@
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, List, Tuple
+from src.config.settings import settings
+
+# Run SQLite eviction once per this many stored answers
+EVICT_EVERY = 100
+# last_used_ts only orders LRU eviction, so a hit updates it at most this often, seconds
+TOUCH_INTERVAL = 3600
+# Weight change over the trend that counts as losing or gaining, kg
+TREND_THRESHOLD_KG = 1.0
+
+
+def normalize_question(question: str) -> str:
+    """Normalize question text so trivially different wordings share a key"""
+    text = question.lower().replace("ё", "е")
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def _band(value, width: int) -> Optional[int]:
+    """Round a number down to its band"""
+    if not value:
+        return None
+    return int(float(value) // width * width)
+
+
+def _trend_band(trend: Optional[List[Dict]]) -> Optional[str]:
+    """Classify weekly weight averages as losing, gaining or stable"""
+    if not trend or len(trend) < 2:
+        return None
+    change = trend[-1]['avg_weight'] - trend[0]['avg_weight']
+    if change <= -TREND_THRESHOLD_KG:
+        return "down"
+    if change >= TREND_THRESHOLD_KG:
+        return "up"
+    return "flat"
+
+
+class ResponseCache:
+    """
+    Cache of AI answers in front of MistralService.get_diet_advice
+    
+    Answers are keyed by the normalized question plus a coarse profile
+    (weight and age bands, goal), so users with similar profiles asking
+    the same thing share one paid API call. Entries live in SQLite with
+    TTL and LRU eviction; the most recently used ones are also kept in an
+    in-process hot tier.
+    """
+    
+    def __init__(self, db):
+        """Initialize response cache with database instance"""
+        self.db = db
+        self.enabled = settings.AI_CACHE_ENABLED
+        self.ttl = settings.AI_CACHE_TTL_SECONDS
+        self.max_entries = settings.AI_CACHE_MAX_ENTRIES
+        self.hot_size = settings.AI_CACHE_HOT_SIZE
+        
+        # key -> (response, created_ts, last_used_ts)
+        self._hot: "OrderedDict[str, Tuple[str, int, int]]" = OrderedDict()
+        self._puts = 0
+        
+        # Metrics
+        self.hot_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+    
+    def make_key(self, question: str, user_data: Optional[Dict] = None) -> str:
+        """Build cache key from question and bucketed user profile"""
+        user_data = user_data or {}
+        goal = normalize_question(user_data.get('goal') or "")
+        parts = [
+            normalize_question(question),
+            f"w{_band(user_data.get('weight'), 5)}",
+            f"a{_band(user_data.get('age'), 5)}",
+            f"g{goal}"
+        ]
+        # Appended only when known, so keys of answers cached without a trend stay valid
+        trend = _trend_band(user_data.get('weight_trend'))
+        if trend:
+            parts.append(f"t{trend}")
+        return hashlib.sha256("|".join(parts).encode()).hexdigest()
+    
+    async def get(self, key: str) -> Optional[str]:
+        """Get cached answer or None"""
+        if not self.enabled:
+            return None
+        
+        min_created_ts = int(time.time()) - self.ttl
+        
+        # Hot tier
+        entry = self._hot.get(key)
+        if entry is not None:
+            if entry[1] >= min_created_ts:
+                self._hot.move_to_end(key)
+                self.hot_hits += 1
+                await self._touch(key, entry[2])
+                return entry[0]
+            del self._hot[key]
+        
+        # SQLite tier
+        row = await self.db.get_cached_response(key, min_created_ts)
+        if row is None:
+            self.misses += 1
+            return None
+        
+        self.db_hits += 1
+        self._remember(key, row['response'], row['created_ts'], row['last_used_ts'])
+        await self._touch(key, row['last_used_ts'])
+        return row['response']
+    
+    async def put(self, key: str, response: str):
+        """Store answer in both tiers"""
+        if not self.enabled:
+            return
+        
+        now = int(time.time())
+        self._remember(key, response, now, now)
+        await self.db.put_cached_response(key, response)
+        
+        self._puts += 1
+        if self._puts % EVICT_EVERY == 0:
+            await self.db.evict_cached_responses(self.max_entries, int(time.time()) - self.ttl)
+    
+    async def _touch(self, key: str, last_used_ts: int):
+        """Mark entry as recently used unless it was within TOUCH_INTERVAL"""
+        now = int(time.time())
+        if now - last_used_ts < TOUCH_INTERVAL:
+            return
+        
+        entry = self._hot.get(key)
+        if entry is not None:
+            self._hot[key] = (entry[0], entry[1], now)
+        await self.db.touch_cached_response(key)
+    
+    def _remember(self, key: str, response: str, created_ts: int, last_used_ts: int):
+        """Put answer into hot tier, dropping least recently used ones"""
+        self._hot[key] = (response, created_ts, last_used_ts)
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.hot_size:
+            self._hot.popitem(last=False)
+    
+    def stats(self) -> Dict:
+        """Get hit/miss counters"""
+        lookups = self.hot_hits + self.db_hits + self.misses
+        hits = self.hot_hits + self.db_hits
+        return {
+            'hot_hits': self.hot_hits,
+            'db_hits': self.db_hits,
+            'misses': self.misses,
+            'hit_rate': hits / lookups if lookups else 0.0
+        }
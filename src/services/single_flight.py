@@ -0,0 +1,224 @@
+import asyncio
+import hashlib
+import logging
+from typing import Optional, Dict, List, AsyncIterator, Tuple
+from src.services.mistral_scheduler import MistralScheduler, QueueCallback
+from src.services.mistral_service import MistralError
+from src.services.response_cache import normalize_question
+
+logger = logging.getLogger(__name__)
+
+# User data fields that end up in the prompt context
+CONTEXT_FIELDS = ('weight', 'height', 'age', 'goal', 'target_weight', 'weight_trend', 'summary', 'history')
+
+
+class _QueueReport:
+    """Queue position of a shared request, reported to every caller waiting for it"""
+    
+    def __init__(self):
+        self.callbacks: List[QueueCallback] = []
+        # Last reported position, 0 once the request is no longer queued
+        self.position = 0
+    
+    async def add(self, callback: Optional[QueueCallback]):
+        """Register a caller's callback; one joining a queued request learns its position right away"""
+        if callback is None:
+            return
+        self.callbacks.append(callback)
+        if self.position:
+            await self._call(callback, self.position)
+    
+    async def report(self, position: int):
+        """Pass a new position on to all callers"""
+        self.position = position
+        for callback in list(self.callbacks):
+            await self._call(callback, position)
+    
+    async def _call(self, callback: QueueCallback, position: int):
+        # One caller's failed message must not keep the others uninformed
+        try:
+            await callback(position)
+        except Exception as e:
+            logger.warning(f"Failed to report queue position: {e}")
+
+
+class _Flight:
+    """Result of one upstream request shared by all callers asking the same"""
+    
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.task: Optional[asyncio.Task] = None
+        self.queue = _QueueReport()
+        self._changed = asyncio.Event()
+    
+    def push(self, chunk: str):
+        """Add a streamed fragment and wake followers"""
+        self.queue.position = 0
+        self.chunks.append(chunk)
+        self._notify()
+    
+    def finish(self, error: Optional[BaseException] = None):
+        """Mark the flight complete and wake followers"""
+        self.done = True
+        self.error = error
+        self._notify()
+    
+    def _notify(self):
+        # Waiters hold the old event; new waiters get a fresh one
+        event, self._changed = self._changed, asyncio.Event()
+        event.set()
+    
+    async def follow(self) -> AsyncIterator[str]:
+        """Yield all fragments from the beginning, waiting for new ones"""
+        position = 0
+        while True:
+            while position < len(self.chunks):
+                yield self.chunks[position]
+                position += 1
+            
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            
+            await self._changed.wait()
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight AI questions into one upstream request
+    
+    Concurrent calls with the same normalized question and user context
+    share a single MistralScheduler request and its answer. The request is
+    queued under the first caller's user ID; later callers just wait for
+    it, and every caller is told its queue position. Quota and history
+    stay per caller, handlers account each of them as usual.
+    """
+    
+    def __init__(self, scheduler: MistralScheduler):
+        """
+        Initialize single-flight layer
+        
+        Args:
+            scheduler: Scheduler performing the upstream requests
+        """
+        self.scheduler = scheduler
+        self._calls: Dict[str, Tuple[asyncio.Task, _QueueReport]] = {}
+        self._streams: Dict[str, _Flight] = {}
+        
+        # Metrics
+        self.upstream = 0
+        self.coalesced = 0
+    
+    def make_key(self, question: str, user_data: Optional[Dict] = None) -> str:
+        """Build key from normalized question and exact prompt context"""
+        user_data = user_data or {}
+        parts = [normalize_question(question)]
+        parts.extend(f"{field}={user_data.get(field) or ''}" for field in CONTEXT_FIELDS)
+        return hashlib.sha256("|".join(parts).encode()).hexdigest()
+    
+    async def get_diet_advice(
+        self,
+        question: str,
+        user_data: Optional[Dict] = None,
+        user_id: int = 0,
+        on_queued: Optional[QueueCallback] = None
+    ) -> str:
+        """
+        Get diet advice, joining an identical request already in flight
+        
+        Args:
+            question: User's question
+            user_data: Optional user data for context
+            user_id: User the request is made for
+            on_queued: Called with the queue position if the request has to wait
+        
+        Returns:
+            AI response text
+        """
+        key = self.make_key(question, user_data)
+        
+        call = self._calls.get(key)
+        if call is None:
+            self.upstream += 1
+            queue = _QueueReport()
+            task = asyncio.create_task(
+                self.scheduler.get_diet_advice(question, user_data, user_id=user_id, on_queued=queue.report)
+            )
+            self._calls[key] = (task, queue)
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.coalesced += 1
+            task, queue = call
+        await queue.add(on_queued)
+        
+        # One caller giving up must not cancel the request for the others
+        return await asyncio.shield(task)
+    
+    async def stream_diet_advice(
+        self,
+        question: str,
+        user_data: Optional[Dict] = None,
+        user_id: int = 0,
+        on_queued: Optional[QueueCallback] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream diet advice, joining an identical stream already in flight
+        
+        Callers joining late first get the fragments streamed so far.
+        
+        Args:
+            question: User's question
+            user_data: Optional user data for context
+            user_id: User the request is made for
+            on_queued: Called with the queue position if the request has to wait
+        
+        Yields:
+            Text fragments of the AI response in order
+        """
+        key = self.make_key(question, user_data)
+        
+        flight = self._streams.get(key)
+        if flight is None:
+            self.upstream += 1
+            flight = self._streams[key] = _Flight()
+            flight.task = asyncio.create_task(self._run_stream(key, flight, question, user_data, user_id))
+        else:
+            self.coalesced += 1
+        await flight.queue.add(on_queued)
+        
+        async for chunk in flight.follow():
+            yield chunk
+    
+    async def _run_stream(
+        self,
+        key: str,
+        flight: _Flight,
+        question: str,
+        user_data: Optional[Dict],
+        user_id: int
+    ):
+        """Pump the upstream stream into a shared flight"""
+        error = None
+        try:
+            async for chunk in self.scheduler.stream_diet_advice(
+                question, user_data, user_id=user_id, on_queued=flight.queue.report
+            ):
+                flight.push(chunk)
+        except asyncio.CancelledError:
+            error = MistralError("Запрос к ИИ был прерван")
+            raise
+        except Exception as e:
+            error = e
+        finally:
+            self._streams.pop(key, None)
+            flight.finish(error)
+    
+    def stats(self) -> Dict:
+        """Get upstream/coalesced counters"""
+        return {
+            'upstream': self.upstream,
+            'coalesced': self.coalesced
+        }
@@ -0,0 +1,156 @@
+import re
+from typing import Dict, List, Optional
+
+# Pounds to kilograms
+LB_TO_KG = 0.45359237
+# Epley's estimate is unreliable for longer sets, those don't count for 1RM
+E1RM_MAX_REPS = 12
+
+# Plausible limits; anything outside is a typo or not a strength set
+MAX_SETS = 100
+MAX_REPS = 1000
+MAX_WEIGHT_KG = 1000
+
+_NUMBER = r"(\d+(?:\.\d+)?)"
+# "x" separating numbers: latin or cyrillic letter, multiplication sign or asterisk
+_TIMES = r"\s*[xх×*]\s*"
+
+# Weight with unit; "5x100кг" is 5 reps with 100 kg. The count can't end a
+# chain like "3x10x80кг", there 80 kg is the weight of 3x10
+_WEIGHT = re.compile(
+    r"(?:(?<![\d.xх×*])(?<![\d.xх×*]\s)(\d+)" + _TIMES + r")?" + _NUMBER + r"\s*(кг|kg|lbs?|фунт\w*)(?![a-zа-я])"
+)
+# 80x3x10: weight, sets, reps
+_WEIGHT_SETS_REPS = re.compile(_NUMBER + _TIMES + r"(\d+)" + _TIMES + r"(\d+)")
+# 3x10
+_SETS_REPS = re.compile(r"(\d+)" + _TIMES + r"(\d+)")
+# 3 по 10, 3 подхода по 10
+_SETS_BY_REPS = re.compile(r"(\d+)\s*(?:подход\w*\s*)?по\s*(\d+)")
+_REPS = re.compile(r"(\d+)\s*(?:повтор\w*|раз\w*|reps?)(?![a-zа-я])")
+_SETS = re.compile(r"(\d+)\s*(?:подход\w*|сет\w*|sets?)(?![a-zа-я])")
+# Number left over once sets and reps are taken, e.g. 80 in "Жим 80 3x8"
+_BARE_NUMBER = re.compile(r"(?<![\d.])" + _NUMBER + r"(?![\d.])")
+
+_NAME_TRIM = " -–—:.,"
+
+
+def normalize_exercise(name: str) -> str:
+    """Normalize exercise name so spelling variants share aggregates"""
+    text = name.lower().replace("ё", "е")
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def estimate_1rm(weight: Optional[float], reps: int) -> Optional[float]:
+    """Estimate one-rep max with Epley's formula"""
+    if not weight or reps > E1RM_MAX_REPS:
+        return None
+    if reps == 1:
+        return weight
+    return round(weight * (1 + reps / 30), 1)
+
+
+def _cut(text: str, match: "re.Match") -> str:
+    """Remove a parsed part, leaving a separator other patterns can't match across"""
+    return text[:match.start()] + " | " + text[match.end():]
+
+
+def parse_line(line: str) -> Optional[Dict]:
+    """
+    Parse one exercise like "Жим лёжа 80кг 3x10"
+    
+    The line has to start with the exercise name. Weight is given with a
+    unit ("80кг"), as the first of three numbers ("80x3x10") or as the
+    only other number ("Жим 80 3x8", kg). A count before the weight is
+    reps ("5x100кг": 5 reps with 100 kg, not 500 kg); if the line has
+    reps besides it ("2x20кг 3x10": dumbbells or reps?) it is ambiguous.
+    
+    Returns:
+        Dict with exercise, sets, reps, weight (kg or None) and e1rm, or
+        None if the line has no exercise name, no repetitions or is
+        ambiguous
+    """
+    text = line.lower().replace("ё", "е")
+    text = re.sub(r"(\d),(\d)", r"\1.\2", text)
+    
+    # Exercise name is everything before the first number
+    first_digit = re.search(r"\d", text)
+    if first_digit is None:
+        return None
+    exercise = normalize_exercise(line[:first_digit.start()].strip(_NAME_TRIM))
+    if not exercise or not re.search(r"[a-zа-я]", exercise):
+        return None
+    rest = text[first_digit.start():]
+    
+    weight = None
+    weight_reps = None
+    match = _WEIGHT.search(rest)
+    if match:
+        weight = float(match.group(2))
+        weight_reps = int(match.group(1)) if match.group(1) else None
+        if not match.group(3).startswith(("кг", "kg")):
+            weight = round(weight * LB_TO_KG, 1)
+        rest = _cut(rest, match)
+    
+    sets = reps = None
+    match = None if weight is not None else _WEIGHT_SETS_REPS.search(rest)
+    if match:
+        weight, sets, reps = float(match.group(1)), int(match.group(2)), int(match.group(3))
+        rest = _cut(rest, match)
+    else:
+        match = _SETS_REPS.search(rest) or _SETS_BY_REPS.search(rest)
+        if match:
+            sets, reps = int(match.group(1)), int(match.group(2))
+            rest = _cut(rest, match)
+        else:
+            match = _REPS.search(rest)
+            if match:
+                reps = int(match.group(1))
+                rest = _cut(rest, match)
+                sets_match = _SETS.search(rest)
+                sets = int(sets_match.group(1)) if sets_match else 1
+                if sets_match:
+                    rest = _cut(rest, sets_match)
+    
+    if weight_reps is not None:
+        if reps is not None:
+            return None
+        reps = weight_reps
+        sets_match = _SETS.search(rest)
+        sets = int(sets_match.group(1)) if sets_match else 1
+    
+    # A single number without unit next to sets and reps is the weight in kg
+    if weight is None and reps is not None:
+        numbers = _BARE_NUMBER.findall(rest)
+        if len(numbers) == 1:
+            weight = float(numbers[0])
+    
+    if reps is None:
+        return None
+    if not (0 < sets <= MAX_SETS and 0 < reps <= MAX_REPS):
+        return None
+    if weight is not None and not (0 < weight <= MAX_WEIGHT_KG):
+        return None
+    
+    return {
+        'exercise': exercise,
+        'sets': sets,
+        'reps': reps,
+        'weight': weight,
+        'e1rm': estimate_1rm(weight, reps),
+    }
+
+
+def parse_workout(text: str) -> List[Dict]:
+    """
+    Parse a workout entry, one exercise per line or separated by ";"
+    
+    Lines that aren't strength sets (e.g. "Бег - 5 км - 28 минут") are
+    skipped; the raw text is stored anyway.
+    """
+    sets = []
+    for line in re.split(r"[\n;]", text):
+        parsed = parse_line(line)
+        if parsed is not None:
+            sets.append(parsed)
+    return sets
@@ -1,149 +1,469 @@
+import asyncio
+import logging
+import time
 import aiosqlite
-from typing import Optional, List, Dict
+from array import array
+from contextlib import asynccontextmanager
+from typing import Optional, List, Dict, Sequence, Any, AsyncIterator
 from datetime import datetime
 from pathlib import Path
 
 from src.config.settings import settings
+from src.services.metrics import DB_QUERY_LATENCY, timed_methods
+from src.services.workout_parser import parse_workout
+from src.storage.migrations import run_migrations, COUNTER_QUERIES, WEEK_START_SQL
 
+logger = logging.getLogger(__name__)
 
+# Delivery status of a broadcast recipient
+DELIVERY_PENDING = 0
+DELIVERY_SENT = 1
+DELIVERY_FAILED = 2
+
+# Users per bulk access UPDATE, below SQLite's default limit of 999 parameters
+ACCESS_UPDATE_CHUNK = 500
+
+# Users who asked the AI within this many days form the "ai_active" segment
+BROADCAST_ACTIVE_DAYS = 30
+
+# Broadcast segments: extra condition on approved users
+BROADCAST_SEGMENTS = {
+    'all': "",
+    'with_profile': "AND EXISTS (SELECT 1 FROM user_data d WHERE d.user_id = users.user_id)",
+    'ai_active': (
+        "AND EXISTS (SELECT 1 FROM ai_requests a "
+        "WHERE a.user_id = users.user_id AND a.created_ts >= :since)"
+    ),
+}
+
+
+@timed_methods(DB_QUERY_LATENCY)
 class Database:
     """Database manager for bot data storage"""
     
-    def __init__(self):
-        """Initialize database manager"""
-        self.db_path = settings.DB_PATH
+    def __init__(
+        self,
+        db_path: Optional[Path] = None,
+        group_commit: Optional[bool] = None,
+        read_pool_size: Optional[int] = None
+    ):
+        """
+        Initialize database manager
+        
+        Args:
+            db_path: Database file path (defaults to settings.DB_PATH)
+            group_commit: Enable write-behind group commit (defaults to settings.DB_GROUP_COMMIT)
+            read_pool_size: Number of read-only connections (defaults to settings.DB_READ_POOL_SIZE)
+        """
+        self.db_path = Path(db_path) if db_path is not None else settings.DB_PATH
+        self.group_commit = settings.DB_GROUP_COMMIT if group_commit is None else group_commit
+        self.read_pool_size = settings.DB_READ_POOL_SIZE if read_pool_size is None else read_pool_size
+        
+        # Single writer connection
         self.conn: Optional[aiosqlite.Connection] = None
+        
+        # Read-only connections; reads fall back to the writer when empty
+        self._readers: List[aiosqlite.Connection] = []
+        self._reader_pool: Optional[asyncio.Queue] = None
+        
+        # Serializes transactions on the writer connection
+        self._write_lock = asyncio.Lock()
+        
+        # Group commit queue and background flusher
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
     
     async def init_db(self):
         """Initialize database and create tables"""
         # Ensure data directory exists
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
         
-        # Connect to database
+        # Connect writer and switch to WAL so readers don't block on writes
         self.conn = await aiosqlite.connect(self.db_path)
         self.conn.row_factory = aiosqlite.Row
+        await self.conn.execute("PRAGMA journal_mode = WAL")
+        await self.conn.execute(f"PRAGMA synchronous = {settings.DB_SYNCHRONOUS}")
+        await self._apply_pragmas(self.conn)
         
-        # Create tables
-        await self._create_tables()
-    
-    async def _create_tables(self):
-        """Create database tables"""
-        async with self.conn.cursor() as cursor:
-            # Users table
-            await cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY,
-                    username TEXT,
-                    has_access INTEGER DEFAULT 0,
-                    created_at TEXT DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # User data table
-            await cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user_data (
-                    user_id INTEGER PRIMARY KEY,
-                    weight REAL,
-                    height INTEGER,
-                    age INTEGER,
-                    goal TEXT,
-                    target_weight REAL,
-                    updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id)
-                )
-            """)
-            
-            # Workout records table
-            await cursor.execute("""
-                CREATE TABLE IF NOT EXISTS workout_records (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    workout_data TEXT,
-                    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id)
-                )
-            """)
-            
-            # AI requests table
-            await cursor.execute("""
-                CREATE TABLE IF NOT EXISTS ai_requests (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    question TEXT,
-                    response TEXT,
-                    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id)
-                )
-            """)
-            
-            await self.conn.commit()
+        # Create tables and upgrade existing databases in place
+        await run_migrations(self.conn)
+        
+        # Open read-only pool; each aiosqlite connection runs in its own thread
+        if self.read_pool_size > 0:
+            self._reader_pool = asyncio.Queue()
+            uri = f"{self.db_path.resolve().as_uri()}?mode=ro"
+            for _ in range(self.read_pool_size):
+                reader = await aiosqlite.connect(uri, uri=True)
+                reader.row_factory = aiosqlite.Row
+                await self._apply_pragmas(reader)
+                await reader.execute("PRAGMA query_only = ON")
+                self._readers.append(reader)
+                self._reader_pool.put_nowait(reader)
+        
+        # Start background flusher for group commit mode
+        if self.group_commit:
+            self._write_queue = asyncio.Queue()
+            self._flusher = asyncio.create_task(self._flush_loop())
+    
+    async def _apply_pragmas(self, conn: aiosqlite.Connection):
+        """Apply per-connection performance pragmas"""
+        # Negative cache_size is measured in KiB rather than pages
+        await conn.execute(f"PRAGMA cache_size = -{settings.DB_CACHE_SIZE_KB}")
+        await conn.execute(f"PRAGMA mmap_size = {settings.DB_MMAP_SIZE}")
+        await conn.execute("PRAGMA temp_store = MEMORY")
     
     async def close(self):
         """Close database connection"""
+        if self._flusher:
+            # Commit everything still queued before shutting down
+            await self.flush()
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+            self._write_queue = None
+        
+        for reader in self._readers:
+            await reader.close()
+        self._readers = []
+        self._reader_pool = None
+        
         if self.conn:
             await self.conn.close()
     
+    # Read path
+    
+    @asynccontextmanager
+    async def _read_cursor(self) -> AsyncIterator[aiosqlite.Cursor]:
+        """Borrow a reader connection from the pool and yield a cursor on it"""
+        if self._reader_pool is None:
+            async with self.conn.cursor() as cursor:
+                yield cursor
+            return
+        
+        reader = await self._reader_pool.get()
+        try:
+            async with reader.cursor() as cursor:
+                yield cursor
+        finally:
+            self._reader_pool.put_nowait(reader)
+    
+    # Write path
+    
+    async def _write(self, sql: str, params: Sequence[Any] = (), durable: bool = False):
+        """
+        Execute a write statement
+        
+        Without group commit the statement is committed immediately. In group
+        commit mode it is queued for the background flusher, which commits
+        queued statements together in one transaction. Until then reads
+        don't see it: a write that is read back right away (read-your-writes)
+        has to be durable, or be followed by flush().
+        
+        Args:
+            sql: SQL statement
+            params: Statement parameters
+            durable: Wait until the statement is committed (group commit mode only)
+        """
+        if self._write_queue is None:
+            async with self._write_lock:
+                await self.conn.execute(sql, params)
+                await self.conn.commit()
+            return
+        
+        future = asyncio.get_running_loop().create_future() if durable else None
+        await self._write_queue.put((sql, params, future))
+        
+        if future is not None:
+            await future
+    
+    @property
+    def write_queue_depth(self) -> int:
+        """Number of writes waiting for group commit"""
+        return self._write_queue.qsize() if self._write_queue is not None else 0
+    
+    async def flush(self):
+        """Wait until all queued writes are committed"""
+        if self._write_queue is None:
+            return
+        
+        # A barrier item is committed after everything queued before it
+        future = asyncio.get_running_loop().create_future()
+        await self._write_queue.put((None, (), future))
+        await future
+    
+    async def _flush_loop(self):
+        """Collect queued writes and commit them in batches"""
+        loop = asyncio.get_running_loop()
+        interval = settings.DB_GROUP_COMMIT_INTERVAL_MS / 1000
+        max_batch = settings.DB_GROUP_COMMIT_MAX_BATCH
+        
+        while True:
+            batch = [await self._write_queue.get()]
+            deadline = loop.time() + interval
+            
+            # Gather more writes until the interval passes, the batch is
+            # full or someone is waiting on a flush barrier
+            while len(batch) < max_batch and batch[-1][0] is not None:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._write_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                await self._commit_batch(batch)
+            except Exception as e:
+                # E.g. a disk error during rollback: fail this batch, but keep
+                # the flusher alive so later writes and flushes aren't stuck
+                logger.error(f"Group commit of {len(batch)} writes failed: {e}")
+                await self._discard_transaction()
+                for _, _, future in batch:
+                    if future is not None and not future.done():
+                        future.set_exception(e)
+    
+    async def _discard_transaction(self):
+        """Roll back whatever a failed batch left open, so the next one doesn't commit it"""
+        async with self._write_lock:
+            try:
+                await self.conn.rollback()
+            except Exception as e:
+                logger.error(f"Rollback after failed group commit failed: {e}")
+    
+    async def _commit_batch(self, batch: list):
+        """Commit a batch of queued writes in a single transaction"""
+        statements = [item for item in batch if item[0] is not None]
+        
+        async with self._write_lock:
+            try:
+                for sql, params, _ in statements:
+                    await self.conn.execute(sql, params)
+                await self.conn.commit()
+                errors = {}
+            except Exception:
+                await self.conn.rollback()
+                errors = await self._commit_one_by_one(statements)
+        
+        for _, _, future in batch:
+            if future is None or future.done():
+                continue
+            error = errors.get(id(future))
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(None)
+    
+    async def _commit_one_by_one(self, statements: list) -> Dict:
+        """Retry a failed batch statement by statement so one bad write doesn't drop the rest"""
+        errors = {}
+        
+        for sql, params, future in statements:
+            try:
+                await self.conn.execute(sql, params)
+                await self.conn.commit()
+            except Exception as e:
+                await self.conn.rollback()
+                if future is None:
+                    logger.error(f"Queued write failed: {e}")
+                else:
+                    errors[id(future)] = e
+        
+        return errors
+    
     # User management methods
     
     async def has_access(self, user_id: int) -> bool:
         """Check if user has access"""
-        async with self.conn.cursor() as cursor:
+        async with self._read_cursor() as cursor:
             await cursor.execute(
                 "SELECT has_access FROM users WHERE user_id = ?",
                 (user_id,)
             )
             row = await cursor.fetchone()
-            
-            if not row:
-                # Create user record if doesn't exist
-                await cursor.execute(
-                    "INSERT INTO users (user_id, has_access) VALUES (?, 0)",
-                    (user_id,)
-                )
-                await self.conn.commit()
-                return False
-            
-            return bool(row['has_access'])
+        
+        if not row:
+            # Create user record if doesn't exist
+            await self.register_user(user_id)
+            return False
+        
+        return bool(row['has_access'])
+    
+    async def register_user(self, user_id: int):
+        """Create user record without access if it doesn't exist"""
+        await self._write(
+            "INSERT OR IGNORE INTO users (user_id, has_access, created_ts) VALUES (?, 0, ?)",
+            (user_id, int(time.time()))
+        )
+    
+    async def get_user_ids(self, has_access: Optional[bool] = None) -> array:
+        """
+        Get sorted user IDs as a compact int64 array
+        
+        Args:
+            has_access: Only approved (True) or pending (False) users; all users if None
+        """
+        ids = array('q')
+        sql = "SELECT user_id FROM users"
+        params = ()
+        if has_access is not None:
+            sql += " WHERE has_access = ?"
+            params = (int(has_access),)
+        sql += " ORDER BY user_id"
+        
+        async with self._read_cursor() as cursor:
+            await cursor.execute(sql, params)
+            # Fetch in chunks so large tables never materialize as row lists
+            while True:
+                rows = await cursor.fetchmany(10000)
+                if not rows:
+                    break
+                ids.extend(row[0] for row in rows)
+        
+        return ids
     
-    async def grant_access(self, user_id: int):
+    async def grant_access(self, user_id: int, durable: bool = False):
         """Grant access to user"""
-        async with self.conn.cursor() as cursor:
-            await cursor.execute(
-                "UPDATE users SET has_access = 1 WHERE user_id = ?",
-                (user_id,)
-            )
-            await self.conn.commit()
+        await self._write(
+            "UPDATE users SET has_access = 1 WHERE user_id = ?",
+            (user_id,),
+            durable=durable
+        )
     
-    async def revoke_access(self, user_id: int):
+    async def revoke_access(self, user_id: int, durable: bool = False):
         """Revoke user access"""
-        async with self.conn.cursor() as cursor:
-            await cursor.execute(
-                "UPDATE users SET has_access = 0 WHERE user_id = ?",
-                (user_id,)
-            )
-            await self.conn.commit()
+        await self._write(
+            "UPDATE users SET has_access = 0 WHERE user_id = ?",
+            (user_id,),
+            durable=durable
+        )
     
-    async def get_pending_users(self) -> List[Dict]:
-        """Get users waiting for access"""
-        async with self.conn.cursor() as cursor:
-            await cursor.execute(
-                "SELECT user_id, username FROM users WHERE has_access = 0"
-            )
-            rows = await cursor.fetchall()
-            return [dict(row) for row in rows]
+    async def set_access_many(self, user_ids: Sequence[int], has_access: bool) -> List[int]:
+        """
+        Grant or revoke access of many users in one transaction
+        
+        Args:
+            user_ids: Users to update
+            has_access: New access flag
+        
+        Returns:
+            IDs of users whose access changed
+        """
+        # Include registrations still waiting for group commit
+        await self.flush()
+        
+        changed = []
+        async with self._write_lock:
+            try:
+                for start in range(0, len(user_ids), ACCESS_UPDATE_CHUNK):
+                    chunk = list(user_ids[start:start + ACCESS_UPDATE_CHUNK])
+                    condition = f"has_access = ? AND user_id IN ({', '.join('?' * len(chunk))})"
+                    params = (int(not has_access), *chunk)
+                    
+                    cursor = await self.conn.execute(f"SELECT user_id FROM users WHERE {condition}", params)
+                    rows = await cursor.fetchall()
+                    if rows:
+                        await self.conn.execute(
+                            f"UPDATE users SET has_access = {int(has_access)} WHERE {condition}",
+                            params
+                        )
+                        changed.extend(row[0] for row in rows)
+                await self.conn.commit()
+            except Exception:
+                await self.conn.rollback()
+                raise
+        
+        return changed
     
-    async def get_all_users(self) -> List[Dict]:
-        """Get all users with access"""
-        async with self.conn.cursor() as cursor:
-            await cursor.execute(
-                "SELECT user_id, username FROM users WHERE has_access = 1"
-            )
+    async def grant_access_to_pending(self) -> List[int]:
+        """
+        Grant access to every user waiting for it in one transaction
+        
+        Returns:
+            IDs of users who got access
+        """
+        await self.flush()
+        
+        async with self._write_lock:
+            try:
+                cursor = await self.conn.execute("SELECT user_id FROM users WHERE has_access = 0")
+                user_ids = [row[0] for row in await cursor.fetchall()]
+                await self.conn.execute("UPDATE users SET has_access = 1 WHERE has_access = 0")
+                await self.conn.commit()
+            except Exception:
+                await self.conn.rollback()
+                raise
+        
+        return user_ids
+    
+    async def _get_users_page(
+        self,
+        has_access: bool,
+        after: Optional[int],
+        before: Optional[int],
+        limit: int
+    ) -> Dict:
+        """
+        Get one page of users ordered by user_id using keyset pagination
+        
+        Args:
+            has_access: Approved (True) or pending (False) users
+            after: Return users with user_id greater than this cursor
+            before: Return users with user_id less than this cursor
+            limit: Page size
+        
+        Returns:
+            Dict with 'users', 'has_prev' and 'has_next'
+        """
+        # One extra row tells whether another page exists
+        async with self._read_cursor() as cursor:
+            if before is not None:
+                await cursor.execute(
+                    "SELECT user_id, username FROM users "
+                    "WHERE has_access = ? AND user_id < ? ORDER BY user_id DESC LIMIT ?",
+                    (int(has_access), before, limit + 1)
+                )
+            else:
+                await cursor.execute(
+                    "SELECT user_id, username FROM users "
+                    "WHERE has_access = ? AND user_id > ? ORDER BY user_id LIMIT ?",
+                    (int(has_access), after if after is not None else -1, limit + 1)
+                )
             rows = await cursor.fetchall()
-            return [dict(row) for row in rows]
+        
+        users = [dict(row) for row in rows[:limit]]
+        has_more = len(rows) > limit
+        
+        if before is not None:
+            users.reverse()
+            return {'users': users, 'has_prev': has_more, 'has_next': True}
+        
+        return {'users': users, 'has_prev': after is not None, 'has_next': has_more}
+    
+    async def get_pending_users(
+        self,
+        after: Optional[int] = None,
+        before: Optional[int] = None,
+        limit: int = 10
+    ) -> Dict:
+        """Get a page of users waiting for access"""
+        return await self._get_users_page(False, after, before, limit)
+    
+    async def get_all_users(
+        self,
+        after: Optional[int] = None,
+        before: Optional[int] = None,
+        limit: int = 10
+    ) -> Dict:
+        """Get a page of users with access"""
+        return await self._get_users_page(True, after, before, limit)
     
     async def get_user_info(self, user_id: int) -> Optional[Dict]:
         """Get user information"""
-        async with self.conn.cursor() as cursor:
+        async with self._read_cursor() as cursor:
             await cursor.execute(
                 "SELECT user_id, username, has_access FROM users WHERE user_id = ?",
                 (user_id,)
@@ -153,30 +473,68 @@ class Database:
     
     async def get_total_users(self) -> int:
         """Get total number of users"""
-        async with self.conn.cursor() as cursor:
+        async with self._read_cursor() as cursor:
             await cursor.execute("SELECT COUNT(*) as count FROM users")
             row = await cursor.fetchone()
             return row['count']
     
     async def get_approved_users_count(self) -> int:
         """Get number of approved users"""
-        async with self.conn.cursor() as cursor:
+        async with self._read_cursor() as cursor:
             await cursor.execute("SELECT COUNT(*) as count FROM users WHERE has_access = 1")
             row = await cursor.fetchone()
             return row['count']
     
     async def get_pending_users_count(self) -> int:
         """Get number of pending users"""
-        async with self.conn.cursor() as cursor:
+        async with self._read_cursor() as cursor:
             await cursor.execute("SELECT COUNT(*) as count FROM users WHERE has_access = 0")
             row = await cursor.fetchone()
             return row['count']
     
+    # Counter methods
+    
+    async def get_counters(self) -> Dict[str, int]:
+        """Get all trigger-maintained global counters"""
+        async with self._read_cursor() as cursor:
+            await cursor.execute("SELECT name, value FROM counters")
+            rows = await cursor.fetchall()
+            return {row['name']: row['value'] for row in rows}
+    
+    async def check_counters(self) -> Dict[str, Dict[str, int]]:
+        """
+        Compare stored counters with freshly counted values
+        
+        Returns:
+            Mismatching counters with their stored and actual values
+        """
+        stored = await self.get_counters()
+        mismatches = {}
+        
+        for name, query in COUNTER_QUERIES.items():
+            async with self._read_cursor() as cursor:
+                await cursor.execute(query)
+                row = await cursor.fetchone()
+            if stored.get(name) != row[0]:
+                mismatches[name] = {'stored': stored.get(name), 'actual': row[0]}
+        
+        return mismatches
+    
+    async def rebuild_counters(self):
+        """Recount all global counters from their source tables"""
+        async with self._write_lock:
+            for name, query in COUNTER_QUERIES.items():
+                await self.conn.execute(
+                    f"INSERT OR REPLACE INTO counters (name, value) VALUES (?, ({query}))",
+                    (name,)
+                )
+            await self.conn.commit()
+    
     # User data methods
     
     async def get_user_data(self, user_id: int) -> Optional[Dict]:
         """Get user data"""
-        async with self.conn.cursor() as cursor:
+        async with self._read_cursor() as cursor:
             await cursor.execute(
                 "SELECT * FROM user_data WHERE user_id = ?",
                 (user_id,)
@@ -184,62 +542,179 @@ class Database:
             row = await cursor.fetchone()
             return dict(row) if row else None
     
-    async def update_user_data(self, user_id: int, **kwargs):
+    async def update_user_data(self, user_id: int, durable: bool = False, **kwargs):
         """Update user data"""
-        async with self.conn.cursor() as cursor:
-            # Check if user data exists
+        # Single upsert so queued writes don't depend on a prior SELECT
+        fields = ', '.join(['user_id', 'updated_ts'] + list(kwargs.keys()))
+        placeholders = ', '.join(['?'] * (len(kwargs) + 2))
+        updates = ', '.join([f"{k} = excluded.{k}" for k in kwargs.keys()])
+        values = [user_id, int(time.time())] + list(kwargs.values())
+        
+        await self._write(
+            f"INSERT INTO user_data ({fields}) VALUES ({placeholders}) "
+            f"ON CONFLICT(user_id) DO UPDATE SET {updates}, "
+            f"updated_at = CURRENT_TIMESTAMP, updated_ts = excluded.updated_ts",
+            values,
+            durable=durable
+        )
+    
+    async def get_weight_trend(self, user_id: int, period: str = 'week', limit: int = 8) -> List[Dict]:
+        """
+        Get weight rollups for the most recent periods
+        
+        Rollups are maintained by triggers on weight_measurements, so this
+        reads at most limit rows however many measurements there are.
+        
+        Args:
+            user_id: User ID
+            period: 'day', 'week' or 'month' (see WEIGHT_PERIODS)
+            limit: Number of periods
+        
+        Returns:
+            Dicts with period_start, min_weight, max_weight, avg_weight,
+            count and last_weight, oldest first
+        """
+        async with self._read_cursor() as cursor:
             await cursor.execute(
-                "SELECT user_id FROM user_data WHERE user_id = ?",
-                (user_id,)
+                "SELECT period_start, min_weight, max_weight, sum_weight / count AS avg_weight, "
+                "count, last_weight FROM weight_rollups "
+                "WHERE user_id = ? AND period = ? ORDER BY period_start DESC LIMIT ?",
+                (user_id, period, limit)
             )
-            exists = await cursor.fetchone()
-            
-            if exists:
-                # Update existing record
-                fields = ', '.join([f"{k} = ?" for k in kwargs.keys()])
-                values = list(kwargs.values()) + [user_id]
-                await cursor.execute(
-                    f"UPDATE user_data SET {fields}, updated_at = CURRENT_TIMESTAMP WHERE user_id = ?",
-                    values
-                )
-            else:
-                # Insert new record
-                fields = ', '.join(['user_id'] + list(kwargs.keys()))
-                placeholders = ', '.join(['?'] * (len(kwargs) + 1))
-                values = [user_id] + list(kwargs.values())
-                await cursor.execute(
-                    f"INSERT INTO user_data ({fields}) VALUES ({placeholders})",
-                    values
-                )
-            
-            await self.conn.commit()
+            rows = await cursor.fetchall()
+            return [dict(row) for row in reversed(rows)]
     
     # Workout records methods
     
-    async def add_workout_record(self, user_id: int, workout_data: str):
-        """Add workout record"""
-        async with self.conn.cursor() as cursor:
-            await cursor.execute(
-                "INSERT INTO workout_records (user_id, workout_data) VALUES (?, ?)",
-                (user_id, workout_data)
-            )
-            await self.conn.commit()
+    async def add_workout_record(self, user_id: int, workout_data: str) -> List[Dict]:
+        """
+        Add workout record together with the exercise sets parsed from it
+        
+        Record and sets are committed in one transaction right away, the
+        exercise aggregates are updated by triggers on workout_sets.
+        
+        Returns:
+            Sets recognized in the text (see parse_workout)
+        """
+        sets = parse_workout(workout_data)
+        now = int(time.time())
+        
+        async with self._write_lock:
+            try:
+                cursor = await self.conn.execute(
+                    "INSERT INTO workout_records (user_id, workout_data, created_ts) VALUES (?, ?, ?)",
+                    (user_id, workout_data, now)
+                )
+                record_id = cursor.lastrowid
+                await self.conn.executemany(
+                    "INSERT INTO workout_sets (record_id, user_id, exercise, sets, reps, weight, e1rm, created_ts) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (record_id, user_id, s['exercise'], s['sets'], s['reps'], s['weight'], s['e1rm'], now)
+                        for s in sets
+                    ]
+                )
+                await self.conn.commit()
+            except Exception:
+                await self.conn.rollback()
+                raise
+        
+        return sets
     
     async def get_workout_records(self, user_id: int, limit: int = 10) -> List[Dict]:
         """Get workout records"""
-        async with self.conn.cursor() as cursor:
+        async with self._read_cursor() as cursor:
             await cursor.execute(
-                "SELECT * FROM workout_records WHERE user_id = ? ORDER BY created_at DESC LIMIT ?",
+                "SELECT id, user_id, workout_data, created_ts, "
+                "strftime('%Y-%m-%d %H:%M:%S', created_ts, 'unixepoch') AS created_at "
+                "FROM workout_records WHERE user_id = ? "
+                "ORDER BY created_ts DESC, id DESC LIMIT ?",
                 (user_id, limit)
             )
             rows = await cursor.fetchall()
             return [dict(row) for row in rows]
     
+    async def get_exercise_progress(self, user_id: int, limit: int = 5) -> List[Dict]:
+        """
+        Get aggregates of the user's most recently trained exercises
+        
+        Reads the trigger-maintained exercise_stats and exercise_weekly
+        rows by primary key, so the cost doesn't grow with history length.
+        
+        Returns:
+            Dicts with exercise, best_e1rm, max_weight, max_reps, total_sets,
+            last_ts, week_volume and prev_week_volume (current and previous
+            week, UTC)
+        """
+        week_start = WEEK_START_SQL.format(ts=":now")
+        
+        async with self._read_cursor() as cursor:
+            await cursor.execute(
+                "SELECT s.exercise, s.best_e1rm, s.max_weight, s.max_reps, s.total_sets, s.last_ts, "
+                "COALESCE(w.volume, 0) AS week_volume, COALESCE(p.volume, 0) AS prev_week_volume "
+                "FROM exercise_stats s "
+                "LEFT JOIN exercise_weekly w ON w.user_id = s.user_id AND w.exercise = s.exercise "
+                f"AND w.week_start = {week_start} "
+                "LEFT JOIN exercise_weekly p ON p.user_id = s.user_id AND p.exercise = s.exercise "
+                f"AND p.week_start = {week_start} - 604800 "
+                "WHERE s.user_id = :user_id ORDER BY s.last_ts DESC LIMIT :limit",
+                {'user_id': user_id, 'now': int(time.time()), 'limit': limit}
+            )
+            rows = await cursor.fetchall()
+            return [dict(row) for row in rows]
+    
+    async def get_weekly_volume(self, user_id: int, limit: int = 8) -> List[Dict]:
+        """
+        Get training volume over all exercises for the most recent weeks
+        
+        Returns:
+            Dicts with week_start and volume, oldest first; weeks without
+            recognized sets are missing
+        """
+        week_start = WEEK_START_SQL.format(ts=":now")
+        
+        async with self._read_cursor() as cursor:
+            await cursor.execute(
+                "SELECT week_start, SUM(volume) AS volume FROM exercise_weekly "
+                f"WHERE user_id = :user_id AND week_start > {week_start} - :limit * 604800 "
+                "GROUP BY week_start ORDER BY week_start",
+                {'user_id': user_id, 'now': int(time.time()), 'limit': limit}
+            )
+            rows = await cursor.fetchall()
+            return [dict(row) for row in rows]
+    
+    # Progress chart methods
+    
+    async def get_chart_file(self, user_id: int) -> Optional[Dict]:
+        """Get Telegram file_id and data version of the user's last uploaded chart"""
+        async with self._read_cursor() as cursor:
+            await cursor.execute(
+                "SELECT version, file_id FROM chart_files WHERE user_id = ?",
+                (user_id,)
+            )
+            row = await cursor.fetchone()
+            return dict(row) if row else None
+    
+    async def set_chart_file(self, user_id: int, version: str, file_id: str):
+        """Remember uploaded chart, replacing the previous version"""
+        await self._write(
+            "INSERT OR REPLACE INTO chart_files (user_id, version, file_id, created_ts) "
+            "VALUES (?, ?, ?, ?)",
+            (user_id, version, file_id, int(time.time()))
+        )
+    
+    async def delete_chart_file(self, user_id: int):
+        """Forget uploaded chart, e.g. when Telegram no longer accepts its file_id"""
+        await self._write(
+            "DELETE FROM chart_files WHERE user_id = ?",
+            (user_id,)
+        )
+    
     # AI requests methods
     
     async def get_ai_request_count(self, user_id: int) -> int:
         """Get AI request count for user"""
-        async with self.conn.cursor() as cursor:
+        async with self._read_cursor() as cursor:
             await cursor.execute(
                 "SELECT COUNT(*) as count FROM ai_requests WHERE user_id = ?",
                 (user_id,)
@@ -252,28 +727,391 @@ class Database:
         # This is handled by add_ai_request, so this method is for compatibility
         pass
     
-    async def add_ai_request(self, user_id: int, question: str, response: str):
+    async def add_ai_request(self, user_id: int, question: str, response: str, durable: bool = False):
         """Add AI request record"""
-        async with self.conn.cursor() as cursor:
+        await self._write(
+            "INSERT INTO ai_requests (user_id, question, response, created_ts) VALUES (?, ?, ?, ?)",
+            (user_id, question, response, int(time.time())),
+            durable=durable
+        )
+    
+    async def reserve_ai_quota(
+        self,
+        user_id: int,
+        limit: int,
+        window_start: int,
+        window_seconds: int,
+        prev_weight: float
+    ) -> Optional[Dict]:
+        """
+        Atomically reserve one AI request slot
+        
+        A single upsert rolls the counter over to the current window, checks
+        the limit and increments the counter, so concurrent reservations can't
+        exceed it.
+        
+        Args:
+            user_id: User ID
+            limit: Maximum requests per window
+            window_start: Start of the current window (0 for lifetime limits)
+            window_seconds: Window length, used to recognise the previous window
+            prev_weight: Share of the previous window still counted (rolling limits)
+        
+        Returns:
+            Counter row after reservation, or None if the limit is reached
+        """
+        params = {
+            'user_id': user_id,
+            'limit': limit,
+            'ws': window_start,
+            'prev_ws': window_start - window_seconds,
+            'weight': prev_weight
+        }
+        
+        async with self._write_lock:
+            async with self.conn.execute("""
+                INSERT INTO ai_quota (user_id, window_start, used, prev_used)
+                VALUES (:user_id, :ws, 1, 0)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    prev_used = CASE
+                        WHEN window_start = :ws THEN prev_used
+                        WHEN window_start = :prev_ws THEN used
+                        ELSE 0 END,
+                    used = CASE WHEN window_start = :ws THEN used + 1 ELSE 1 END,
+                    window_start = :ws
+                WHERE
+                    (CASE WHEN window_start = :ws THEN used ELSE 0 END)
+                    + :weight * (CASE
+                        WHEN window_start = :ws THEN prev_used
+                        WHEN window_start = :prev_ws THEN used
+                        ELSE 0 END)
+                    < :limit
+                RETURNING window_start, used, prev_used
+            """, params) as cursor:
+                row = await cursor.fetchone()
+            await self.conn.commit()
+        
+        return dict(row) if row else None
+    
+    async def refund_ai_quota(self, user_id: int, window_start: int):
+        """Give back a reserved slot if its window is still current"""
+        await self._write(
+            "UPDATE ai_quota SET used = used - 1 "
+            "WHERE user_id = ? AND window_start = ? AND used > 0",
+            (user_id, window_start)
+        )
+    
+    async def get_ai_quota(self, user_id: int) -> Optional[Dict]:
+        """Get AI quota counter row"""
+        async with self._read_cursor() as cursor:
             await cursor.execute(
-                "INSERT INTO ai_requests (user_id, question, response) VALUES (?, ?, ?)",
-                (user_id, question, response)
+                "SELECT window_start, used, prev_used FROM ai_quota WHERE user_id = ?",
+                (user_id,)
             )
-            await self.conn.commit()
+            row = await cursor.fetchone()
+            return dict(row) if row else None
     
     async def get_ai_history(self, user_id: int, limit: int = 5) -> List[Dict]:
         """Get AI request history"""
-        async with self.conn.cursor() as cursor:
+        async with self._read_cursor() as cursor:
             await cursor.execute(
-                "SELECT question, response, created_at FROM ai_requests WHERE user_id = ? ORDER BY created_at DESC LIMIT ?",
+                "SELECT question, response, created_ts, "
+                "strftime('%Y-%m-%d %H:%M:%S', created_ts, 'unixepoch') AS created_at "
+                "FROM ai_requests WHERE user_id = ? "
+                "ORDER BY created_ts DESC, id DESC LIMIT ?",
                 (user_id, limit)
             )
             rows = await cursor.fetchall()
             return [dict(row) for row in rows]
     
+    async def get_ai_history_with_quota(self, user_id: int, limit: int = 5) -> Dict:
+        """
+        Get AI request history and quota counter row in one query
+        
+        Returns:
+            Dict with 'history' (question, created_ts and created_at of the
+            most recent requests) and 'quota' (as get_ai_quota returns it)
+        """
+        # The one-row base table keeps the quota when there is no history
+        async with self._read_cursor() as cursor:
+            await cursor.execute(
+                "SELECT q.window_start, q.used, q.prev_used, r.question, r.created_ts, "
+                "strftime('%Y-%m-%d %H:%M:%S', r.created_ts, 'unixepoch') AS created_at "
+                "FROM (SELECT ? AS user_id) AS u "
+                "LEFT JOIN ai_quota AS q ON q.user_id = u.user_id "
+                "LEFT JOIN ("
+                "SELECT id, question, created_ts FROM ai_requests WHERE user_id = ? "
+                "ORDER BY created_ts DESC, id DESC LIMIT ?"
+                ") AS r ON 1 "
+                "ORDER BY r.created_ts DESC, r.id DESC",
+                (user_id, user_id, limit)
+            )
+            rows = await cursor.fetchall()
+        
+        first = rows[0]
+        quota = None
+        if first['window_start'] is not None:
+            quota = {'window_start': first['window_start'], 'used': first['used'], 'prev_used': first['prev_used']}
+        history = [
+            {'question': row['question'], 'created_ts': row['created_ts'], 'created_at': row['created_at']}
+            for row in rows if row['question'] is not None
+        ]
+        return {'history': history, 'quota': quota}
+    
+    async def get_ai_turns(self, user_id: int, after_id: int = 0, after_ts: int = 0, limit: int = 20) -> List[Dict]:
+        """
+        Get the user's most recent questions and answers after a summarized one
+        
+        Args:
+            user_id: User ID
+            after_id: Only requests with a greater ID
+            after_ts: Creation time of request after_id, bounds the index scan
+            limit: Maximum number of requests
+        
+        Returns:
+            Dicts with id, question, response and created_ts, newest first
+        """
+        async with self._read_cursor() as cursor:
+            await cursor.execute(
+                "SELECT id, question, response, created_ts FROM ai_requests "
+                "WHERE user_id = ? AND created_ts >= ? AND id > ? "
+                "ORDER BY created_ts DESC, id DESC LIMIT ?",
+                (user_id, after_ts, after_id, limit)
+            )
+            rows = await cursor.fetchall()
+            return [dict(row) for row in rows]
+    
+    # AI conversation methods
+    
+    async def get_ai_conversation(self, user_id: int) -> Optional[Dict]:
+        """Get rolling conversation summary with the last summarized request"""
+        async with self._read_cursor() as cursor:
+            await cursor.execute(
+                "SELECT summary, until_id, until_ts FROM ai_conversations WHERE user_id = ?",
+                (user_id,)
+            )
+            row = await cursor.fetchone()
+            return dict(row) if row else None
+    
+    async def set_ai_conversation(self, user_id: int, summary: str, until_id: int, until_ts: int):
+        """Store conversation summary covering requests up to until_id"""
+        await self._write(
+            "INSERT OR REPLACE INTO ai_conversations (user_id, summary, until_id, until_ts, updated_ts) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (user_id, summary, until_id, until_ts, int(time.time()))
+        )
+    
+    # AI response cache methods
+    
+    async def get_cached_response(self, key: str, min_created_ts: int) -> Optional[Dict]:
+        """Get cached AI response created after min_created_ts"""
+        async with self._read_cursor() as cursor:
+            await cursor.execute(
+                "SELECT response, created_ts, last_used_ts FROM ai_response_cache "
+                "WHERE key = ? AND created_ts >= ?",
+                (key, min_created_ts)
+            )
+            row = await cursor.fetchone()
+            return dict(row) if row else None
+    
+    async def touch_cached_response(self, key: str):
+        """Mark cached AI response as recently used"""
+        await self._write(
+            "UPDATE ai_response_cache SET last_used_ts = ? WHERE key = ?",
+            (int(time.time()), key)
+        )
+    
+    async def put_cached_response(self, key: str, response: str):
+        """Store AI response in cache"""
+        now = int(time.time())
+        await self._write(
+            "INSERT OR REPLACE INTO ai_response_cache (key, response, created_ts, last_used_ts) "
+            "VALUES (?, ?, ?, ?)",
+            (key, response, now, now)
+        )
+    
+    async def evict_cached_responses(self, max_entries: int, min_created_ts: int):
+        """Delete expired cache entries and least recently used ones beyond max_entries"""
+        await self._write(
+            "DELETE FROM ai_response_cache WHERE created_ts < ?",
+            (min_created_ts,)
+        )
+        await self._write(
+            "DELETE FROM ai_response_cache WHERE key IN ("
+            "SELECT key FROM ai_response_cache ORDER BY last_used_ts DESC LIMIT -1 OFFSET ?)",
+            (max_entries,)
+        )
+    
+    # FSM state methods
+    
+    async def get_fsm_record(self, key: str, min_updated_ts: int) -> Optional[Dict]:
+        """Get FSM state and JSON data updated after min_updated_ts"""
+        async with self._read_cursor() as cursor:
+            await cursor.execute(
+                "SELECT state, data, updated_ts FROM fsm_states WHERE key = ? AND updated_ts >= ?",
+                (key, min_updated_ts)
+            )
+            row = await cursor.fetchone()
+            return dict(row) if row else None
+    
+    async def save_fsm_records(self, upserts: List[tuple], deletes: List[str]):
+        """
+        Write a batch of FSM changes in one transaction
+        
+        Args:
+            upserts: (key, state, data JSON, updated_ts) tuples
+            deletes: Keys of records that became empty
+        """
+        async with self._write_lock:
+            if upserts:
+                await self.conn.executemany(
+                    "INSERT INTO fsm_states (key, state, data, updated_ts) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET "
+                    "state = excluded.state, data = excluded.data, updated_ts = excluded.updated_ts",
+                    upserts
+                )
+            if deletes:
+                await self.conn.executemany(
+                    "DELETE FROM fsm_states WHERE key = ?",
+                    ((key,) for key in deletes)
+                )
+            await self.conn.commit()
+    
+    async def delete_expired_fsm_records(self, min_updated_ts: int):
+        """Delete FSM records not updated since min_updated_ts"""
+        await self._write(
+            "DELETE FROM fsm_states WHERE updated_ts < ?",
+            (min_updated_ts,)
+        )
+    
+    # Broadcast methods
+    
+    def _segment_params(self) -> Dict[str, int]:
+        """Named parameters used by BROADCAST_SEGMENTS conditions"""
+        return {'since': int(time.time()) - BROADCAST_ACTIVE_DAYS * 86400}
+    
+    async def count_broadcast_recipients(self, segment: str) -> int:
+        """Count approved users in a broadcast segment"""
+        async with self._read_cursor() as cursor:
+            await cursor.execute(
+                f"SELECT COUNT(*) FROM users WHERE has_access = 1 {BROADCAST_SEGMENTS[segment]}",
+                self._segment_params()
+            )
+            row = await cursor.fetchone()
+            return row[0]
+    
+    async def create_broadcast(self, text: str, segment: str, report_chat_id: Optional[int] = None) -> int:
+        """
+        Create a broadcast and fix its recipients in one transaction
+        
+        Args:
+            text: HTML message text
+            segment: Key of BROADCAST_SEGMENTS selecting approved users
+            report_chat_id: Chat where progress is reported
+        
+        Returns:
+            Broadcast ID
+        """
+        # Include access changes still waiting for group commit
+        await self.flush()
+        
+        async with self._write_lock:
+            cursor = await self.conn.execute(
+                "INSERT INTO broadcasts (text, segment, report_chat_id, created_ts) VALUES (?, ?, ?, ?)",
+                (text, segment, report_chat_id, int(time.time()))
+            )
+            broadcast_id = cursor.lastrowid
+            
+            cursor = await self.conn.execute(
+                "INSERT INTO broadcast_deliveries (broadcast_id, user_id) "
+                f"SELECT :id, user_id FROM users WHERE has_access = 1 {BROADCAST_SEGMENTS[segment]}",
+                {'id': broadcast_id, **self._segment_params()}
+            )
+            await self.conn.execute(
+                "UPDATE broadcasts SET total = ? WHERE id = ?",
+                (cursor.rowcount, broadcast_id)
+            )
+            await self.conn.commit()
+        
+        return broadcast_id
+    
+    async def set_broadcast_report_message(self, broadcast_id: int, chat_id: int, message_id: int):
+        """Remember the message showing broadcast progress"""
+        await self._write(
+            "UPDATE broadcasts SET report_chat_id = ?, report_message_id = ? WHERE id = ?",
+            (chat_id, message_id, broadcast_id),
+            durable=True
+        )
+    
+    async def get_broadcast(self, broadcast_id: int) -> Optional[Dict]:
+        """Get broadcast by ID"""
+        async with self._read_cursor() as cursor:
+            await cursor.execute("SELECT * FROM broadcasts WHERE id = ?", (broadcast_id,))
+            row = await cursor.fetchone()
+            return dict(row) if row else None
+    
+    async def get_broadcasts(self, limit: int = 5) -> List[Dict]:
+        """Get most recent broadcasts"""
+        async with self._read_cursor() as cursor:
+            await cursor.execute(
+                "SELECT id, segment, status, total, created_ts FROM broadcasts ORDER BY id DESC LIMIT ?",
+                (limit,)
+            )
+            rows = await cursor.fetchall()
+            return [dict(row) for row in rows]
+    
+    async def get_running_broadcast_ids(self) -> List[int]:
+        """Get IDs of broadcasts not finished or cancelled"""
+        async with self._read_cursor() as cursor:
+            await cursor.execute("SELECT id FROM broadcasts WHERE status = 'running' ORDER BY id")
+            rows = await cursor.fetchall()
+            return [row[0] for row in rows]
+    
+    async def get_pending_deliveries(self, broadcast_id: int, after: int, limit: int) -> List[int]:
+        """Get next recipients not delivered yet, ordered by user ID after the cursor"""
+        async with self._read_cursor() as cursor:
+            await cursor.execute(
+                "SELECT user_id FROM broadcast_deliveries "
+                "WHERE broadcast_id = ? AND user_id > ? AND status = ? ORDER BY user_id LIMIT ?",
+                (broadcast_id, after, DELIVERY_PENDING, limit)
+            )
+            rows = await cursor.fetchall()
+            return [row[0] for row in rows]
+    
+    async def set_delivery_status(
+        self,
+        broadcast_id: int,
+        user_id: int,
+        status: int,
+        error: Optional[str] = None
+    ):
+        """Record delivery result for one recipient"""
+        await self._write(
+            "UPDATE broadcast_deliveries SET status = ?, error = ? WHERE broadcast_id = ? AND user_id = ?",
+            (status, error, broadcast_id, user_id)
+        )
+    
+    async def get_delivery_counts(self, broadcast_id: int) -> Dict[int, int]:
+        """Get number of recipients per delivery status"""
+        async with self._read_cursor() as cursor:
+            await cursor.execute(
+                "SELECT status, COUNT(*) FROM broadcast_deliveries WHERE broadcast_id = ? GROUP BY status",
+                (broadcast_id,)
+            )
+            rows = await cursor.fetchall()
+            return {row[0]: row[1] for row in rows}
+    
+    async def finish_broadcast(self, broadcast_id: int, status: str):
+        """Mark running broadcast as done or cancelled; a finished one keeps its status"""
+        await self._write(
+            "UPDATE broadcasts SET status = ?, finished_ts = ? WHERE id = ? AND status = 'running'",
+            (status, int(time.time()), broadcast_id),
+            durable=True
+        )
+    
     async def get_total_ai_requests(self) -> int:
         """Get total number of AI requests"""
-        async with self.conn.cursor() as cursor:
+        async with self._read_cursor() as cursor:
             await cursor.execute("SELECT COUNT(*) as count FROM ai_requests")
             row = await cursor.fetchone()
             return row['count']
\ No newline at end of file
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from src.config.settings import settings
+from src.storage.db import Database
+
+logger = logging.getLogger(__name__)
+
+# Expired rows are deleted from SQLite once per this many seconds
+CLEANUP_INTERVAL = 3600
+
+
+class _Record:
+    """FSM state and data of one chat"""
+    
+    __slots__ = ('state', 'data', 'updated')
+    
+    def __init__(self, state: Optional[str] = None, data: Optional[Dict] = None, updated: int = 0):
+        self.state = state
+        self.data = data or {}
+        self.updated = updated
+    
+    @property
+    def empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM storage persisted in the bot database
+    
+    Recently used records are kept in an in-memory LRU of FSM_CACHE_SIZE
+    entries. Changes are applied to memory immediately and written to
+    SQLite in batches every FSM_FLUSH_INTERVAL seconds. States not touched
+    for FSM_STATE_TTL_SECONDS are treated as abandoned and dropped.
+    """
+    
+    def __init__(self, db: Database):
+        """Initialize storage with database instance"""
+        self.db = db
+        self.cache_size = settings.FSM_CACHE_SIZE
+        self.ttl = settings.FSM_STATE_TTL_SECONDS
+        self.flush_interval = settings.FSM_FLUSH_INTERVAL
+        
+        self._key_builder = DefaultKeyBuilder(
+            with_bot_id=True, with_business_connection_id=True, with_destiny=True
+        )
+        self._cache: "OrderedDict[str, _Record]" = OrderedDict()
+        # Changed records not yet written; may include ones evicted from the LRU
+        self._dirty: Dict[str, _Record] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._cleaned = time.monotonic()
+    
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._get(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._changed(key, record)
+    
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = await self._get(key)
+        return record.state
+    
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = await self._get(key)
+        record.data = data.copy()
+        self._changed(key, record)
+    
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = await self._get(key)
+        return record.data.copy()
+    
+    async def close(self) -> None:
+        """Stop background flushing and write pending changes"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        
+        await self.flush()
+    
+    async def flush(self):
+        """Write all pending changes to SQLite"""
+        if not self._dirty:
+            return
+        
+        batch, self._dirty = self._dirty, {}
+        upserts = []
+        deletes = []
+        for key, record in batch.items():
+            if record.empty:
+                deletes.append(key)
+            else:
+                upserts.append((key, record.state, json.dumps(record.data, ensure_ascii=False), record.updated))
+        
+        try:
+            await self.db.save_fsm_records(upserts, deletes)
+        except BaseException as e:
+            # Keep changes made meanwhile, retry the rest on the next flush
+            batch.update(self._dirty)
+            self._dirty = batch
+            if not isinstance(e, Exception):
+                raise
+            logger.error(f"Failed to save {len(batch)} FSM records: {e}")
+    
+    def memory_usage(self) -> Dict[str, int]:
+        """Get number of records held in memory"""
+        return {'cached': len(self._cache), 'dirty': len(self._dirty)}
+    
+    def state_counts(self) -> Dict[str, int]:
+        """Get number of chats in each state among records held in memory"""
+        min_updated = int(time.time()) - self.ttl
+        counts: Dict[str, int] = {}
+        for record in self._cache.values():
+            if record.state is not None and record.updated >= min_updated:
+                counts[record.state] = counts.get(record.state, 0) + 1
+        return counts
+    
+    async def _get(self, key: StorageKey) -> _Record:
+        """Get record from memory or SQLite, dropping expired state"""
+        name = self._key_builder.build(key)
+        min_updated = int(time.time()) - self.ttl
+        
+        record = self._cache.get(name)
+        if record is None:
+            record = self._dirty.get(name)
+        if record is None:
+            row = await self.db.get_fsm_record(name, min_updated)
+            # Another update of this chat may have loaded it meanwhile
+            record = self._cache.get(name) or self._dirty.get(name)
+            if record is None and row:
+                record = _Record(row['state'], json.loads(row['data']), row['updated_ts'])
+            elif record is None:
+                record = _Record()
+        
+        if record.updated and record.updated < min_updated:
+            record = _Record()
+        
+        self._cache[name] = record
+        self._cache.move_to_end(name)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        
+        return record
+    
+    def _changed(self, key: StorageKey, record: _Record):
+        """Schedule a changed record for writing"""
+        record.updated = int(time.time())
+        self._dirty[self._key_builder.build(key)] = record
+        
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_loop())
+    
+    async def _flush_loop(self):
+        """Periodically write changes and delete expired records"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            
+            if time.monotonic() - self._cleaned >= CLEANUP_INTERVAL:
+                self._cleaned = time.monotonic()
+                try:
+                    await self.db.delete_expired_fsm_records(int(time.time()) - self.ttl)
+                except Exception as e:
+                    logger.error(f"Failed to delete expired FSM records: {e}")
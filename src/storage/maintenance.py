@@ -0,0 +1,56 @@
+"""
+Database maintenance commands
+
+Usage:
+    python -m src.storage.maintenance check-counters
+    python -m src.storage.maintenance rebuild-counters
+"""
+import argparse
+import asyncio
+import sys
+
+from src.storage.db import Database
+
+
+async def check_counters(db: Database) -> int:
+    """Report counters that drifted from their source tables"""
+    mismatches = await db.check_counters()
+    
+    if not mismatches:
+        print("Counters are consistent")
+        return 0
+    
+    for name, values in mismatches.items():
+        print(f"{name}: stored {values['stored']}, actual {values['actual']}")
+    return 1
+
+
+async def rebuild_counters(db: Database) -> int:
+    """Recount all counters"""
+    await db.rebuild_counters()
+    print("Counters rebuilt")
+    return await check_counters(db)
+
+
+COMMANDS = {
+    'check-counters': check_counters,
+    'rebuild-counters': rebuild_counters,
+}
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=COMMANDS)
+    args = parser.parse_args()
+    
+    db = Database()
+    await db.init_db()
+    
+    try:
+        return await COMMANDS[args.command](db)
+    finally:
+        await db.close()
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
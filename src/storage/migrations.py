@@ -0,0 +1,665 @@
+import logging
+import re
+import time
+import aiosqlite
+from typing import Awaitable, Callable, List
+
+from src.services.workout_parser import parse_workout
+
+logger = logging.getLogger(__name__)
+
+# Rows updated per transaction while backfilling existing data
+BACKFILL_BATCH_SIZE = 5000
+
+
+async def _column_exists(conn: aiosqlite.Connection, table: str, column: str) -> bool:
+    """Check if table already has a column"""
+    async with conn.execute(f"PRAGMA table_info({table})") as cursor:
+        rows = await cursor.fetchall()
+    return any(row[1] == column for row in rows)
+
+
+async def _backfill(conn: aiosqlite.Connection, table: str, assignment: str, pending: str):
+    """
+    Run a backfill UPDATE in batches
+    
+    Walks the table in rowid order, BACKFILL_BATCH_SIZE rows at a time, and
+    updates the rows of each range matching the pending condition. The
+    rowid cursor makes every batch a range seek; looking for pending rows
+    instead would rescan all rows filled before. Committing between batches
+    keeps each write transaction short, so a running bot is never blocked
+    for long.
+    
+    Args:
+        conn: Writer connection
+        table: Table to update
+        assignment: SET clause
+        pending: Condition of rows still needing the backfill
+    """
+    last_rowid = -2 ** 63
+    while True:
+        async with conn.execute(
+            f"SELECT MAX(rowid) FROM (SELECT rowid FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?)",
+            (last_rowid, BACKFILL_BATCH_SIZE)
+        ) as cursor:
+            batch_end = (await cursor.fetchone())[0]
+        if batch_end is None:
+            break
+        
+        await conn.execute(
+            f"UPDATE {table} SET {assignment} WHERE rowid > ? AND rowid <= ? AND {pending}",
+            (last_rowid, batch_end)
+        )
+        await conn.commit()
+        last_rowid = batch_end
+
+
+# Migrations
+
+async def _initial_schema(conn: aiosqlite.Connection):
+    """Create base tables (no-op for databases created before migrations)"""
+    # Users table
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            has_access INTEGER DEFAULT 0,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    # User data table
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_data (
+            user_id INTEGER PRIMARY KEY,
+            weight REAL,
+            height INTEGER,
+            age INTEGER,
+            goal TEXT,
+            target_weight REAL,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    """)
+    
+    # Workout records table
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS workout_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            workout_data TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    """)
+    
+    # AI requests table
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS ai_requests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            question TEXT,
+            response TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    """)
+
+
+async def _add_epoch_timestamps(conn: aiosqlite.Connection):
+    """Add integer epoch timestamp columns and backfill them from the TEXT ones"""
+    columns = [
+        ("users", "created_at", "created_ts"),
+        ("user_data", "updated_at", "updated_ts"),
+        ("workout_records", "created_at", "created_ts"),
+        ("ai_requests", "created_at", "created_ts"),
+    ]
+    
+    for table, text_column, epoch_column in columns:
+        # ADD COLUMN only touches the schema, so it is instant on large tables
+        if not await _column_exists(conn, table, epoch_column):
+            await conn.execute(f"ALTER TABLE {table} ADD COLUMN {epoch_column} INTEGER")
+            await conn.commit()
+        
+        await _backfill(
+            conn,
+            table,
+            f"{epoch_column} = COALESCE(CAST(strftime('%s', {text_column}) AS INTEGER), 0)",
+            f"{epoch_column} IS NULL"
+        )
+
+
+async def _add_user_time_indexes(conn: aiosqlite.Connection):
+    """Add (user_id, created_ts) indexes for per-user history and counts"""
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_workout_records_user_ts "
+        "ON workout_records (user_id, created_ts)"
+    )
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ai_requests_user_ts "
+        "ON ai_requests (user_id, created_ts)"
+    )
+
+
+
+async def _add_ai_quota(conn: aiosqlite.Connection):
+    """Add per-user AI quota counters, seeded with lifetime request counts"""
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS ai_quota (
+            user_id INTEGER PRIMARY KEY,
+            window_start INTEGER NOT NULL,
+            used INTEGER NOT NULL DEFAULT 0,
+            prev_used INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    
+    # Lifetime counters use window_start = 0; other modes start a fresh window
+    await conn.execute("""
+        INSERT OR IGNORE INTO ai_quota (user_id, window_start, used, prev_used)
+        SELECT user_id, 0, COUNT(*), 0 FROM ai_requests GROUP BY user_id
+    """)
+
+
+
+# Global counters maintained by triggers, with the queries that define them
+COUNTER_QUERIES = {
+    'total_users': "SELECT COUNT(*) FROM users",
+    'approved_users': "SELECT COUNT(*) FROM users WHERE has_access = 1",
+    'pending_users': "SELECT COUNT(*) FROM users WHERE has_access = 0",
+    'total_ai_requests': "SELECT COUNT(*) FROM ai_requests",
+}
+
+
+async def _add_counters(conn: aiosqlite.Connection):
+    """Add trigger-maintained global counters for admin statistics"""
+    # Create triggers and backfill in one transaction, so no write is missed
+    await conn.execute("BEGIN IMMEDIATE")
+    
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    
+    # has_access maps to a counter name; other values aren't counted
+    access_counter = "CASE {}.has_access WHEN 1 THEN 'approved_users' WHEN 0 THEN 'pending_users' END"
+    
+    await conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_users_insert_counters AFTER INSERT ON users
+        BEGIN
+            UPDATE counters SET value = value + 1 WHERE name = 'total_users';
+            UPDATE counters SET value = value + 1 WHERE name = {access_counter.format('NEW')};
+        END
+    """)
+    await conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_users_delete_counters AFTER DELETE ON users
+        BEGIN
+            UPDATE counters SET value = value - 1 WHERE name = 'total_users';
+            UPDATE counters SET value = value - 1 WHERE name = {access_counter.format('OLD')};
+        END
+    """)
+    await conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_users_access_counters AFTER UPDATE OF has_access ON users
+        WHEN OLD.has_access IS NOT NEW.has_access
+        BEGIN
+            UPDATE counters SET value = value - 1 WHERE name = {access_counter.format('OLD')};
+            UPDATE counters SET value = value + 1 WHERE name = {access_counter.format('NEW')};
+        END
+    """)
+    await conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_ai_requests_insert_counters AFTER INSERT ON ai_requests
+        BEGIN
+            UPDATE counters SET value = value + 1 WHERE name = 'total_ai_requests';
+        END
+    """)
+    await conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_ai_requests_delete_counters AFTER DELETE ON ai_requests
+        BEGIN
+            UPDATE counters SET value = value - 1 WHERE name = 'total_ai_requests';
+        END
+    """)
+    
+    for name, query in COUNTER_QUERIES.items():
+        await conn.execute(
+            f"INSERT OR REPLACE INTO counters (name, value) VALUES (?, ({query}))",
+            (name,)
+        )
+
+
+
+async def _add_users_access_index(conn: aiosqlite.Connection):
+    """Add (has_access, user_id) index for keyset-paginated user lists"""
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_access_id "
+        "ON users (has_access, user_id)"
+    )
+
+
+
+async def _add_ai_response_cache(conn: aiosqlite.Connection):
+    """Add persistent cache of AI answers with LRU bookkeeping"""
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS ai_response_cache (
+            key TEXT PRIMARY KEY,
+            response TEXT NOT NULL,
+            created_ts INTEGER NOT NULL,
+            last_used_ts INTEGER NOT NULL
+        )
+    """)
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ai_response_cache_last_used "
+        "ON ai_response_cache (last_used_ts)"
+    )
+
+
+async def _add_fsm_states(conn: aiosqlite.Connection):
+    """Add table for persistent FSM states of unfinished dialogs"""
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS fsm_states (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL DEFAULT '{}',
+            updated_ts INTEGER NOT NULL
+        )
+    """)
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_fsm_states_updated ON fsm_states (updated_ts)"
+    )
+
+
+async def _add_broadcasts(conn: aiosqlite.Connection):
+    """Add admin broadcasts with per-recipient delivery status"""
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            text TEXT NOT NULL,
+            segment TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running',
+            total INTEGER NOT NULL DEFAULT 0,
+            report_chat_id INTEGER,
+            report_message_id INTEGER,
+            created_ts INTEGER NOT NULL,
+            finished_ts INTEGER
+        )
+    """)
+    # Recipients are fixed when the broadcast starts; status 0 = pending
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+            broadcast_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            status INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            PRIMARY KEY (broadcast_id, user_id)
+        ) WITHOUT ROWID
+    """)
+
+
+# Monday 00:00 UTC of the week a timestamp falls in (1970-01-01 was a Thursday)
+WEEK_START_SQL = "({ts} - ({ts} + 259200) % 604800)"
+
+
+async def _add_workout_sets(conn: aiosqlite.Connection):
+    """Add parsed workout sets with trigger-maintained exercise aggregates"""
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS workout_sets (
+            id INTEGER PRIMARY KEY,
+            record_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            exercise TEXT NOT NULL,
+            sets INTEGER NOT NULL,
+            reps INTEGER NOT NULL,
+            weight REAL,
+            e1rm REAL,
+            created_ts INTEGER NOT NULL
+        )
+    """)
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_workout_sets_user_exercise_ts "
+        "ON workout_sets (user_id, exercise, created_ts)"
+    )
+    
+    # All-time bests per exercise
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS exercise_stats (
+            user_id INTEGER NOT NULL,
+            exercise TEXT NOT NULL,
+            best_e1rm REAL,
+            best_e1rm_ts INTEGER,
+            max_weight REAL,
+            max_reps INTEGER NOT NULL,
+            total_sets INTEGER NOT NULL,
+            last_ts INTEGER NOT NULL,
+            PRIMARY KEY (user_id, exercise)
+        ) WITHOUT ROWID
+    """)
+    # Volume (sets x reps x kg) per exercise and week
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS exercise_weekly (
+            user_id INTEGER NOT NULL,
+            exercise TEXT NOT NULL,
+            week_start INTEGER NOT NULL,
+            sets INTEGER NOT NULL,
+            reps INTEGER NOT NULL,
+            volume REAL NOT NULL,
+            PRIMARY KEY (user_id, exercise, week_start)
+        ) WITHOUT ROWID
+    """)
+    
+    await conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_workout_sets_insert_stats AFTER INSERT ON workout_sets
+        BEGIN
+            INSERT INTO exercise_stats (
+                user_id, exercise, best_e1rm, best_e1rm_ts, max_weight, max_reps, total_sets, last_ts
+            )
+            VALUES (
+                NEW.user_id, NEW.exercise, NEW.e1rm, CASE WHEN NEW.e1rm IS NOT NULL THEN NEW.created_ts END,
+                NEW.weight, NEW.reps, NEW.sets, NEW.created_ts
+            )
+            ON CONFLICT(user_id, exercise) DO UPDATE SET
+                best_e1rm_ts = CASE WHEN excluded.best_e1rm > best_e1rm OR best_e1rm IS NULL
+                    THEN COALESCE(excluded.best_e1rm_ts, best_e1rm_ts) ELSE best_e1rm_ts END,
+                best_e1rm = CASE WHEN excluded.best_e1rm > best_e1rm OR best_e1rm IS NULL
+                    THEN COALESCE(excluded.best_e1rm, best_e1rm) ELSE best_e1rm END,
+                max_weight = CASE WHEN excluded.max_weight > max_weight OR max_weight IS NULL
+                    THEN COALESCE(excluded.max_weight, max_weight) ELSE max_weight END,
+                max_reps = MAX(max_reps, excluded.max_reps),
+                total_sets = total_sets + excluded.total_sets,
+                last_ts = MAX(last_ts, excluded.last_ts);
+            
+            INSERT INTO exercise_weekly (user_id, exercise, week_start, sets, reps, volume)
+            VALUES (
+                NEW.user_id, NEW.exercise, {WEEK_START_SQL.format(ts='NEW.created_ts')},
+                NEW.sets, NEW.sets * NEW.reps, NEW.sets * NEW.reps * COALESCE(NEW.weight, 0)
+            )
+            ON CONFLICT(user_id, exercise, week_start) DO UPDATE SET
+                sets = sets + excluded.sets,
+                reps = reps + excluded.reps,
+                volume = volume + excluded.volume;
+        END
+    """)
+    await conn.commit()
+    
+    await _parse_workout_records(conn)
+
+
+async def _parse_workout_records(conn: aiosqlite.Connection):
+    """Fill workout_sets from workout records not parsed yet"""
+    # Parse existing records in batches, continuing after the last one
+    # parsed if an earlier run was interrupted
+    async with conn.execute("SELECT COALESCE(MAX(record_id), 0) FROM workout_sets") as cursor:
+        last_id = (await cursor.fetchone())[0]
+    
+    while True:
+        async with conn.execute(
+            "SELECT id, user_id, workout_data, created_ts FROM workout_records "
+            "WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, BACKFILL_BATCH_SIZE)
+        ) as cursor:
+            records = await cursor.fetchall()
+        if not records:
+            break
+        
+        rows = [
+            (record_id, user_id, s['exercise'], s['sets'], s['reps'], s['weight'], s['e1rm'], created_ts)
+            for record_id, user_id, workout_data, created_ts in records
+            for s in parse_workout(workout_data or "")
+        ]
+        await conn.executemany(
+            "INSERT INTO workout_sets (record_id, user_id, exercise, sets, reps, weight, e1rm, created_ts) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        await conn.commit()
+        last_id = records[-1][0]
+
+
+# Start of the day, week and month a timestamp falls in (UTC)
+WEIGHT_PERIODS = {
+    'day': "({ts} - {ts} % 86400)",
+    'week': WEEK_START_SQL,
+    'month': "CAST(strftime('%s', {ts}, 'unixepoch', 'start of month') AS INTEGER)",
+}
+
+
+async def _add_weight_history(conn: aiosqlite.Connection):
+    """Add append-only weight measurements with trigger-maintained rollups"""
+    # Create triggers and backfill in one transaction, so no write is missed
+    await conn.execute("BEGIN IMMEDIATE")
+    
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS weight_measurements (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            weight REAL NOT NULL
+        )
+    """)
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_weight_measurements_user_ts "
+        "ON weight_measurements (user_id, ts)"
+    )
+    # Average is sum_weight / count
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS weight_rollups (
+            user_id INTEGER NOT NULL,
+            period TEXT NOT NULL,
+            period_start INTEGER NOT NULL,
+            min_weight REAL NOT NULL,
+            max_weight REAL NOT NULL,
+            sum_weight REAL NOT NULL,
+            count INTEGER NOT NULL,
+            last_weight REAL NOT NULL,
+            last_ts INTEGER NOT NULL,
+            PRIMARY KEY (user_id, period, period_start)
+        ) WITHOUT ROWID
+    """)
+    
+    rollups = "".join(f"""
+            INSERT INTO weight_rollups (
+                user_id, period, period_start, min_weight, max_weight, sum_weight, count, last_weight, last_ts
+            )
+            VALUES (
+                NEW.user_id, '{period}', {start.format(ts='NEW.ts')},
+                NEW.weight, NEW.weight, NEW.weight, 1, NEW.weight, NEW.ts
+            )
+            ON CONFLICT(user_id, period, period_start) DO UPDATE SET
+                min_weight = MIN(min_weight, excluded.min_weight),
+                max_weight = MAX(max_weight, excluded.max_weight),
+                sum_weight = sum_weight + excluded.sum_weight,
+                count = count + 1,
+                last_weight = CASE WHEN excluded.last_ts >= last_ts THEN excluded.last_weight ELSE last_weight END,
+                last_ts = MAX(last_ts, excluded.last_ts);
+    """ for period, start in WEIGHT_PERIODS.items())
+    await conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_weight_measurements_insert_rollups AFTER INSERT ON weight_measurements
+        BEGIN
+            {rollups}
+        END
+    """)
+    
+    # Current weights are the only history there is
+    await conn.execute("""
+        INSERT INTO weight_measurements (user_id, ts, weight)
+        SELECT user_id, COALESCE(updated_ts, 0), weight FROM user_data
+        WHERE weight IS NOT NULL
+        AND NOT EXISTS (SELECT 1 FROM weight_measurements m WHERE m.user_id = user_data.user_id)
+    """)
+    
+    # Every weight written to the profile becomes a measurement
+    measurement = (
+        "INSERT INTO weight_measurements (user_id, ts, weight) "
+        "VALUES (NEW.user_id, COALESCE(NEW.updated_ts, CAST(strftime('%s', 'now') AS INTEGER)), NEW.weight);"
+    )
+    await conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_user_data_insert_weight AFTER INSERT ON user_data
+        WHEN NEW.weight IS NOT NULL
+        BEGIN
+            {measurement}
+        END
+    """)
+    await conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_user_data_update_weight AFTER UPDATE OF weight ON user_data
+        WHEN NEW.weight IS NOT NULL
+        BEGIN
+            {measurement}
+        END
+    """)
+
+
+async def _add_progress_charts(conn: aiosqlite.Connection):
+    """Add uploaded progress chart file IDs and weekly volume lookup"""
+    # Telegram file_id of the last uploaded chart and the data version it shows
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS chart_files (
+            user_id INTEGER PRIMARY KEY,
+            version TEXT NOT NULL,
+            file_id TEXT NOT NULL,
+            created_ts INTEGER NOT NULL
+        )
+    """)
+    # Weekly volume over all exercises reads only the charted weeks
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_exercise_weekly_user_week "
+        "ON exercise_weekly (user_id, week_start)"
+    )
+
+
+async def _add_ai_conversations(conn: aiosqlite.Connection):
+    """Add rolling summaries of AI conversations"""
+    # Summary of the user's turns up to and including ai_requests row until_id
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS ai_conversations (
+            user_id INTEGER PRIMARY KEY,
+            summary TEXT NOT NULL,
+            until_id INTEGER NOT NULL,
+            until_ts INTEGER NOT NULL,
+            updated_ts INTEGER NOT NULL
+        )
+    """)
+
+
+# A count before a weight with unit, like "5x100кг"; may match records
+# parsed right before, which then just parse the same again
+_COUNT_BEFORE_WEIGHT = re.compile(r"\d\s*[xх×*]\s*\d+(?:[.,]\d+)?\s*(?:кг|kg|lb|фунт)", re.IGNORECASE)
+
+
+async def _reparse_workout_sets(conn: aiosqlite.Connection):
+    """Parse workout records again: "5x100кг" used to be stored as 500 kg"""
+    # Only records with a count before a weight parse differently now
+    last_id = 0
+    while True:
+        async with conn.execute(
+            "SELECT id, user_id, workout_data, created_ts FROM workout_records "
+            "WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, BACKFILL_BATCH_SIZE)
+        ) as cursor:
+            records = await cursor.fetchall()
+        if not records:
+            break
+        last_id = records[-1][0]
+        
+        records = [r for r in records if r[2] and _COUNT_BEFORE_WEIGHT.search(r[2])]
+        if not records:
+            continue
+        await conn.executemany(
+            "DELETE FROM workout_sets WHERE user_id = ? AND record_id = ?",
+            [(user_id, record_id) for record_id, user_id, _, _ in records]
+        )
+        await conn.executemany(
+            "INSERT INTO workout_sets (record_id, user_id, exercise, sets, reps, weight, e1rm, created_ts) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (record_id, user_id, s['exercise'], s['sets'], s['reps'], s['weight'], s['e1rm'], created_ts)
+                for record_id, user_id, workout_data, created_ts in records
+                for s in parse_workout(workout_data)
+            ]
+        )
+        await conn.commit()
+    
+    # Triggers only add to aggregates, so they are rebuilt from the sets in
+    # one transaction; an interrupted run rebuilds them again
+    await conn.execute("BEGIN IMMEDIATE")
+    await conn.execute("DELETE FROM exercise_stats")
+    await conn.execute("""
+        INSERT INTO exercise_stats (
+            user_id, exercise, best_e1rm, best_e1rm_ts, max_weight, max_reps, total_sets, last_ts
+        )
+        SELECT user_id, exercise, MAX(e1rm), NULL, MAX(weight), MAX(reps), SUM(sets), MAX(created_ts)
+        FROM workout_sets GROUP BY user_id, exercise
+    """)
+    await conn.execute("""
+        UPDATE exercise_stats SET best_e1rm_ts = (
+            SELECT MIN(created_ts) FROM workout_sets AS w
+            WHERE w.user_id = exercise_stats.user_id AND w.exercise = exercise_stats.exercise
+                AND w.e1rm = exercise_stats.best_e1rm
+        )
+        WHERE best_e1rm IS NOT NULL
+    """)
+    await conn.execute("DELETE FROM exercise_weekly")
+    await conn.execute(f"""
+        INSERT INTO exercise_weekly (user_id, exercise, week_start, sets, reps, volume)
+        SELECT user_id, exercise, {WEEK_START_SQL.format(ts='created_ts')} AS week,
+            SUM(sets), SUM(sets * reps), SUM(sets * reps * COALESCE(weight, 0))
+        FROM workout_sets GROUP BY user_id, exercise, week
+    """)
+
+
+# Ordered list of migrations; PRAGMA user_version stores how many have run.
+# Never reorder or remove entries, only append new ones.
+MIGRATIONS: List[Callable[[aiosqlite.Connection], Awaitable[None]]] = [
+    _initial_schema,
+    _add_epoch_timestamps,
+    _add_user_time_indexes,
+    _add_ai_quota,
+    _add_counters,
+    _add_users_access_index,
+    _add_ai_response_cache,
+    _add_fsm_states,
+    _add_broadcasts,
+    _add_workout_sets,
+    _add_weight_history,
+    _add_progress_charts,
+    _add_ai_conversations,
+    _reparse_workout_sets,
+]
+
+
+async def get_schema_version(conn: aiosqlite.Connection) -> int:
+    """Get current schema version"""
+    async with conn.execute("PRAGMA user_version") as cursor:
+        row = await cursor.fetchone()
+    return row[0]
+
+
+async def run_migrations(conn: aiosqlite.Connection) -> int:
+    """
+    Apply pending migrations in order
+    
+    Every migration is idempotent, so a migration interrupted half way is
+    simply re-run on the next start. Migrations run before the bot starts
+    taking updates: backfills and index builds on a large database delay
+    the first start after an upgrade instead of racing live queries.
+    
+    Args:
+        conn: Writer connection
+    
+    Returns:
+        Schema version after migrating
+    """
+    version = await get_schema_version(conn)
+    
+    if version > len(MIGRATIONS):
+        raise RuntimeError(
+            f"Database schema version {version} is newer than this bot supports ({len(MIGRATIONS)})"
+        )
+    
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        logger.info(f"Applying database migration {number}: {migration.__name__}")
+        started = time.monotonic()
+        await migration(conn)
+        await conn.execute(f"PRAGMA user_version = {number}")
+        await conn.commit()
+        logger.info(f"Database migration {number} applied in {time.monotonic() - started:.1f}s")
+    
+    return len(MIGRATIONS)
@@ -0,0 +1,64 @@
+import logging
+from typing import Optional
+from aiohttp import web
+from src.config.settings import settings
+from src.services.metrics import REGISTRY, Registry
+
+logger = logging.getLogger(__name__)
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsServer:
+    """Serves metrics in Prometheus text format at /metrics"""
+    
+    def __init__(self, registry: Registry = REGISTRY):
+        """
+        Initialize metrics server
+        
+        Args:
+            registry: Metrics to expose
+        """
+        self.registry = registry
+        self._runner: Optional[web.AppRunner] = None
+    
+    def create_app(self) -> web.Application:
+        """Create aiohttp application serving /metrics"""
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        return app
+    
+    async def start(self, host: Optional[str] = None, port: Optional[int] = None) -> int:
+        """
+        Start HTTP server
+        
+        Args:
+            host: Interface to listen on (default: METRICS_HOST)
+            port: Port to listen on, 0 picks a free one (default: METRICS_PORT)
+        
+        Returns:
+            Port the server listens on
+        """
+        self._runner = web.AppRunner(self.create_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(
+            self._runner,
+            host or settings.METRICS_HOST,
+            settings.METRICS_PORT if port is None else port
+        )
+        await site.start()
+        
+        port = self._runner.addresses[0][1]
+        logger.info(f"Metrics server listening on port {port}")
+        return port
+    
+    async def stop(self):
+        """Stop HTTP server"""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+    
+    async def _handle(self, request: web.Request) -> web.Response:
+        """Render current metrics"""
+        return web.Response(body=self.registry.render().encode(), headers={"Content-Type": CONTENT_TYPE})
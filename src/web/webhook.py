@@ -0,0 +1,165 @@
+import asyncio
+import hmac
+import logging
+from typing import List, Optional
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from src.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Header Telegram sends with the secret_token given to setWebhook
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """
+    Receives Telegram updates over HTTP and feeds them to the dispatcher
+    
+    Each request is answered as soon as the update is queued; a fixed
+    number of workers (WEBHOOK_WORKERS) run the handlers. When the queue
+    is full, requests wait for room, which slows Telegram down instead
+    of piling up unbounded tasks.
+    """
+    
+    def __init__(
+        self,
+        dp: Dispatcher,
+        bot: Bot,
+        path: Optional[str] = None,
+        secret: Optional[str] = None,
+        workers: Optional[int] = None,
+        queue_size: Optional[int] = None
+    ):
+        """
+        Initialize webhook server
+        
+        Args:
+            dp: Dispatcher with registered routers
+            bot: Bot the updates are addressed to
+            path: URL path updates are posted to (default: WEBHOOK_PATH)
+            secret: Secret token Telegram has to send with each update (default: WEBHOOK_SECRET)
+            workers: Number of concurrent update handlers (default: WEBHOOK_WORKERS)
+            queue_size: Maximum number of queued updates (default: WEBHOOK_QUEUE_SIZE)
+        
+        Raises:
+            ValueError: If the secret is empty; anyone could post updates then
+        """
+        self.dp = dp
+        self.bot = bot
+        self.path = path or settings.WEBHOOK_PATH
+        self.secret = settings.WEBHOOK_SECRET if secret is None else secret
+        if not self.secret:
+            raise ValueError("WEBHOOK_SECRET must be set in webhook mode")
+        self.workers = workers or settings.WEBHOOK_WORKERS
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or settings.WEBHOOK_QUEUE_SIZE)
+        self._tasks: List[asyncio.Task] = []
+        self._runner: Optional[web.AppRunner] = None
+        
+        # Metrics
+        self.received = 0
+        self.rejected = 0
+        self.failed = 0
+    
+    @property
+    def queue_depth(self) -> int:
+        """Number of updates waiting for a worker"""
+        return self._queue.qsize()
+    
+    def create_app(self) -> web.Application:
+        """Create aiohttp application serving the webhook path"""
+        app = web.Application()
+        app.router.add_post(self.path, self._handle)
+        return app
+    
+    async def start(self, host: Optional[str] = None, port: Optional[int] = None) -> int:
+        """
+        Start workers and HTTP server
+        
+        Args:
+            host: Interface to listen on (default: WEBHOOK_HOST)
+            port: Port to listen on, 0 picks a free one (default: WEBHOOK_PORT)
+        
+        Returns:
+            Port the server listens on
+        """
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        
+        self._runner = web.AppRunner(self.create_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(
+            self._runner,
+            host or settings.WEBHOOK_HOST,
+            settings.WEBHOOK_PORT if port is None else port
+        )
+        await site.start()
+        
+        port = self._runner.addresses[0][1]
+        logger.info(f"Webhook server listening on port {port}, path {self.path}")
+        return port
+    
+    async def stop(self):
+        """Stop accepting updates, finish queued ones and stop workers"""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+        
+        await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+    
+    async def serve(self):
+        """
+        Serve updates until cancelled
+        
+        Registers the webhook with Telegram if WEBHOOK_URL is set; without
+        it the server only accepts updates posted to it directly.
+        """
+        workflow_data = {"dispatcher": self.dp, "bots": [self.bot], **self.dp.workflow_data}
+        await self.dp.emit_startup(bot=self.bot, **workflow_data)
+        await self.start()
+        
+        try:
+            if settings.WEBHOOK_URL:
+                await self.bot.set_webhook(
+                    settings.WEBHOOK_URL.rstrip("/") + self.path,
+                    secret_token=self.secret,
+                    allowed_updates=self.dp.resolve_used_update_types()
+                )
+            await asyncio.Event().wait()
+        finally:
+            await self.stop()
+            await self.dp.emit_shutdown(bot=self.bot, **workflow_data)
+    
+    async def _handle(self, request: web.Request) -> web.Response:
+        """Accept an update and queue it for the workers"""
+        if not hmac.compare_digest(
+            request.headers.get(SECRET_HEADER, "").encode(), self.secret.encode()
+        ):
+            self.rejected += 1
+            return web.Response(status=401)
+        
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except ValueError:
+            self.rejected += 1
+            return web.Response(status=400)
+        
+        self.received += 1
+        await self._queue.put(update)
+        return web.Response()
+    
+    async def _worker(self):
+        """Feed queued updates to the dispatcher one at a time"""
+        while True:
+            update = await self._queue.get()
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Failed to process update {update.update_id}: {e}")
+            finally:
+                self._queue.task_done()
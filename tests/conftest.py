@@ -0,0 +1,6 @@
+import os
+
+# Settings require these values; tests never talk to Telegram or Mistral
+os.environ.setdefault("BOT_TOKEN", "0:test")
+os.environ.setdefault("ADMIN_ID", "1")
+os.environ.setdefault("MISTRAL_API_KEY", "test")
@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.methods import SendMessage
+
+from src.config.settings import settings
+from src.services.broadcast_service import BroadcastService
+from src.storage.db import DELIVERY_FAILED, DELIVERY_SENT, Database
+
+USERS = range(1, 11)
+
+
+class FakeBot:
+    """Records sent messages; users in `blocked` have blocked the bot"""
+    
+    def __init__(self, blocked=()):
+        self.blocked = set(blocked)
+        self.sent = []
+        self.reports = []
+        # Cleared to hold sends until the test sets it
+        self.open = asyncio.Event()
+        self.open.set()
+    
+    async def send_message(self, chat_id, text):
+        await self.open.wait()
+        if chat_id in self.blocked:
+            raise TelegramForbiddenError(SendMessage(chat_id=chat_id, text=text), "bot was blocked by the user")
+        self.sent.append(chat_id)
+    
+    async def edit_message_text(self, text, **kwargs):
+        self.reports.append(text)
+
+
+@pytest.fixture(autouse=True)
+def fast_broadcasts(monkeypatch):
+    monkeypatch.setattr(settings, "BROADCAST_RATE", 1000.0)
+
+
+def run_with_db(path, scenario):
+    async def main():
+        db = Database(db_path=path)
+        await db.init_db()
+        try:
+            for user_id in USERS:
+                await db.register_user(user_id)
+                await db.grant_access(user_id)
+            return await scenario(db)
+        finally:
+            await db.close()
+    
+    return asyncio.run(main())
+
+
+async def finished(service: BroadcastService):
+    """Wait for all running broadcasts"""
+    await asyncio.gather(*service._tasks.values())
+
+
+def test_broadcast_reaches_every_recipient(tmp_path):
+    async def scenario(db):
+        bot = FakeBot(blocked={3})
+        service = BroadcastService(db, bot)
+        broadcast_id = await service.start("Привет", 'all', report_chat_id=1, report_message_id=100)
+        await finished(service)
+        return (
+            sorted(bot.sent),
+            (await db.get_broadcast(broadcast_id))['status'],
+            await db.get_delivery_counts(broadcast_id),
+            bot.reports[-1],
+        )
+    
+    sent, status, counts, report = run_with_db(tmp_path / "test.db", scenario)
+    assert sent == [user_id for user_id in USERS if user_id != 3]
+    assert status == 'done'
+    assert counts == {DELIVERY_SENT: 9, DELIVERY_FAILED: 1}
+    assert "заблокировали бота: 1" in report
+
+
+def test_interrupted_broadcast_resumes_with_users_not_reached(tmp_path):
+    async def scenario(db):
+        broadcast_id = await db.create_broadcast("Привет", 'all')
+        # Delivered before the restart
+        for user_id in (1, 2, 3):
+            await db.set_delivery_status(broadcast_id, user_id, DELIVERY_SENT)
+        
+        bot = FakeBot()
+        service = BroadcastService(db, bot)
+        await service.resume()
+        await finished(service)
+        return sorted(bot.sent), (await db.get_broadcast(broadcast_id))['status']
+    
+    sent, status = run_with_db(tmp_path / "test.db", scenario)
+    assert sent == list(range(4, 11))
+    assert status == 'done'
+
+
+def test_closed_service_leaves_broadcast_to_resume(tmp_path):
+    async def scenario(db):
+        bot = FakeBot()
+        bot.open.clear()
+        service = BroadcastService(db, bot)
+        broadcast_id = await service.start("Привет", 'all', report_chat_id=1, report_message_id=0)
+        await asyncio.sleep(0.05)
+        await service.close()
+        status = (await db.get_broadcast(broadcast_id))['status']
+        
+        bot.open.set()
+        restarted = BroadcastService(db, bot)
+        await restarted.resume()
+        await finished(restarted)
+        return status, sorted(bot.sent), (await db.get_broadcast(broadcast_id))['status']
+    
+    status, sent, final_status = run_with_db(tmp_path / "test.db", scenario)
+    assert status == 'running'
+    assert sent == list(USERS)
+    assert final_status == 'done'
+
+
+def test_cancel_stops_sending(tmp_path):
+    async def scenario(db):
+        bot = FakeBot()
+        bot.open.clear()
+        service = BroadcastService(db, bot)
+        broadcast_id = await service.start("Привет", 'all', report_chat_id=1, report_message_id=0)
+        await asyncio.sleep(0.05)
+        cancelled = await service.cancel(broadcast_id)
+        
+        bot.open.set()
+        await asyncio.sleep(0.05)
+        return (
+            cancelled,
+            await service.cancel(broadcast_id),
+            bot.sent,
+            (await db.get_broadcast(broadcast_id))['status'],
+            await db.get_running_broadcast_ids(),
+        )
+    
+    cancelled, again, sent, status, running = run_with_db(tmp_path / "test.db", scenario)
+    assert cancelled is True
+    assert again is False
+    assert sent == []
+    assert status == 'cancelled'
+    assert running == []
+
+
+def test_finished_broadcast_cannot_be_cancelled(tmp_path):
+    async def scenario(db):
+        service = BroadcastService(db, FakeBot())
+        broadcast_id = await service.start("Привет", 'all', report_chat_id=1, report_message_id=0)
+        await finished(service)
+        return await service.cancel(broadcast_id), (await db.get_broadcast(broadcast_id))['status']
+    
+    assert run_with_db(tmp_path / "test.db", scenario) == (False, 'done')
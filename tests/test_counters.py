@@ -0,0 +1,67 @@
+import asyncio
+
+from src.storage.db import Database
+
+
+def run_with_db(path, scenario, group_commit=False):
+    async def main():
+        db = Database(db_path=path, group_commit=group_commit)
+        await db.init_db()
+        try:
+            return await scenario(db)
+        finally:
+            await db.close()
+    
+    return asyncio.run(main())
+
+
+async def change_users(db):
+    for user_id in range(1, 8):
+        await db.register_user(user_id)
+    # Registering again changes nothing
+    await db.register_user(1)
+    await db.grant_access(1)
+    await db.grant_access(1)
+    await db.set_access_many([2, 3, 4], True)
+    await db.revoke_access(4)
+    await db._write("DELETE FROM users WHERE user_id IN (3, 5)")
+    for n in range(3):
+        await db.add_ai_request(1, f"q{n}", "a")
+    await db._write("DELETE FROM ai_requests WHERE question = 'q0'")
+    await db.flush()
+
+
+def test_triggers_keep_counters_in_step(tmp_path):
+    async def scenario(db):
+        await change_users(db)
+        return await db.get_counters(), await db.check_counters()
+    
+    counters, mismatches = run_with_db(tmp_path / "test.db", scenario)
+    assert counters == {
+        'total_users': 5,
+        'approved_users': 2,
+        'pending_users': 3,
+        'total_ai_requests': 2,
+    }
+    assert mismatches == {}
+
+
+def test_triggers_keep_counters_in_step_under_group_commit(tmp_path):
+    async def scenario(db):
+        await change_users(db)
+        return await db.check_counters()
+    
+    assert run_with_db(tmp_path / "test.db", scenario, group_commit=True) == {}
+
+
+def test_rebuild_fixes_drifted_counters(tmp_path):
+    async def scenario(db):
+        await change_users(db)
+        await db._write("UPDATE counters SET value = 100 WHERE name = 'total_users'")
+        drifted = await db.check_counters()
+        await db.rebuild_counters()
+        return drifted, await db.check_counters()
+    
+    drifted, after = run_with_db(tmp_path / "test.db", scenario)
+    assert drifted == {'total_users': {'stored': 100, 'actual': 5}}
+    assert after == {}
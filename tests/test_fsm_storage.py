@@ -0,0 +1,124 @@
+import asyncio
+import sqlite3
+
+from aiogram.fsm.storage.base import StorageKey
+
+from src.config.settings import settings
+from src.storage import fsm_storage
+from src.storage.db import Database
+from src.storage.fsm_storage import SQLiteStorage
+
+
+def chat(chat_id: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=chat_id, user_id=chat_id)
+
+
+def run_with_db(path, scenario):
+    async def main():
+        db = Database(db_path=path)
+        await db.init_db()
+        try:
+            return await scenario(db)
+        finally:
+            await db.close()
+    
+    return asyncio.run(main())
+
+
+async def fsm_rows(db) -> int:
+    async with db._read_cursor() as cursor:
+        await cursor.execute("SELECT COUNT(*) FROM fsm_states")
+        return (await cursor.fetchone())[0]
+
+
+def test_state_and_data_survive_restart(tmp_path):
+    async def scenario(db):
+        storage = SQLiteStorage(db)
+        await storage.set_state(chat(1), "Diet:waiting_question")
+        await storage.set_data(chat(1), {'weight': 80.5, 'goal': 'Похудение'})
+        await storage.close()
+        
+        restarted = SQLiteStorage(db)
+        try:
+            return await restarted.get_state(chat(1)), await restarted.get_data(chat(1))
+        finally:
+            await restarted.close()
+    
+    state, data = run_with_db(tmp_path / "test.db", scenario)
+    assert state == "Diet:waiting_question"
+    assert data == {'weight': 80.5, 'goal': 'Похудение'}
+
+
+def test_cleared_state_is_deleted(tmp_path):
+    async def scenario(db):
+        storage = SQLiteStorage(db)
+        await storage.set_state(chat(1), "Diet:waiting_question")
+        await storage.flush()
+        stored = await fsm_rows(db)
+        await storage.set_state(chat(1), None)
+        await storage.close()
+        return stored, await fsm_rows(db)
+    
+    assert run_with_db(tmp_path / "test.db", scenario) == (1, 0)
+
+
+def test_records_evicted_from_memory_are_still_written(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "FSM_CACHE_SIZE", 2)
+    
+    async def scenario(db):
+        storage = SQLiteStorage(db)
+        for chat_id in range(1, 6):
+            await storage.set_state(chat(chat_id), f"state{chat_id}")
+        memory = storage.memory_usage()
+        await storage.close()
+        
+        restarted = SQLiteStorage(db)
+        try:
+            return memory, [await restarted.get_state(chat(chat_id)) for chat_id in range(1, 6)]
+        finally:
+            await restarted.close()
+    
+    memory, states = run_with_db(tmp_path / "test.db", scenario)
+    assert memory == {'cached': 2, 'dirty': 5}
+    assert states == [f"state{chat_id}" for chat_id in range(1, 6)]
+
+
+def test_abandoned_state_expires(tmp_path, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(fsm_storage.time, "time", lambda: now[0])
+    
+    async def scenario(db):
+        storage = SQLiteStorage(db)
+        await storage.set_state(chat(1), "Diet:waiting_question")
+        await storage.close()
+        
+        now[0] += settings.FSM_STATE_TTL_SECONDS + 1
+        restarted = SQLiteStorage(db)
+        try:
+            return await restarted.get_state(chat(1))
+        finally:
+            await restarted.close()
+    
+    assert run_with_db(tmp_path / "test.db", scenario) is None
+
+
+def test_failed_flush_is_retried(tmp_path, monkeypatch):
+    async def scenario(db):
+        storage = SQLiteStorage(db)
+        save = db.save_fsm_records
+        
+        async def failing_save(upserts, deletes):
+            raise sqlite3.OperationalError("database is locked")
+        
+        await storage.set_state(chat(1), "first")
+        monkeypatch.setattr(db, "save_fsm_records", failing_save)
+        await storage.flush()
+        failed = await fsm_rows(db)
+        
+        # A change made after the failure is written together with the retried one
+        await storage.set_state(chat(2), "second")
+        monkeypatch.setattr(db, "save_fsm_records", save)
+        await storage.close()
+        return failed, await fsm_rows(db)
+    
+    assert run_with_db(tmp_path / "test.db", scenario) == (0, 2)
@@ -0,0 +1,82 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from src.storage.db import Database
+
+
+async def open_db(path) -> Database:
+    db = Database(db_path=path, group_commit=True)
+    await db.init_db()
+    return db
+
+
+def test_queued_writes_are_committed_by_flush(tmp_path):
+    async def scenario():
+        db = await open_db(tmp_path / "test.db")
+        try:
+            for user_id in range(1, 51):
+                await db.register_user(user_id)
+            await db.flush()
+            return await db.get_total_users()
+        finally:
+            await db.close()
+    
+    assert asyncio.run(scenario()) == 50
+
+
+def test_failed_write_does_not_drop_the_rest_of_its_batch(tmp_path):
+    async def scenario():
+        db = await open_db(tmp_path / "test.db")
+        try:
+            good = db._write("INSERT INTO users (user_id) VALUES (1)", durable=True)
+            bad = db._write("INSERT INTO no_such_table VALUES (1)", durable=True)
+            results = await asyncio.gather(good, bad, return_exceptions=True)
+            return results, await db.get_total_users()
+        finally:
+            await db.close()
+    
+    (good, bad), users = asyncio.run(scenario())
+    assert good is None
+    assert isinstance(bad, sqlite3.OperationalError)
+    assert users == 1
+
+
+def test_flusher_survives_failed_rollback(tmp_path):
+    async def scenario():
+        db = await open_db(tmp_path / "test.db")
+        try:
+            rollback = db.conn.rollback
+            
+            async def broken_rollback():
+                raise sqlite3.OperationalError("disk I/O error")
+            
+            db.conn.rollback = broken_rollback
+            with pytest.raises(sqlite3.OperationalError, match="disk I/O error"):
+                await db._write("INSERT INTO no_such_table VALUES (1)", durable=True)
+            db.conn.rollback = rollback
+            
+            # Later writes are still committed instead of waiting forever
+            await asyncio.wait_for(db.update_user_data(1, durable=True, weight=80), 5)
+            await asyncio.wait_for(db.flush(), 5)
+            return await db.get_user_data(1)
+        finally:
+            await db.close()
+    
+    assert asyncio.run(scenario())['weight'] == 80
+
+
+def test_durable_write_is_visible_to_readers(tmp_path):
+    async def scenario():
+        db = await open_db(tmp_path / "test.db")
+        try:
+            await db.update_user_data(1, durable=True, weight=80)
+            await db.add_ai_request(1, "Сколько белка нужно?", "Около 1,6 г на кг", durable=True)
+            return await db.get_user_data(1), await db.get_ai_turns(1)
+        finally:
+            await db.close()
+    
+    profile, turns = asyncio.run(scenario())
+    assert profile['weight'] == 80
+    assert [turn['question'] for turn in turns] == ["Сколько белка нужно?"]
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+from aiogram import Bot
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from benchmarks.fake_telegram import FakeTelegramSession, callback_update, message_update
+from src.config.settings import settings
+from src.main import create_dispatcher
+from src.services.access_service import AccessService
+from src.services.mistral_scheduler import MistralScheduler
+from src.services.mistral_service import MistralService
+from src.services.response_cache import ResponseCache
+from src.services.single_flight import SingleFlight
+from src.storage.db import Database
+
+USER_ID = 1001
+QUERY_PREFIXES = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+# Handler, who presses it, most queries it may make; fed in this order
+BUDGETS = [
+    ("/start", USER_ID, 0),
+    ("main_menu", USER_ID, 0),
+    ("my_data", USER_ID, 1),
+    ("view_workouts", USER_ID, 1),
+    ("diet_ai", USER_ID, 1),
+    ("ask_ai", USER_ID, 1),
+    ("ai_history", USER_ID, 1),
+    ("admin_panel", settings.ADMIN_ID, 0),
+    ("pending_users", settings.ADMIN_ID, 1),
+    ("all_users", settings.ADMIN_ID, 1),
+    ("stats", settings.ADMIN_ID, 1),
+]
+
+
+async def count_queries(db_path) -> dict:
+    """Feed each update through the real dispatcher and count the statements it runs"""
+    db = Database(db_path=db_path)
+    await db.init_db()
+    try:
+        await db.register_user(USER_ID)
+        await db.grant_access(USER_ID, durable=True)
+        await db.update_user_data(USER_ID, durable=True, weight=80, height=180, age=30, goal="Похудеть")
+        await db.flush()
+        
+        access_service = AccessService(db)
+        await access_service.load()
+        dp = create_dispatcher(
+            MemoryStorage(),
+            db,
+            access_service,
+            SingleFlight(MistralScheduler(MistralService())),
+            ResponseCache(db)
+        )
+        
+        # Statements on the writer and every reader connection
+        queries = []
+        
+        def trace(sql: str):
+            if sql.lstrip().upper().startswith(QUERY_PREFIXES):
+                queries.append(sql)
+        
+        await db.conn.set_trace_callback(trace)
+        for reader in db._readers:
+            await reader.set_trace_callback(trace)
+        
+        bot = Bot(token=settings.BOT_TOKEN, session=FakeTelegramSession())
+        counts = {}
+        for update_id, (name, user_id, _) in enumerate(BUDGETS, start=1):
+            if name.startswith("/"):
+                update = message_update(update_id, user_id, name)
+            else:
+                update = callback_update(update_id, user_id, name)
+            
+            queries.clear()
+            await dp.feed_update(bot, update)
+            counts[name] = len(queries)
+        return counts
+    finally:
+        await db.close()
+
+
+@pytest.fixture(scope="module")
+def query_counts(tmp_path_factory):
+    # Routers attach to one dispatcher only, so all updates share it
+    return asyncio.run(count_queries(tmp_path_factory.mktemp("queries") / "test.db"))
+
+
+@pytest.mark.parametrize("name, budget", [(name, budget) for name, _, budget in BUDGETS])
+def test_handler_query_budget(query_counts, name, budget):
+    assert query_counts[name] <= budget
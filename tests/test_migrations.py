@@ -0,0 +1,229 @@
+import asyncio
+
+import aiosqlite
+import pytest
+
+from src.storage import migrations
+from src.storage.migrations import COUNTER_QUERIES, MIGRATIONS, run_migrations
+
+
+async def create_baseline(path):
+    """Create a database the way the bot did before migrations existed"""
+    conn = await aiosqlite.connect(path)
+    await MIGRATIONS[0](conn)
+    
+    await conn.executemany(
+        "INSERT INTO users (user_id, has_access, created_at) VALUES (?, ?, '2024-01-01 10:00:00')",
+        [(user_id, user_id % 2) for user_id in range(1, 21)]
+    )
+    await conn.executemany(
+        "INSERT INTO ai_requests (user_id, question, response, created_at) VALUES (?, 'q', 'a', ?)",
+        [(n % 5 + 1, f"2024-02-01 00:00:{n:02d}") for n in range(50)]
+    )
+    await conn.executemany(
+        "INSERT INTO workout_records (user_id, workout_data, created_at) VALUES (1, ?, '2024-03-04 12:00:00')",
+        [("Жим 5x100кг",), ("Присед 3x10 80кг",), ("Бегал в парке",)]
+    )
+    await conn.commit()
+    return conn
+
+
+async def migrate(path):
+    conn = await create_baseline(path)
+    try:
+        await run_migrations(conn)
+        return conn
+    except BaseException:
+        await conn.close()
+        raise
+
+
+async def fetch(conn, sql):
+    async with conn.execute(sql) as cursor:
+        return await cursor.fetchall()
+
+
+def test_baseline_database_migrates_to_latest_version(tmp_path, monkeypatch):
+    # Small batches make the epoch backfill walk several rowid ranges
+    monkeypatch.setattr(migrations, "BACKFILL_BATCH_SIZE", 7)
+    
+    async def scenario():
+        conn = await migrate(tmp_path / "test.db")
+        try:
+            return {
+                "version": await fetch(conn, "PRAGMA user_version"),
+                "pending": await fetch(conn, "SELECT COUNT(*) FROM ai_requests WHERE created_ts IS NULL"),
+                "wrong": await fetch(
+                    conn,
+                    "SELECT COUNT(*) FROM ai_requests "
+                    "WHERE created_ts != CAST(strftime('%s', created_at) AS INTEGER)"
+                ),
+                "users_ts": await fetch(conn, "SELECT DISTINCT created_ts FROM users"),
+            }
+        finally:
+            await conn.close()
+    
+    result = asyncio.run(scenario())
+    assert result["version"] == [(len(MIGRATIONS),)]
+    assert result["pending"] == [(0,)]
+    assert result["wrong"] == [(0,)]
+    assert result["users_ts"] == [(1704103200,)]
+
+
+def test_backfill_keeps_rows_filled_by_an_interrupted_run(tmp_path, monkeypatch):
+    monkeypatch.setattr(migrations, "BACKFILL_BATCH_SIZE", 3)
+    
+    async def scenario():
+        conn = await create_baseline(tmp_path / "test.db")
+        try:
+            await conn.execute("ALTER TABLE ai_requests ADD COLUMN created_ts INTEGER")
+            await conn.execute("UPDATE ai_requests SET created_ts = 1 WHERE id <= 10")
+            await conn.commit()
+            await migrations._add_epoch_timestamps(conn)
+            return await fetch(conn, "SELECT COUNT(*), SUM(created_ts = 1) FROM ai_requests WHERE created_ts > 0")
+        finally:
+            await conn.close()
+    
+    assert asyncio.run(scenario()) == [(50, 10)]
+
+
+def test_ai_quota_is_seeded_with_request_counts(tmp_path):
+    async def scenario():
+        conn = await migrate(tmp_path / "test.db")
+        try:
+            return await fetch(conn, "SELECT user_id, window_start, used FROM ai_quota ORDER BY user_id")
+        finally:
+            await conn.close()
+    
+    assert asyncio.run(scenario()) == [(user_id, 0, 10) for user_id in range(1, 6)]
+
+
+def test_counters_match_their_queries(tmp_path):
+    async def scenario():
+        conn = await migrate(tmp_path / "test.db")
+        try:
+            stored = dict(await fetch(conn, "SELECT name, value FROM counters"))
+            actual = {name: (await fetch(conn, query))[0][0] for name, query in COUNTER_QUERIES.items()}
+            return stored, actual
+        finally:
+            await conn.close()
+    
+    stored, actual = asyncio.run(scenario())
+    assert stored == actual == {
+        'total_users': 20,
+        'approved_users': 10,
+        'pending_users': 10,
+        'total_ai_requests': 50,
+    }
+
+
+def test_workout_records_are_parsed_into_sets(tmp_path):
+    async def scenario():
+        conn = await migrate(tmp_path / "test.db")
+        try:
+            sets = await fetch(conn, "SELECT exercise, sets, reps, weight FROM workout_sets ORDER BY record_id")
+            stats = await fetch(conn, "SELECT exercise, max_weight FROM exercise_stats ORDER BY exercise")
+            return sets, stats
+        finally:
+            await conn.close()
+    
+    sets, stats = asyncio.run(scenario())
+    assert sets == [("жим", 1, 5, 100.0), ("присед", 3, 10, 80.0)]
+    assert stats == [("жим", 100.0), ("присед", 80.0)]
+
+
+def test_rerunning_migrations_changes_nothing(tmp_path):
+    async def scenario():
+        conn = await migrate(tmp_path / "test.db")
+        try:
+            tables = ["counters", "ai_quota", "workout_sets", "exercise_stats", "exercise_weekly"]
+            before = [await fetch(conn, f"SELECT * FROM {table} ORDER BY 1, 2") for table in tables]
+            await conn.execute("PRAGMA user_version = 1")
+            await conn.commit()
+            await run_migrations(conn)
+            after = [await fetch(conn, f"SELECT * FROM {table} ORDER BY 1, 2") for table in tables]
+            return before, after
+        finally:
+            await conn.close()
+    
+    before, after = asyncio.run(scenario())
+    assert before == after
+
+
+def test_newer_schema_version_is_refused(tmp_path):
+    async def scenario():
+        conn = await aiosqlite.connect(tmp_path / "test.db")
+        try:
+            await conn.execute(f"PRAGMA user_version = {len(MIGRATIONS) + 1}")
+            await conn.commit()
+            await run_migrations(conn)
+        finally:
+            await conn.close()
+    
+    with pytest.raises(RuntimeError, match="newer than this bot supports"):
+        asyncio.run(scenario())
+
+
+def test_reparse_fixes_sets_stored_with_count_as_factor(tmp_path):
+    async def scenario():
+        conn = await create_baseline(tmp_path / "test.db")
+        try:
+            for migration in MIGRATIONS[:-1]:
+                await migration(conn)
+                await conn.commit()
+            await conn.execute(f"PRAGMA user_version = {len(MIGRATIONS) - 1}")
+            # How the old parser stored "Жим 5x100кг": one set of one rep with 500 kg
+            await conn.execute("DELETE FROM workout_sets WHERE record_id = 1")
+            await conn.execute(
+                "INSERT INTO workout_sets (record_id, user_id, exercise, sets, reps, weight, e1rm, created_ts) "
+                "VALUES (1, 1, 'жим', 1, 1, 500, 500, 1709553600)"
+            )
+            await conn.commit()
+            await run_migrations(conn)
+            return (
+                await fetch(conn, "SELECT sets, reps, weight FROM workout_sets WHERE record_id = 1"),
+                await fetch(conn, "SELECT max_weight, total_sets FROM exercise_stats WHERE exercise = 'жим'"),
+                await fetch(conn, "SELECT volume FROM exercise_weekly WHERE exercise = 'жим'"),
+            )
+        finally:
+            await conn.close()
+    
+    sets, stats, weekly = asyncio.run(scenario())
+    assert sets == [(1, 5, 100.0)]
+    assert stats == [(100.0, 1)]
+    assert weekly == [(500.0,)]
+
+
+def test_rebuilt_aggregates_match_triggers(tmp_path):
+    lines = [
+        "Жим 80кг 3x10", "Жим 100кг 1x1", "Жим 5x100кг", "Присед 3x5 120кг",
+        "Присед 2x20кг", "Подтягивания 3x12", "Жим 90кг 3x3", "Тяга 60кг 4x8",
+    ]
+    
+    async def scenario():
+        conn = await create_baseline(tmp_path / "test.db")
+        try:
+            # Spread records over several weeks, in time order like the bot stores them
+            await conn.executemany(
+                "INSERT INTO workout_records (user_id, workout_data, created_at) VALUES (?, ?, ?)",
+                [
+                    (n % 3 + 1, lines[n % len(lines)], f"2024-04-{n // 3 + 1:02d} 08:00:00")
+                    for n in range(60)
+                ]
+            )
+            await conn.commit()
+            await run_migrations(conn)
+            tables = ["exercise_stats", "exercise_weekly"]
+            rebuilt = [await fetch(conn, f"SELECT * FROM {table} ORDER BY 1, 2, 3") for table in tables]
+            
+            for table in ["workout_sets"] + tables:
+                await conn.execute(f"DELETE FROM {table}")
+            await conn.commit()
+            await migrations._parse_workout_records(conn)
+            by_triggers = [await fetch(conn, f"SELECT * FROM {table} ORDER BY 1, 2, 3") for table in tables]
+            return rebuilt, by_triggers
+        finally:
+            await conn.close()
+    
+    rebuilt, by_triggers = asyncio.run(scenario())
+    assert rebuilt == by_triggers
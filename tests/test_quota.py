@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+
+from src.config.settings import settings
+from src.services import quota_service
+from src.services.quota_service import QuotaService
+from src.storage.db import Database
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Current time seen by QuotaService, set by the test"""
+    now = [1000.0]
+    monkeypatch.setattr(quota_service.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def quota_settings(monkeypatch):
+    def configure(mode, limit, window_seconds=100):
+        monkeypatch.setattr(settings, "AI_QUOTA_MODE", mode)
+        monkeypatch.setattr(settings, "MAX_REQUESTS_PER_USER", limit)
+        monkeypatch.setattr(settings, "AI_QUOTA_WINDOW_SECONDS", window_seconds)
+    return configure
+
+
+def run_with_quota(path, scenario):
+    async def main():
+        db = Database(db_path=path)
+        await db.init_db()
+        try:
+            return await scenario(QuotaService(db))
+        finally:
+            await db.close()
+    
+    return asyncio.run(main())
+
+
+async def reserve_all(quota, user_id=1):
+    """Reserve until the limit is reached; returns the reservations made"""
+    reservations = []
+    while True:
+        reservation = await quota.reserve(user_id)
+        if reservation is None:
+            return reservations
+        reservations.append(reservation)
+
+
+def test_reserve_stops_at_limit(tmp_path, clock, quota_settings):
+    quota_settings("lifetime", 3)
+    
+    async def scenario(quota):
+        reservations = await reserve_all(quota)
+        return [r['used'] for r in reservations], await quota.get_used(1), await quota.get_used(2)
+    
+    assert run_with_quota(tmp_path / "test.db", scenario) == ([1, 2, 3], 3, 0)
+
+
+def test_refund_returns_the_slot(tmp_path, clock, quota_settings):
+    quota_settings("lifetime", 2)
+    
+    async def scenario(quota):
+        reservations = await reserve_all(quota)
+        await quota.refund(reservations[-1])
+        used = await quota.get_used(1)
+        again = await quota.reserve(1)
+        return used, again is not None, await quota.reserve(1)
+    
+    assert run_with_quota(tmp_path / "test.db", scenario) == (1, True, None)
+
+
+def test_lifetime_limit_never_resets(tmp_path, clock, quota_settings):
+    quota_settings("lifetime", 2)
+    
+    async def scenario(quota):
+        await reserve_all(quota)
+        clock[0] += 365 * 86400
+        return await quota.reserve(1)
+    
+    assert run_with_quota(tmp_path / "test.db", scenario) is None
+
+
+def test_daily_limit_resets_next_day(tmp_path, clock, quota_settings):
+    quota_settings("daily", 2)
+    
+    async def scenario(quota):
+        first_day = len(await reserve_all(quota))
+        clock[0] += 3600
+        same_day = await quota.reserve(1)
+        clock[0] += 86400
+        return first_day, same_day, len(await reserve_all(quota))
+    
+    assert run_with_quota(tmp_path / "test.db", scenario) == (2, None, 2)
+
+
+def test_rolling_limit_counts_overlap_with_previous_window(tmp_path, clock, quota_settings):
+    quota_settings("rolling", 4, window_seconds=100)
+    
+    async def scenario(quota):
+        # Window [1000, 1100) is used up
+        first = len(await reserve_all(quota))
+        # Half of the sliding window still overlaps it: 2 of its 4 requests count
+        clock[0] = 1150.0
+        used_before = await quota.get_used(1)
+        second = len(await reserve_all(quota))
+        # Two windows later nothing counts any more
+        clock[0] = 1350.0
+        return first, used_before, second, await quota.get_used(1)
+    
+    assert run_with_quota(tmp_path / "test.db", scenario) == (4, 2, 2, 0)
+
+
+def test_refund_after_window_rolled_over_is_ignored(tmp_path, clock, quota_settings):
+    quota_settings("daily", 2)
+    
+    async def scenario(quota):
+        reservation = await quota.reserve(1)
+        clock[0] += 86400
+        await quota.reserve(1)
+        await quota.refund(reservation)
+        return await quota.get_used(1)
+    
+    assert run_with_quota(tmp_path / "test.db", scenario) == 1
+
+
+def test_count_used_reads_a_given_row(clock, quota_settings):
+    quota_settings("daily", 5)
+    quota = QuotaService(db=None)
+    
+    assert quota.count_used(None) == 0
+    assert quota.count_used({'window_start': 0, 'used': 3, 'prev_used': 0}) == 3
+    assert quota.count_used({'window_start': -86400, 'used': 3, 'prev_used': 0}) == 0
+    assert quota.get_remaining(7) == 0
+
+
+def test_unknown_mode_is_refused(quota_settings):
+    quota_settings("weekly", 5)
+    
+    with pytest.raises(ValueError):
+        QuotaService(db=None)
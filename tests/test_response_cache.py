@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from src.config.settings import settings
+from src.services import response_cache
+from src.services.response_cache import TOUCH_INTERVAL, ResponseCache
+from src.storage.db import Database
+
+PROFILE = {'weight': 82, 'age': 31, 'goal': 'Похудение'}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Current time seen by the cache and the database, set by the test"""
+    now = [1_000_000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    return now
+
+
+def run_with_db(path, scenario):
+    async def main():
+        db = Database(db_path=path)
+        await db.init_db()
+        try:
+            return await scenario(db)
+        finally:
+            await db.close()
+    
+    return asyncio.run(main())
+
+
+def test_similar_questions_and_profiles_share_a_key():
+    cache = ResponseCache(db=None)
+    key = cache.make_key("Сколько белка есть?", PROFILE)
+    
+    assert cache.make_key("сколько  белка есть", {**PROFILE, 'weight': 84, 'age': 33}) == key
+    assert cache.make_key("Сколько белка есть?", {**PROFILE, 'weight': 87}) != key
+    assert cache.make_key("Сколько белка есть?", {**PROFILE, 'goal': 'Набор массы'}) != key
+    assert cache.make_key("Сколько жира есть?", PROFILE) != key
+
+
+def test_answer_is_served_from_memory_then_from_sqlite(tmp_path, clock):
+    async def scenario(db):
+        cache = ResponseCache(db)
+        key = cache.make_key("Сколько белка есть?", PROFILE)
+        missed = await cache.get(key)
+        await cache.put(key, "Около 1.6 г на кг веса")
+        hot = await cache.get(key)
+        
+        # A restarted bot starts with an empty memory tier
+        restarted = ResponseCache(db)
+        from_db = await restarted.get(key)
+        return missed, hot, from_db, cache.stats(), restarted.stats()
+    
+    missed, hot, from_db, stats, restarted_stats = run_with_db(tmp_path / "test.db", scenario)
+    assert missed is None
+    assert hot == from_db == "Около 1.6 г на кг веса"
+    assert (stats['hot_hits'], stats['misses']) == (1, 1)
+    assert restarted_stats['db_hits'] == 1
+
+
+def test_expired_answer_is_not_served(tmp_path, clock):
+    async def scenario(db):
+        cache = ResponseCache(db)
+        await cache.put("key", "answer")
+        clock[0] += settings.AI_CACHE_TTL_SECONDS + 1
+        return await cache.get("key"), await ResponseCache(db).get("key")
+    
+    assert run_with_db(tmp_path / "test.db", scenario) == (None, None)
+
+
+def test_hits_touch_last_used_at_most_once_per_interval(tmp_path, clock):
+    async def last_used(db):
+        async with db._read_cursor() as cursor:
+            await cursor.execute("SELECT last_used_ts FROM ai_response_cache WHERE key = 'key'")
+            return (await cursor.fetchone())[0]
+    
+    async def scenario(db):
+        cache = ResponseCache(db)
+        await cache.put("key", "answer")
+        stored = await last_used(db)
+        
+        clock[0] += TOUCH_INTERVAL - 1
+        await cache.get("key")
+        soon = await last_used(db)
+        
+        clock[0] += 1
+        await cache.get("key")
+        return stored, soon, await last_used(db)
+    
+    stored, soon, later = run_with_db(tmp_path / "test.db", scenario)
+    assert soon == stored
+    assert later == stored + TOUCH_INTERVAL
+
+
+def test_disabled_cache_stores_nothing(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(settings, "AI_CACHE_ENABLED", False)
+    
+    async def scenario(db):
+        cache = ResponseCache(db)
+        await cache.put("key", "answer")
+        return await cache.get("key"), await db.get_cached_response("key", 0)
+    
+    assert run_with_db(tmp_path / "test.db", scenario) == (None, None)
@@ -0,0 +1,83 @@
+import asyncio
+
+from src.services.single_flight import SingleFlight
+
+
+class QueuedScheduler:
+    """Scheduler stand-in whose requests wait in the queue until released"""
+    
+    def __init__(self):
+        self.requests = 0
+        self.released = asyncio.Event()
+    
+    async def get_diet_advice(self, question, user_data=None, user_id=0, on_queued=None):
+        self.requests += 1
+        await on_queued(3)
+        await self.released.wait()
+        return f"Ответ на: {question}"
+    
+    async def stream_diet_advice(self, question, user_data=None, user_id=0, on_queued=None):
+        self.requests += 1
+        await on_queued(3)
+        await self.released.wait()
+        for chunk in ("Ответ ", "по частям"):
+            yield chunk
+
+
+def recorder(positions: list, name: str):
+    async def on_queued(position: int):
+        positions.append((name, position))
+    return on_queued
+
+
+def test_identical_questions_share_one_request():
+    async def scenario():
+        scheduler = QueuedScheduler()
+        single_flight = SingleFlight(scheduler)
+        positions = []
+        
+        first = asyncio.create_task(single_flight.get_diet_advice(
+            "Сколько белка нужно?", user_id=1, on_queued=recorder(positions, "first")
+        ))
+        await asyncio.sleep(0)
+        # Joins after the position was reported
+        second = asyncio.create_task(single_flight.get_diet_advice(
+            "сколько белка нужно", user_id=2, on_queued=recorder(positions, "second")
+        ))
+        await asyncio.sleep(0.01)
+        scheduler.released.set()
+        
+        answers = await asyncio.gather(first, second)
+        return scheduler.requests, answers, positions, single_flight.stats()
+    
+    requests, answers, positions, stats = asyncio.run(scenario())
+    assert requests == 1
+    assert answers[0] == answers[1]
+    assert sorted(positions) == [("first", 3), ("second", 3)]
+    assert stats == {'upstream': 1, 'coalesced': 1}
+
+
+def test_stream_followers_get_queue_position_and_all_chunks():
+    async def scenario():
+        scheduler = QueuedScheduler()
+        single_flight = SingleFlight(scheduler)
+        positions = []
+        
+        async def ask(name: str) -> str:
+            chunks = single_flight.stream_diet_advice(
+                "Сколько белка нужно?", user_id=1, on_queued=recorder(positions, name)
+            )
+            return "".join([chunk async for chunk in chunks])
+        
+        first = asyncio.create_task(ask("first"))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(ask("second"))
+        await asyncio.sleep(0.01)
+        scheduler.released.set()
+        
+        return scheduler.requests, await asyncio.gather(first, second), positions
+    
+    requests, answers, positions = asyncio.run(scenario())
+    assert requests == 1
+    assert answers == ["Ответ по частям", "Ответ по частям"]
+    assert sorted(positions) == [("first", 3), ("second", 3)]
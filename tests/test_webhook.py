@@ -0,0 +1,95 @@
+import asyncio
+
+import aiohttp
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message
+
+from src.config.settings import settings
+from src.web.webhook import SECRET_HEADER, WebhookServer
+
+SECRET = "s3cret"
+
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": 7, "type": "private"},
+        "from": {"id": 7, "is_bot": False, "first_name": "Test"},
+        "text": "/start",
+    },
+}
+
+
+def post_updates(requests):
+    """
+    Post updates to a running webhook server
+    
+    Args:
+        requests: (headers, body) pairs; body is sent as JSON unless it is a string
+    
+    Returns:
+        Response statuses, the server and chat IDs of handled messages
+    """
+    async def main():
+        dp = Dispatcher()
+        handled = []
+        
+        @dp.message()
+        async def on_message(message: Message):
+            handled.append(message.chat.id)
+        
+        bot = Bot("42:TEST")
+        server = WebhookServer(dp, bot, path="/webhook", secret=SECRET, workers=1, queue_size=10)
+        port = await server.start(host="127.0.0.1", port=0)
+        statuses = []
+        try:
+            async with aiohttp.ClientSession() as session:
+                for headers, body in requests:
+                    kwargs = {"data": body} if isinstance(body, str) else {"json": body}
+                    async with session.post(
+                        f"http://127.0.0.1:{port}/webhook", headers=headers, **kwargs
+                    ) as response:
+                        statuses.append(response.status)
+        finally:
+            await server.stop()
+            await bot.session.close()
+        return statuses, server, handled
+    
+    return asyncio.run(main())
+
+
+def test_update_with_secret_is_handled():
+    statuses, server, handled = post_updates([({SECRET_HEADER: SECRET}, UPDATE)])
+    
+    assert statuses == [200]
+    assert (server.received, server.rejected, server.failed) == (1, 0, 0)
+    assert handled == [7]
+
+
+@pytest.mark.parametrize("headers", [{}, {SECRET_HEADER: "wrong"}, {SECRET_HEADER: SECRET + "x"}])
+def test_update_without_secret_is_rejected(headers):
+    statuses, server, handled = post_updates([(headers, UPDATE)])
+    
+    assert statuses == [401]
+    assert (server.received, server.rejected) == (0, 1)
+    assert handled == []
+
+
+def test_malformed_update_is_rejected():
+    statuses, server, handled = post_updates([
+        ({SECRET_HEADER: SECRET}, "not json"),
+        ({SECRET_HEADER: SECRET}, {"message": "no update_id"}),
+    ])
+    
+    assert statuses == [400, 400]
+    assert server.rejected == 2
+    assert handled == []
+
+
+def test_empty_secret_is_refused(monkeypatch):
+    monkeypatch.setattr(settings, "WEBHOOK_SECRET", "")
+    
+    with pytest.raises(ValueError):
+        WebhookServer(Dispatcher(), Bot("42:TEST"))
@@ -0,0 +1,52 @@
+import pytest
+
+from src.services.workout_parser import parse_line, parse_workout
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("Жим лёжа 80кг 3x10", ("жим лежа", 3, 10, 80.0)),
+    ("Становая 120х5х3", ("становая", 5, 3, 120.0)),
+    ("Жим: 3 подхода по 12 раз 22,5 кг", ("жим", 3, 12, 22.5)),
+    ("Тяга 100 кг 5 повторений", ("тяга", 1, 5, 100.0)),
+    ("Отжимания 3 подхода 20 раз", ("отжимания", 3, 20, None)),
+    ("Подтягивания 3x12", ("подтягивания", 3, 12, None)),
+    ("Жим 135 lbs 5x5", ("жим", 5, 5, 61.2)),
+    # Count before a weight with unit is reps, never a multiplier
+    ("Жим 5x100кг", ("жим", 1, 5, 100.0)),
+    ("Жим гантелей 2x20кг", ("жим гантелей", 1, 2, 20.0)),
+    ("Жим 5x100кг 3 подхода", ("жим", 3, 5, 100.0)),
+    ("Жим 3x10x80кг", ("жим", 3, 10, 80.0)),
+    ("Жим 3 x 10 x 80 кг", ("жим", 3, 10, 80.0)),
+    # Number without unit next to sets and reps is the weight
+    ("Жим 80 3х8", ("жим", 3, 8, 80.0)),
+    ("Присед 3x5 100", ("присед", 3, 5, 100.0)),
+])
+def test_parse_line(line, expected):
+    parsed = parse_line(line)
+    
+    assert (parsed['exercise'], parsed['sets'], parsed['reps'], parsed['weight']) == expected
+
+
+@pytest.mark.parametrize("line", [
+    # Exercise name has to come first
+    "3 подхода по 12 раз 22,5 кг",
+    "Бег - 5 км - 28 минут",
+    "Жим 80кг",
+    # Dumbbell pair or reps can't be told apart
+    "Жим гантелей 2x20кг 3x10",
+    "",
+])
+def test_parse_line_rejects(line):
+    assert parse_line(line) is None
+
+
+def test_e1rm_only_for_short_sets():
+    assert parse_line("Жим 100кг 1x1")['e1rm'] == 100.0
+    assert parse_line("Жим 80кг 3x10")['e1rm'] == 106.7
+    assert parse_line("Жим 50кг 3x15")['e1rm'] is None
+
+
+def test_parse_workout_splits_lines_and_semicolons():
+    sets = parse_workout("Жим 80кг 3x10; Присед 100кг 5x5\nБег 5 км")
+    
+    assert [s['exercise'] for s in sets] == ["жим", "присед"]